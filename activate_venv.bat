@@ -8,6 +8,6 @@ echo.
 echo Активация виртуального окружения...
 call venv\Scripts\activate.bat
 echo Виртуальное окружение активировано. Вы можете запустить приложение командой:
-echo streamlit run streamlit-app.py
+echo streamlit run app.py
 echo.
 cmd /k 
\ No newline at end of file
@@ -3,6 +3,6 @@
 echo "Активация виртуального окружения..."
 source venv/bin/activate
 echo "Виртуальное окружение активировано. Вы можете запустить приложение командой:"
-echo "streamlit run streamlit-app.py"
+echo "streamlit run app.py"
 echo ""
 exec $SHELL 
\ No newline at end of file
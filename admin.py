@@ -0,0 +1,270 @@
+"""Служебные экраны для администратора: поиск по анкетам, психометрические показатели, нагрузка.
+
+Доступ открывается паролем из переменной окружения ADMIN_PASSWORD; если она не задана,
+служебные экраны скрыты. Поиск выполняет store.search_questionnaire (FTS5, BM25),
+показатели — psychometrics.refresh (накопленные суммы по колоночной выгрузке), нагрузку
+показывают метрики процесса: допуск к API синтеза, пул клиентов API, предзагрузка озвучки
+(tts) и очередь записи в хранилище (store.WriteBehindQueue).
+"""
+
+import hmac
+import os
+from datetime import datetime
+
+import streamlit as st
+
+import prognoz2
+import psychometrics
+import question_bank
+import store
+import tts
+from question_bank import SCALE_NAMES
+
+ADMIN_PASSWORD = os.environ.get("ADMIN_PASSWORD", "")
+SEARCH_LIMIT = int(os.environ.get("ADMIN_SEARCH_LIMIT", "50"))
+# Период обновления экрана психометрических показателей, с
+PSYCHOMETRICS_REFRESH = int(os.environ.get("ADMIN_PSYCHOMETRICS_REFRESH", "30"))
+# Период обновления экрана нагрузки, с
+METRICS_REFRESH = int(os.environ.get("ADMIN_METRICS_REFRESH", "5"))
+ADMIN_STAGES = ("admin_search", "admin_psychometrics", "admin_metrics")
+ALPHA_THRESHOLD = 0.7  # α ниже — надёжность шкалы на этапе недостаточна
+
+
+def available():
+    """Служебные экраны включены (задан ADMIN_PASSWORD)."""
+    return bool(ADMIN_PASSWORD)
+
+
+def check_password(password):
+    return available() and hmac.compare_digest(password.encode("utf-8"), ADMIN_PASSWORD.encode("utf-8"))
+
+
+def open_screen(stage):
+    """Переход на служебный экран; этап не пишется в журнал сессии кандидата."""
+    if st.session_state.stage not in ADMIN_STAGES:
+        st.session_state.admin_return_stage = st.session_state.stage
+    st.session_state.stage = stage
+
+
+def _back_and_login():
+    """Кнопка «Назад» и вход по паролю; True — администратор вошёл."""
+    if st.button("⬅️ Назад"):
+        st.session_state.stage = st.session_state.get('admin_return_stage') or 'start'
+        st.rerun()
+
+    if not st.session_state.get('admin_authorized'):
+        password = st.text_input("Пароль администратора", type="password")
+        if st.button("Войти"):
+            if check_password(password):
+                st.session_state.admin_authorized = True
+                st.rerun()
+            else:
+                st.error("❌ Неверный пароль")
+        return False
+    return True
+
+
+def _field_label(field_id):
+    field = question_bank.FORM_FIELD_BY_ID.get(field_id)
+    return field.text if field else field_id
+
+
+def _session_date(session_id):
+    try:
+        return datetime.fromtimestamp(store.session_id_time(session_id)).strftime("%d.%m.%Y %H:%M")
+    except ValueError:
+        return "—"
+
+
+def show_search():
+    """Экран поиска по свободным ответам анкет."""
+    st.title("🔎 Поиск по анкетам")
+    if not _back_and_login():
+        return
+
+    db = store.get_store()
+    if not db.search_available:
+        st.error("❌ SQLite собран без FTS5: полнотекстовый поиск недоступен")
+        return
+
+    query = st.text_input(
+        "Слова для поиска",
+        placeholder="например: кредит, судимость, Сирия",
+        help="Ищутся все слова запроса в любой форме («кредиты» найдёт «кредитам», «кредитная»)",
+    )
+    field_ids = st.multiselect(
+        "Поля анкеты (по умолчанию — все)",
+        question_bank.FREE_TEXT_FIELDS,
+        format_func=_field_label,
+    )
+    if not query.strip():
+        return
+
+    try:
+        results = db.search_questionnaire(query, field_ids, limit=SEARCH_LIMIT)
+    except ValueError as error:
+        st.warning(f"⚠️ {error}")
+        return
+
+    if not results:
+        st.info("Совпадений не найдено")
+        return
+    st.caption(f"Найдено: {len(results)}" + (" (показаны лучшие)" if len(results) == SEARCH_LIMIT else ""))
+    for result in results:
+        st.markdown(
+            f"**{result['full_name'] or 'ФИО не указано'}** · {_session_date(result['session_id'])} · "
+            f"_{_field_label(result['field_id'])}_"
+        )
+        st.markdown(f"> {result['snippet']}")
+        st.caption(f"Сессия {result['session_id']}")
+
+
+def _format_number(value, digits=2):
+    return "—" if value != value else f"{value:.{digits}f}"  # NaN — мало наблюдений
+
+
+def _psychometrics_panel():
+    try:
+        state, absorbed = psychometrics.refresh(store.get_store())
+    except ValueError as error:
+        # Раскладка выгрузки устарела — нужна пересборка
+        st.error(f"❌ {error}")
+        return
+    report = state.report()
+    p2 = report["p2"]
+    pair = report["sten_scale"]
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Обследований учтено", report["rows"], delta=absorbed or None)
+    with col2:
+        st.metric("Протоколов «Прогноз-2»", p2["n"])
+    with col3:
+        st.metric("r: стэн и шкала скрининга", _format_number(pair["r"]),
+                  help=f"{SCALE_NAMES.get(pair['scale'], pair['scale'])}; кандидатов, прошедших обе методики: {pair['n']}")
+
+    st.subheader("Надёжность шкал скрининга (α Кронбаха)")
+    st.dataframe(
+        [
+            {
+                "Шкала": SCALE_NAMES.get(row["scale"], row["scale"]),
+                "Этап": psychometrics.TIER_NAMES[row["tier"]],
+                "Пунктов": row["items"],
+                "Кандидатов": row["n"],
+                "α": _format_number(row["alpha"]),
+            }
+            for row in report["scales"]
+        ],
+        hide_index=True,
+    )
+    low = [row for row in report["scales"] if row["alpha"] < ALPHA_THRESHOLD and row["n"] >= 30]
+    if low:
+        st.warning(f"⚠️ α ниже {ALPHA_THRESHOLD} на {len(low)} этапах шкал — согласованность пунктов недостаточна")
+
+    st.subheader("Пункты «Прогноз-2»")
+    st.caption(f"KR-20 по ключу НПУ: {_format_number(p2['kr20'], 3)}")
+    keys = {1: "Да", -1: "Нет", 0: "—"}
+    st.dataframe(
+        [
+            {
+                "№": question.number,
+                "Вопрос": question.text,
+                "Ключ НПУ": keys[int(psychometrics.P2_KEY[index])],
+                "Доля «Да», %": _format_number(p2["endorsement"][index] * 100, 1),
+                "r с НПУ": _format_number(p2["item_total"][index]) if psychometrics.P2_KEY[index] else "—",
+            }
+            for index, question in enumerate(prognoz2.PROGNOZ2_QUESTIONS)
+        ],
+        hide_index=True,
+    )
+    weak = [
+        question.number for index, question in enumerate(prognoz2.PROGNOZ2_QUESTIONS)
+        if psychometrics.P2_KEY[index] and p2["item_total"][index] < psychometrics.WEAK_ITEM_TOTAL
+    ]
+    if weak and p2["n"] >= 30:
+        st.warning(f"⚠️ Слабая связь с НПУ (r < {psychometrics.WEAK_ITEM_TOTAL}): пункты {', '.join(map(str, weak))}")
+
+
+def show_psychometrics():
+    """Экран психометрических показателей; обновляется сам раз в PSYCHOMETRICS_REFRESH секунд."""
+    st.title("📈 Психометрические показатели")
+    if not _back_and_login():
+        return
+    st.caption(
+        "Показатели пересчитываются по новым обследованиям из накопленных сумм, "
+        f"экран обновляется раз в {PSYCHOMETRICS_REFRESH} с"
+    )
+    if hasattr(st, "fragment"):
+        st.fragment(run_every=PSYCHOMETRICS_REFRESH)(_psychometrics_panel)()
+    else:
+        _psychometrics_panel()
+
+
+def _metric_row(metrics):
+    for column, (label, value) in zip(st.columns(len(metrics)), metrics):
+        with column:
+            st.metric(label, value)
+
+
+def _metrics_panel():
+    admission = tts.admission_stats()
+    st.subheader("🔊 Синтез речи: допуск к API")
+    _metric_row([
+        ("В очереди", admission["queue_depth"]),
+        ("Идёт запросов", admission["running"]),
+        ("Ожидание, мс", f"{admission['wait_avg'] * 1000:.0f}"),
+        ("Ожидание max, мс", f"{admission['wait_max'] * 1000:.0f}"),
+    ])
+    st.caption(
+        f"Допущено {admission['admitted']}, отказов {admission['rejected']}, ответов 429 — "
+        f"{admission['rate_limited']}"
+        + (f"; новые запросы не принимаются ещё {admission['retry_after']:.0f} с" if admission["retry_after"] else "")
+    )
+
+    pool = tts.client_pool_stats()
+    st.subheader("🔌 Пул клиентов API")
+    if pool:
+        _metric_row([
+            ("Клиентов", pool["clients"]),
+            ("Занято", pool["in_use"]),
+            ("Загрузка", f"{pool['utilisation']:.0%}"),
+            ("Повторных", pool["reused"]),
+        ])
+        st.caption(f"Создано клиентов {pool['created']}, вытеснено {pool['evicted']}")
+    else:
+        st.caption("Локальный движок синтеза: клиенты API не используются")
+
+    prefetch = tts.prefetch_stats()
+    st.subheader("⏩ Предзагрузка озвучки")
+    _metric_row([
+        ("Задач в работе", prefetch["inflight"]),
+        ("Сессий", prefetch["sessions"]),
+        ("Ждут запуска", prefetch["queued"]),
+        ("Ждут на экране", prefetch["waiting"]),
+    ])
+    st.caption(
+        f"Поставлено {prefetch['submitted']}, готово {prefetch['completed']}, ошибок {prefetch['failed']}, "
+        f"отменено {prefetch['cancelled']}, присоединений к идущей задаче {prefetch['joined']}"
+    )
+
+    writer = store.get_writer().stats()
+    st.subheader("💾 Очередь записи в хранилище")
+    _metric_row([
+        ("В очереди", writer["queue_depth"]),
+        ("Не зафиксировано", writer["pending"]),
+        ("Записей в транзакции", f"{writer['avg_batch']:.1f}"),
+        ("Фиксация max, мс", f"{writer['commit_max'] * 1000:.0f}"),
+    ])
+    st.caption(f"Записано {writer['records']}, не сохранено {writer['failed']}")
+
+
+def show_metrics():
+    """Экран нагрузки на процесс; обновляется сам раз в METRICS_REFRESH секунд."""
+    st.title("📡 Нагрузка")
+    if not _back_and_login():
+        return
+    st.caption(f"Метрики этого процесса с момента запуска, экран обновляется раз в {METRICS_REFRESH} с")
+    if hasattr(st, "fragment"):
+        st.fragment(run_every=METRICS_REFRESH)(_metrics_panel)()
+    else:
+        _metrics_panel()
@@ -1,23 +1,30 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 from datetime import datetime, date
-import json
 import os
-import base64
-import tempfile
 
 import prognoz2  # отдельный пайплайн «Прогноз-2» (не связан с основным скринингом)
+import question_bank  # банки вопросов, скомпилированные один раз на процесс
+import tts  # синтез речи: дисковый кэш и фоновая предзагрузка
+import tts_backends  # движки синтеза (OpenAI или локальный)
+import store  # постоянное хранилище обследований (SQLite)
+import screening  # адаптивный скрининг: переходы этапов и подсчёт без Streamlit
+import session_log  # журнал событий сессии
+import replay  # восстановление состояния сессии по журналу
+import admin  # служебные экраны (поиск по анкетам, психометрика, нагрузка), доступ по ADMIN_PASSWORD
+import keyword_flags  # термины риска в свободных ответах анкеты (словарь, Ахо — Корасик)
+import rules  # правила критических и предупреждающих факторов
+from question_bank import (
+    SCALE_NAMES,
+    MILITARY_QUESTIONNAIRE,
+)
+
+# Тяжёлые модули (pandas, matplotlib, openai) импортируются лениво — только на экранах,
+# которым они нужны, чтобы не удлинять холодный старт. Бюджет проверяет check_startup.py.
 
-# Попытка импорта OpenAI для аудио (только для локального запуска)
-try:
-    import openai
-    AUDIO_AVAILABLE = True
-except ImportError:
-    AUDIO_AVAILABLE = False
-    st.sidebar.warning("🔊 OpenAI не установлен. Аудио функции недоступны.")
+# Проверка доступности движка синтеза речи (TTS_BACKEND) без импорта openai
+AUDIO_AVAILABLE = tts.available()
+if not AUDIO_AVAILABLE:
+    st.sidebar.warning("🔊 Движок синтеза речи недоступен. Аудио функции отключены.")
 
 # Настройка страницы
 st.set_page_config(
@@ -34,306 +41,53 @@ THRESHOLDS = {
     "high": (12, 15)
 }
 
-# Скрининговые вопросы (первичная оценка)
-SCREENING_QUESTIONS = {
-    "aggression": [
-        {"id": "ag1", "text": "Я раздражаюсь, когда у меня что-то не получается."},
-        {"id": "ag2", "text": "Иногда, когда я неважно себя чувствую, я бываю раздражительным."},
-        {"id": "ag3", "text": "Некоторые мои друзья считают, что я вспыльчив."}
-    ],
-    "isolation": [
-        {"id": "is1", "text": "Мне трудно заводить друзей."},
-        {"id": "is2", "text": "Мне не хватает общения."},
-        {"id": "is3", "text": "Мне не с кем поговорить."}
-    ],
-    "somatic": [
-        {"id": "som1", "text": "Иногда у меня бывает ускоренное сердцебиение"},
-        {"id": "som2", "text": "Иногда я чувствую, что я не могу контролировать свои мысли"},
-        {"id": "som3", "text": "Иногда у меня бывают желудочно-кишечные расстройства "}
-    ],
-    "anxiety": [
-        {"id": "anx1", "text": "Я испытываю напряженность, мне не по себе"},
-        {"id": "anx2", "text": "Приступы плохого настроения у меня бывают редко."},
-        {"id": "anx3", "text": "Иногда совершенно безо всякой причины у меня вдруг наступает период необычайной веселости."}
-    ],
-    "stability": [
-        {"id": "stab1", "text": "Я могу получить удовольствие от хорошей книги, радио- или телепрограммы "},
-        {"id": "stab2", "text": "Бывало, что при обсуждении некоторых вопросов я, особенно не задумываясь, соглашался с мнением других."},
-        {"id": "stab3", "text": "У меня часто бывают подъемы и спады настроения."}
-    ],
-    "military_adaptation": [
-        {"id": "mil1", "text": "Мне трудно выполнять приказы без объяснения причин."},
-        {"id": "mil2", "text": "Я боюсь физических нагрузок и испытаний."},
-        {"id": "mil3", "text": "Мне сложно находиться далеко от дома длительное время."}
-    ],
-    "sincerity": [
-        {"id": "sin1", "text": "Бывало, что я говорил о вещах, в которых не разбираюсь."},
-        {"id": "sin2", "text": "Бывает, что я сержусь."},
-        {"id": "sin3", "text": "Иногда я говорю неправду."}
-    ]
-}
-
-# Дополнительные вопросы для шкал со средним риском
-MEDIUM_RISK_QUESTIONS = {
-    "aggression": [
-        {"id": "ag_med1", "text": "Я дерусь чаще, чем окружающие."},
-        {"id": "ag_med2", "text": "Если кто-то ударит меня, я дам сдачи."},
-        {"id": "ag_med3", "text": "Иногда я выхожу из себя без особой причины."},
-        {"id": "ag_med4", "text": "Мне трудно сдерживать раздражение."},
-        {"id": "ag_med5", "text": "Иногда я настолько выходил из себя, что ломал вещи."}
-    ],
-    "isolation": [
-        {"id": "is_med1", "text": "Счастливей всего я бываю, когда я один."},
-        {"id": "is_med2", "text": "Если бы люди не были настроены против меня, я достиг бы в жизни гораздо большего."},
-        {"id": "is_med3", "text": "Иногда я бываю, уверен, что другие люди знают, о чем я думаю."},
-        {"id": "is_med4", "text": "Мне кажется, что по отношению именно ко мне особенно часто поступают несправедливо."},
-        {"id": "is_med5", "text": "Часто, даже когда все складывается для меня хорошо, я чувствую, что мне все безразлично."},
-        {"id": "is_med6", "text": "Мне кажется, что я все чувствую более остро, чем другие."}
-    
-    ],
-    "somatic": [
-        {"id": "som_med1", "text": "Бывало, что я целыми днями или даже неделями ничего не мог делать, потому что никак не мог заставить себя взяться за работу."},
-        {"id": "som_med2", "text": "Иногда я чувствую, что у меня удушье"},
-        {"id": "som_med3", "text": "Иногда я чувствую, что у меня затрудненное дыхание"},
-        {"id": "som_med4", "text": "Когда я пытаюсь что-то сделать, то часто замечаю, что у меня дрожат руки."},
-        {"id": "som_med5", "text": "Иногда я чувствую Испуг"},
-        {"id": "som_med6", "text": "Беспокойные мысли крутятся у меня в голове"}
-    ],
-    "anxiety": [
-        {"id": "anx_med1", "text": "у меня бывает внезапное чуство паники"},
-        {"id": "anx_med2", "text": "Я испытываю внутреннее напряжение или дрожь"},
-        {"id": "anx_med3", "text": "Я испытываю неусидчивость, словно мне постоянно нужно двигаться"},
-        {"id": "anx_med4", "text": "То, что приносило мне большое удовольствие, и сейчас вызывает у меня такое же чувство"},
-        {"id": "anx_med5", "text": "Работа, требующая пристального внимания, мне нравится."}
-    ],
-    "stability": [
-        {"id": "stab_med1", "text": "Определенно судьба не благосклонна ко мне."},
-        {"id": "stab_med2", "text": "Я легко теряю терпение с людьми."},
-        {"id": "stab_med3", "text": "Люди проявляют ко мне столько сочувствия и симпатии, сколько я заслуживаю."},
-        {"id": "stab_med4", "text": "Иногда мне в голову приходят такие нехорошие мысли, что лучше о них никому не рассказывать."},
-        {"id": "stab_med5", "text": "Должен признать, что временами я волнуюсь из-за пустяков."},
-        {"id": "stab_med6", "text": "Я часто предаюсь грустным размышлениям."},
-        {"id": "stab_med7", "text": "Я человек нервный и легковозбудимый.."}
-    ],
-    "military_adaptation": [
-        {"id": "mil_med1", "text": "Мне трудно принимать решения в стрессовых ситуациях."},
-        {"id": "mil_med2", "text": "Я плохо переношу критику от старших."},
-        {"id": "mil_med3", "text": "Мне сложно работать в команде."},
-        {"id": "mil_med4", "text": "Я избегаю ответственности за других людей."},
-        {"id": "mil_med5", "text": "Мне трудно соблюдать строгий распорядок дня."}
-    ]
-}
-
-# Полные опросники для шкал с высоким риском
-HIGH_RISK_QUESTIONS = {
-    "aggression": [
-        {"id": "ag_full1", "text": "Иногда я не могу сдержать желание ударить другого человека."},
-        {"id": "ag_full2", "text": "Я быстро вспыхиваю, но и быстро остываю."},
-        {"id": "ag_full3", "text": "Бывает, что я просто схожу с ума от ревности."},
-        {"id": "ag_full4", "text": "Если меня спровоцировать, я могу ударить другого человека."},
-        {"id": "ag_full5", "text": "Иногда я не могу сдержать желание ударить другого человека."},
-        {"id": "ag_full6", "text": "Временами мне кажется, что жизнь мне что-то недодала."},
-        {"id": "ag_full7", "text": "Я легко теряю терпение с людьми."},
-        {"id": "ag_full8", "text": "Иногда я чувствую, что вот-вот взорвусь."},
-        {"id": "ag_full9", "text": "Другим постоянно везет."},
-        {"id": "ag_full10", "text": "Я дерусь чаще, чем окружающие."}
-    ],
-    "isolation": [
-        {"id": "is_high1", "text": "Я несчастлив, занимаясь столькими вещами в одиночку."},
-        {"id": "is_high2", "text": "Я чувствую себя изолированным от других."},
-        {"id": "is_high3", "text": "Я чувствую себя покинутым."},
-        {"id": "is_high4", "text": "Я впечатлительнее большинства других людей."},
-        {"id": "is_high5", "text": "я несчастен будучи таким отверженным."},
-        {"id": "is_high6", "text": "Я чувствую себя совершенно одиноким."}
-     ],
-    "somatic": [
-        {"id": "som_high1", "text": "Голова у меня болит часто."},
-        {"id": "som_high2", "text": "Иногда мой слух настолько обостряется, что это мне даже мешает."},
-        {"id": "som_high3", "text": "Иногда я чувствую, что у меня затрудненное дыхание"},
-        {"id": "som_high4", "text": "Иногда я чувствую страх смерти"},
-        {"id": "som_high5", "text": "Раз в неделю или чаще я бываю возбужденным и взволнованным."},
-        {"id": "som_high6", "text": "Иногда я принимаю валериану, элениум или другие успокаивающие средства."}
-    ],
-    "anxiety": [
-        {"id": "anx_high1", "text": "Я испытываю страх, кажется, будто что-то ужасное может вот-вот случиться"},
-        {"id": "anx_high2", "text": "Некоторые вещи настолько меня волнуют, что мне даже говорить о них трудно."},
-        {"id": "anx_high3", "text": "Иногда меня подводят нервы"},
-        {"id": "anx_high4", "text": "Думаю, что я человек обреченный."},
-        {"id": "anx_high5", "text": "Временами я бываю совершенно уверен в своей никчемности."}
-    ],
-    "stability": [
-        {"id": "stab_high1", "text": "Теперь мне трудно надеяться на то, что я чего-нибудь добьюсь в жизни."},
-        {"id": "stab_high2", "text": "Я легко теряю терпение с людьми."},
-        {"id": "stab_high3", "text": "У меня бывали периоды, когда я что-то делал, а потом не знал, что именно я делал."},
-        {"id": "stab_high4", "text": "Иногда у меня бывает чувство, что передо мной нагромоздилось столько трудностей, что одолеть их просто невозможно."},
-        {"id": "stab_high5", "text": "Если в моих неудачах кто-то виноват, я не оставляю его безнаказанным."},
-        {"id": "stab_high6", "text": "Мне очень трудно приспособиться к новым условиям жизни, работы или учебы. Переход к новым условиям жизни, работы или учебы кажется мне невыносимо трудным."},
-        {"id": "stab_high7", "text": "Иногда я чувствую, что близок к нервному срыву."}
-    ],
-    "military_adaptation": [
-        {"id": "mil_high1", "text": "Мне трудно принимать решения в стрессовых ситуациях."},
-        {"id": "mil_high2", "text": "Я плохо переношу критику от старших."},
-        {"id": "mil_high3", "text": "Мне сложно работать в команде."},
-        {"id": "mil_high4", "text": "Я избегаю ответственности за других людей."},
-        {"id": "mil_high5", "text": "Мне трудно соблюдать строгий распорядок дня."}
-    ]
-}
-   
-
-# Названия шкал
-SCALE_NAMES = {
-    "aggression": "Шкала агрессии (Басса-Перри)",
-    "isolation": "Шкала изоляции/депривации (Д. Рассел)",
-    "somatic": "Шкала соматической депрессии (Бека)",
-    "anxiety": "Шкала тревожности и депрессии (NUDS)",
-    "stability": "Шкала нервно-психической устойчивости",
-    "military_adaptation": "Шкала военной адаптации",
-    "sincerity": "Шкала искренности"
-}
-
-# Расширенная анкета для военнослужащих
-MILITARY_QUESTIONNAIRE = {
-    "personal_info": {
-        "title": "👤 Личная информация",
-        "questions": [
-            {"id": "full_name", "text": "ФИО", "type": "text", "required": True},
-            {"id": "birth_date", "text": "Дата рождения", "type": "date", "required": True},
-            {"id": "birth_place", "text": "Место рождения", "type": "text", "required": True},
-            {"id": "residence", "text": "Место жительства", "type": "text", "required": True},   
-            {"id": "residence_coliving", "text": "С кем в настоящее время проживаете и в течении какого времени", "type": "text", "required": True},
-            {"id": "team_senior", "text": "Старший команды", "type": "text", "required": False},
-            {"id": "nationality", "text": "Национальность", "type": "text", "required": True},
-            {"id": "marital_status", "text": "Семейное положение", "type": "select", "options": ["Холост", "Женат", "Разведен"], "required": True},
-            {"id": "education", "text": "Образование", "type": "select", "options": ["Среднее", "Среднее специальное", "Высшее", "Неполное высшее"], "required": True},
-            {"id": "social_media", "text": "Укажите ваши аккаунты в соц сетях", "type": "textarea", "required": False}
-        ]
-    },
-    "achievements_family": {
-        "title": "🏆 Достижения и семья",
-        "questions": [
-            {"id": "sports_achievements", "text": "Есть ли у вас спортивные достижения? Какие?", "type": "textarea", "required": False},
-            {"id": "family_completeness", "text": "Вы воспитывались в полной/неполной семье", "type": "select", "options": ["Полной", "Неполной"], "required": True},
-            {"id": "deceased_relatives", "text": "Есть ли умершие среди близких родственников? (кто, год смерти, причина)", "type": "textarea", "required": False}
-        ]
-    },
-    "family_info": {
-        "title": "👨‍👩‍👧‍👦 Информация о семье",
-        "questions": [
-            {"id": "father_info", "text": "ФИО отца, возраст, место работы", "type": "textarea", "required": False},
-            {"id": "father_relationship", "text": "Взаимоотношения с отцом", "type": "select", "options": ["Отличные", "Хорошие", "Удовлетворительные", "Плохие", "Отсутствуют"], "required": False},
-            {"id": "mother_info", "text": "ФИО матери, возраст, место работы", "type": "textarea", "required": False},
-            {"id": "mother_relationship", "text": "Взаимоотношения с матерью", "type": "select", "options": ["Отличные", "Хорошие", "Удовлетворительные", "Плохие", "Отсутствуют"], "required": False},
-            {"id": "siblings", "text": "Братья и сестры (ФИО, возраст)", "type": "textarea", "required": False},
-            {"id": "home_escapes", "text": "Бывали ли у вас случаи побегов из дома?", "type": "radio", "options": ["Да", "Нет"], "required": True}
-        ]
-    },
-    "social_connections": {
-        "title": "🌐 Социальные связи",
-        "questions": [
-            {"id": "astana_contacts", "text": "Есть ли в городе Астана родственники или знакомые (ФИО и адрес)", "type": "textarea", "required": False},
-            {"id": "family_suicides", "text": "Были ли самоубийства или суицидальные попытки у родственников", "type": "radio", "options": ["Да", "Нет"], "required": True},
-            {"id": "personal_suicides", "text": "Имелись ли у вас в прошлом суицидальные попытки/мысли", "type": "radio", "options": ["Да", "Нет"], "required": True}
-        ]
-    },
-    "health_history": {
-        "title": "🏥 Медицинская история",
-        "questions": [
-            {"id": "family_alcoholism", "text": "Был ли в вашей семье алкоголизм", "type": "radio", "options": ["Да", "Нет"], "required": True},
-            {"id": "family_drugs", "text": "Была ли в вашей семье наркомания", "type": "radio", "options": ["Да", "Нет"], "required": True},
-            {"id": "family_criminal", "text": "Была ли в вашей семье судимость", "type": "radio", "options": ["Да", "Нет"], "required": True},
-            {"id": "family_mental", "text": "Были ли в семье наследственные нервно-психические заболевания", "type": "radio", "options": ["Да", "Нет"], "required": True},
-            {"id": "personal_alcoholism", "text": "Были ли у вас до армии факты алкоголизма", "type": "radio", "options": ["Да", "Нет"], "required": True},
-            {"id": "personal_drugs", "text": "Были ли у вас до армии факты наркомании", "type": "radio", "options": ["Да", "Нет"], "required": True},
-            {"id": "personal_criminal", "text": "Были ли у вас до армии судимости", "type": "radio", "options": ["Да", "Нет"], "required": True},
-            {"id": "personal_mental", "text": "Были ли у вас до армии нервно-психические заболевания", "type": "radio", "options": ["Да", "Нет"], "required": True},
-	        {"id": "personal_headtrauma", "text": "Были ли у Вас сотрясения мозга/травмы головы", "type": "radio", "options": ["Да", "Нет"], "required": True},
-            {"id": "personal_gambling", "text": "Была ли у вас игромания", "type": "radio", "options": ["Да", "Нет"], "required": True},
-            {"id": "hereditary_diseases", "text": "Имеешь ли ты тяжёлые наследственные заболевания? (онкологические, дыхательные, гипертония, сердечные и т.д.)", "type": "textarea", "required": False},
-            {"id": "seizures", "text": "Были ли у ближайших родственников или у вас судорожные припадки", "type": "radio", "options": ["Да", "Нет"], "required": True},
-            {"id": "bedwetting", "text": "Было ли у вас ночное недержание мочи?", "type": "radio", "options": ["Да", "Нет"], "required": True},
-            {"id": "bedwetting_age", "text": "В каком возрасте? (если было недержание)", "type": "number", "required": False}
-        ]
-    },
-    "work_military": {
-        "title": "💼 Работа и военная служба",
-        "questions": [
-            {"id": "work_before_army", "text": "Кем работал до армии, сколько времени?", "type": "textarea", "required": False},
-            {"id": "want_serve", "text": "Желаете ли вы проходить военную службу", "type": "radio", "options": ["Да", "Нет"], "required": True},
-            {"id": "serve_reason", "text": "Причина (если не желаете служить)", "type": "textarea", "required": False},
-            {"id": "service_difficulties", "text": "В чем для вас будет трудность воинской службы", "type": "multiselect", "options": ["Беспрекословное подчинение", "Физические нагрузки", "Удаленность от дома", "Высокая личная ответственность", "Преодоление собственных отрицательных привычек", "Другое"], "required": True}
-        ]
-    },
-    "religion_lifestyle": {
-        "title": "🕌 Религия и образ жизни",
-        "questions": [
-            {"id": "religion_type", "text": "Какую религию исповедуешь", "type": "text", "required": False},
-            {"id": "religion_direction", "text": "Какое направление религии", "type": "text", "required": False},
-            {"id": "religion_teachers", "text": "Если ты слушаешь духовных учителей, то перечисли их", "type": "text", "required": False},
-            {"id": "religious_attendance", "text": "Как часто ходишь в мечеть/церковь", "type": "select", "options": ["Каждый день", "Несколько раз в неделю", "Раз в неделю", "Несколько раз в месяц", "Редко", "Никогда"], "required": False},
-            {"id": "traditional_holidays", "text": "Празднуете ли вы традиционные праздники?", "type": "radio", "options": ["Да", "Нет"], "required": True},
-            {"id": "social_events", "text": "Ходите на различные торжества (дни рождения, свадьбы)", "type": "radio", "options": ["Да", "Нет"], "required": True},
-            {"id": "girlfriend", "text": "Есть ли девушка?", "type": "radio", "options": ["Да", "Нет"], "required": True},
-            {"id": "relationship_closeness", "text": "Насколько близкие отношения по шкале от 1 до 5", "type": "slider", "min": 1, "max": 5, "required": False},
-            {"id": "relationship_period", "text": "Сколько времени вы в отношениях", "type": "text", "required": False}
-        ]
-    },
-    "financial_health": {
-        "title": "💰 Финансы и здоровье",
-        "questions": [
-            {"id": "betting", "text": "Делаешь ли ставки в букмекерских конторах или онлайн", "type": "radio", "options": ["Да", "Нет"], "required": True},
-            {"id": "credits", "text": "Есть у тебя кредиты/займы (сколько, на какую сумму, кто оплачивает)", "type": "textarea", "required": False},
-            {"id": "medical_examination", "text": "При прохождении ВВК в ДДО полностью ли вы прошли обследование у врачей", "type": "radio", "options": ["Да", "Нет"], "required": True},
-            {"id": "hidden_health_facts", "text": "Есть ли факты относительно вашего здоровья (диагнозы по которым ранее вас не брали на службу), о которых вы не сказали вашему старшему", "type": "textarea", "required": False}
-        ]
-    }
-}
-
 # Функция для установки API ключа OpenAI
 def set_openai_api_key(api_key):
-    """Устанавливает API ключ OpenAI как переменную окружения"""
+    """Сохраняет API ключ OpenAI в состоянии текущей сессии.
+    
+    В os.environ ключ не пишется: окружение общее для всех сессий процесса.
+    """
     if AUDIO_AVAILABLE:
-        os.environ["OPENAI_API_KEY"] = api_key
+        st.session_state.tts_api_key = api_key
         return True
     return False
 
-# Функция для озвучивания текста с использованием OpenAI API
+# Функция для озвучивания текста выбранным движком синтеза
 def generate_speech(text, voice="alloy", language="ru"):
-    """Генерирует аудио для заданного текста с использованием OpenAI TTS API"""
+    """Запускает синтез аудио для заданного текста (OpenAI TTS API или локальный движок).
+    
+    Не блокирует: возвращает Future с байтами аудио (или None, если озвучивание недоступно).
+    Синтез, дисковый кэш и фоновая предзагрузка — в модуле tts, воспроизведение — tts.play.
+    """
     if not AUDIO_AVAILABLE:
         return None
         
     try:
-        api_key = os.environ.get("OPENAI_API_KEY")
-        if not api_key:
+        api_key = tts.session_api_key(st.session_state)
+        if not tts.can_speak(api_key):
             return None
         
-        client = openai.OpenAI(api_key=api_key)
-        
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as temp_audio:
-            temp_filename = temp_audio.name
-        
-        response = client.audio.speech.create(
-            model="tts-1",
-            voice=voice,
-            input=text,
-            response_format="mp3"
-        )
-        
-        response.stream_to_file(temp_filename)
-        
-        with open(temp_filename, "rb") as audio_file:
-            audio_bytes = audio_file.read()
-        
-        audio_base64 = base64.b64encode(audio_bytes).decode()
-        audio_html = f'<audio autoplay controls><source src="data:audio/mp3;base64,{audio_base64}" type="audio/mp3"></audio>'
-        
-        os.unlink(temp_filename)
-        return audio_html
+        return tts.request(text, voice, language, api_key, st.session_state.session_id)
     
     except Exception as e:
         st.error(f"Ошибка при генерации аудио: {str(e)}")
         return None
 
+def prefetch_upcoming_speech():
+    """Фоновый синтез следующих TTS_PREFETCH_AHEAD вопросов текущего этапа"""
+    api_key = tts.session_api_key(st.session_state)
+    if not (st.session_state.tts_enabled and tts.can_speak(api_key)):
+        return
+    index = st.session_state.current_question_index
+    upcoming = st.session_state.questions_order[index + 1:index + 1 + tts.TTS_PREFETCH_AHEAD]
+    tts.prefetch(
+        [question_bank.ITEMS[num].text for num in upcoming],
+        st.session_state.tts_voice,
+        st.session_state.tts_language,
+        api_key,
+        st.session_state.session_id,
+    )
+
 # Функции для работы с состоянием сессии
 def initialize_session():
     """Инициализация состояния сессии при первом запуске"""
@@ -351,18 +105,31 @@ def initialize_session():
         'high_risk_scales': [],
         'evaluated_scales': [],
         'detailed_results': {},
+        'scale_totals': {},  # этап -> шкала -> {'score', 'count', 'positive'}, см. screening.record_response
         'user_info': {'name': '', 'age': '', 'gender': ''},
-        'session_id': datetime.now().strftime("%Y%m%d_%H%M%S"),
+        'session_id': store.new_session_id(),  # ULID: уникален и сортируется по времени
+        'started_at': datetime.now().isoformat(timespec="seconds"),
         'tts_enabled': False,
         'tts_voice': 'alloy',
         'tts_language': 'ru',
+        'tts_api_key': None,  # ключ OpenAI этой сессии (см. set_openai_api_key)
         'last_question_id': None,
         'questionnaire_completed': False,
         'risk_levels_desc': {},
         # Состояние отдельного пайплайна «Прогноз-2» (изолировано от основного потока)
-        'p2_responses': {},
+        'p2_answers': prognoz2.PROGNOZ2_EMPTY_RECORD,  # упакованная запись, см. prognoz2_pack
+        'p2_counts': prognoz2.PROGNOZ2_EMPTY_COUNTS,  # (сырой балл НПУ, искренность) по ходу теста
         'p2_current_index': 0,
-        'p2_result': None
+        'p2_result': None,
+        'p2_norms_version': prognoz2.PROGNOZ2_DEFAULT_NORMS,
+        'p2_invalid_policy': prognoz2.PROGNOZ2_EARLY_INVALID_POLICY,
+        # Журнал сессии (см. log_event) и продолжение по коду
+        'log_clock_ms': None,  # время последнего события журнала, мс
+        'resume_code': None,  # код продолжения, выдаётся с первым событием журнала
+        'resume_checked': False,  # код из адреса страницы уже проверен
+        # Служебные экраны (admin.py)
+        'admin_authorized': False,
+        'admin_return_stage': None  # этап, на который вернёт кнопка «Назад» служебного экрана
     }
     
     for key, value in defaults.items():
@@ -374,14 +141,53 @@ def reset_session():
     for key in list(st.session_state.keys()):
         del st.session_state[key]
     initialize_session()
+    # Иначе перезагрузка страницы вернула бы прежнюю сессию
+    st.session_state.resume_checked = True
+    if "resume" in st.query_params:
+        del st.query_params["resume"]
+
+def log_event(kind, *args):
+    """Запись события в журнал сессии (этап, ответ, возврат); состояние из него воспроизводится"""
+    try:
+        session_log.append(st.session_state, kind, *args)
+    except Exception as e:
+        st.warning(f"Не удалось записать событие в журнал сессии: {str(e)}")
+
+def resume_session(code):
+    """Восстановление сессии по коду продолжения воспроизведением её журнала; False — код не найден"""
+    # Последние события могли ещё не дойти до диска
+    store.get_writer().flush(timeout=store.STORE_PUT_TIMEOUT)
+    saved = store.get_store().load_session(code)
+    if saved is None:
+        return False
+    state = replay.replay(saved["session_id"], saved["events"], saved["questionnaire"])
+    reset_session()
+    for key, value in state.items():
+        st.session_state[key] = value
+    st.session_state.resume_code = store.normalize_resume_code(code)
+    return True
+
+def persist(kind, *args):
+    """Постановка ответа в очередь отложенной записи хранилища (клик не ждёт диска)"""
+    writer = store.get_writer()
+    try:
+        if kind == "field":
+            writer.put_field(*args)
+        else:
+            writer.put_response(*args)
+    except Exception as e:
+        st.warning(f"Не удалось сохранить ответ в хранилище: {str(e)}")
 
 def save_questionnaire_response(question_id, value):
     """Сохранение ответа на вопрос анкеты"""
+    # Виджеты анкеты сообщают значение на каждом прогоне — в хранилище пишутся только изменения
+    if st.session_state.questionnaire_responses.get(question_id) != value:
+        persist("field", st.session_state.session_id, question_id, value)
     st.session_state.questionnaire_responses[question_id] = value
 
 def save_response(question_id, value):
-    """Сохранение ответа на вопрос психологического теста"""
-    st.session_state.responses[question_id] = value
+    """Сохранение ответа на вопрос психологического теста в хранилище"""
+    persist("response", st.session_state.session_id, question_id, value)
 
 def show_start_screen():
     """Отображение начального экрана"""
@@ -415,15 +221,40 @@ def show_start_screen():
         st.caption("Военная анкета + адаптивный психологический скрининг")
         if st.button("🚀 Начать обследование", use_container_width=True, type="primary"):
             st.session_state.stage = 'questionnaire'
+            log_event("stage", "questionnaire")
             st.rerun()
     with col2:
         st.markdown("**📋 Тест «Прогноз-2»**")
         st.caption("Отдельный опросник нервно-психической устойчивости (86 вопросов)")
+        norms_versions = prognoz2.prognoz2_available_norms()
+        if len(norms_versions) > 1:
+            st.session_state.p2_norms_version = st.selectbox(
+                "Нормы для перевода в стэны",
+                norms_versions,
+                index=norms_versions.index(st.session_state.p2_norms_version)
+                if st.session_state.p2_norms_version in norms_versions else 0
+            )
         if st.button("📋 Пройти тест «Прогноз-2»", use_container_width=True):
             prognoz2.prepare_prognoz2()
-            st.session_state.stage = 'p2_test'
             st.rerun()
 
+    st.markdown("---")
+    st.markdown("### Продолжить прерванное обследование")
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        code = st.text_input(
+            "Код продолжения", placeholder="ABCD-1234", label_visibility="collapsed",
+            help="Код выдаётся в начале обследования и показывается на боковой панели"
+        )
+    with col2:
+        if st.button("▶️ Продолжить", use_container_width=True, disabled=not code.strip()):
+            try:
+                if resume_session(code):
+                    st.rerun()
+                st.error("❌ Обследование с таким кодом не найдено")
+            except ValueError as e:
+                st.error(f"❌ {str(e)}")
+
 def show_questionnaire():
     """Отображение военной анкеты"""
     st.title("🪖 Военная анкета")
@@ -496,6 +327,7 @@ def show_questionnaire():
                 st.session_state.questionnaire_completed = True
                 st.session_state.stage = 'screening'
                 prepare_screening_questions()
+                log_event("stage", "screening")
                 st.rerun()
         else:
             st.button("✅ Завершить анкету", disabled=True)
@@ -631,21 +463,11 @@ def show_questionnaire_section(section_name, section_data):
     return all_filled
 
 def prepare_screening_questions():
-    """Подготовка порядка вопросов для первичного скрининга"""
-    questions = []
-    for scale, scale_questions in SCREENING_QUESTIONS.items():
-        for question in scale_questions:
-            questions.append({
-                "id": question["id"],
-                "text": question["text"],
-                "scale": scale
-            })
-    np.random.shuffle(questions)
-    st.session_state.questions_order = questions
-    st.session_state.current_question_index = 0
+    """Подготовка порядка вопросов для первичного скрининга (перестановка номеров пунктов)"""
+    screening.prepare_screening_questions(st.session_state)
 
 def show_question(question, progress=None):
-    """Отображение вопроса с шкалой ответов"""
+    """Отображение вопроса с шкалой ответов (question — запись question_bank.Item)"""
     # Заголовок с прогрессом
     col1, col2 = st.columns([3, 1])
     with col1:
@@ -659,26 +481,24 @@ def show_question(question, progress=None):
     
     # Отображение вопроса
     st.markdown(f"""
-    ### 💭 {question['text']}
+    ### 💭 {question.text}
     """)
     
-    # Озвучивание вопроса если включено
-    if st.session_state.tts_enabled and AUDIO_AVAILABLE:
+    # Озвучивание вопроса если включено: синтез запускается сразу, а ждём его только
+    # после отрисовки кнопок, чтобы кандидат мог ответить, не дожидаясь аудио
+    speech = None
+    speech_enabled = st.session_state.tts_enabled and AUDIO_AVAILABLE
+    if speech_enabled:
         audio_container = st.empty()
         
-        if os.environ.get("OPENAI_API_KEY"):
-            # Автоматическое озвучивание при появлении вопроса
-            if st.session_state.last_question_id != question['id']:
-                audio_html = generate_speech(question['text'], voice=st.session_state.tts_voice, language=st.session_state.tts_language)
-                if audio_html:
-                    audio_container.markdown(audio_html, unsafe_allow_html=True)
-                    st.session_state.last_question_id = question['id']
+        if tts.can_speak(tts.session_api_key(st.session_state)):
+            # Следующие вопросы синтезируются в фоне, пока кандидат читает текущий
+            prefetch_upcoming_speech()
             
-            # Кнопка для повторного озвучивания
-            if st.button("🔊 Озвучить еще раз", key="tts_button"):
-                audio_html = generate_speech(question['text'], voice=st.session_state.tts_voice, language=st.session_state.tts_language)
-                if audio_html:
-                    audio_container.markdown(audio_html, unsafe_allow_html=True)
+            # Автоматическое озвучивание при появлении вопроса и кнопка для повторного
+            replay_clicked = st.button("🔊 Озвучить еще раз", key="tts_button")
+            if replay_clicked or st.session_state.last_question_id != question.id:
+                speech = generate_speech(question.text, voice=st.session_state.tts_voice, language=st.session_state.tts_language)
     
     # Создаем кнопки для оценки от 1 до 5
     st.markdown("**Выберите ваш ответ:**")
@@ -697,279 +517,90 @@ def show_question(question, progress=None):
     for i, col in enumerate(cols):
         value = i + 1
         with col:
-            if col.button(button_labels[i], key=f"btn_{question['id']}_{value}", use_container_width=True):
+            if col.button(button_labels[i], key=f"btn_{question.id}_{value}", use_container_width=True):
                 selected_value = value
     
     # Если выбран ответ, переходим к следующему вопросу
     if selected_value is not None:
-        save_response(question['id'], selected_value)
+        if speech_enabled:
+            # Ответ получен раньше аудио — синтез, который ещё не начался, больше не нужен
+            tts.cancel(question.text, st.session_state.tts_voice, st.session_state.tts_language, st.session_state.session_id)
+        log_event("answer", question.num, selected_value)
+        save_response(question.id, selected_value)
 
         # Показываем подтверждение выбора
         st.success(f"✅ Ваш ответ записан: {selected_value}")
 
-        # Проверяем, есть ли еще вопросы
-        if st.session_state.current_question_index < len(st.session_state.questions_order) - 1:
-            st.session_state.current_question_index += 1
-        else:
-            # Завершение текущего этапа
-            if st.session_state.stage == 'screening':
-                # Завершаем первичный скрининг
-                st.session_state.stage = 'results'
-                analyze_results()
-            elif st.session_state.stage == 'medium_risk_assessment':
-                # Завершаем оценку средней шкалы риска
-                complete_detailed_assessment('medium')
-            elif st.session_state.stage == 'high_risk_assessment':
-                # Завершаем оценку высокой шкалы риска
-                complete_detailed_assessment('high')
+        # Следующий вопрос или следующий этап (углублённая оценка, результаты)
+        if screening.answer(st.session_state, question.id, selected_value):
+            save_assessment()
 
         st.rerun()
     
     # Показать предыдущий ответ, если есть
-    if question['id'] in st.session_state.responses:
-        prev_answer = st.session_state.responses[question['id']]
+    if question.id in st.session_state.responses:
+        prev_answer = st.session_state.responses[question.id]
         st.info(f"Ваш предыдущий ответ: {prev_answer} - {button_labels[prev_answer-1].split(' ', 1)[1]}")
 
-def analyze_results():
-    """Анализ результатов скрининга и определение уровней риска"""
-    scores = {}
-    positive_answers = {}  # Счетчик положительных ответов для каждой шкалы
-    
-    # Расчет баллов и подсчет положительных ответов по каждой шкале
-    for scale in SCREENING_QUESTIONS.keys():
-        score = 0
-        count = 0
-        positive_count = 0
-        
-        for question_id, value in st.session_state.responses.items():
-            # Определяем, к какой шкале относится вопрос
-            for s, questions in SCREENING_QUESTIONS.items():
-                if any(q['id'] == question_id for q in questions):
-                    if s == scale:
-                        score += value
-                        count += 1
-                        # Считаем ответ положительным, если значение 4 или 5
-                        if value >= 4:
-                            positive_count += 1
-                    break
-        
-        if count > 0:
-            scores[scale] = score
-            positive_answers[scale] = positive_count
-    
-    st.session_state.scale_scores = scores
-    
-    # Определение уровней риска
-    risk_levels = {}
-    risk_levels_desc = {}
-    medium_risk_scales = []
-    high_risk_scales = []
-    
-    # Определение уровней риска для каждой шкалы
-    for scale, score in scores.items():
-        if scale == 'sincerity':
-            # Специальная логика для шкалы искренности
-            if score >= 13 or score <= 4:
-                risk_levels[scale] = "warning"
-                risk_levels_desc[scale] = "низкая искренность ответов"
-        else:
-            # Если 2 или более положительных ответа в скрининге
-            if positive_answers.get(scale, 0) >= 2:
-                risk_levels[scale] = "medium"
-                risk_levels_desc[scale] = "средний уровень риска (требуется дополнительная оценка)"
-                medium_risk_scales.append(scale)
-            else:
-                risk_levels[scale] = "low"
-                risk_levels_desc[scale] = "низкий уровень риска"
-    
-    st.session_state.risk_levels = risk_levels
-    st.session_state.risk_levels_desc = risk_levels_desc
-    st.session_state.medium_risk_scales = medium_risk_scales
-    st.session_state.high_risk_scales = high_risk_scales
-    
-    # Определение следующего этапа
-    if medium_risk_scales:
-        # Есть шкалы со средним риском - дополнительные вопросы
-        st.session_state.stage = 'medium_risk_assessment'
-        st.session_state.current_scale = medium_risk_scales[0]
-        prepare_detailed_questions(medium_risk_scales[0], "medium")
-    else:
-        # Все шкалы в норме - переход к результатам
-        st.session_state.stage = 'results'
-        prepare_final_recommendations()
+    if st.session_state.current_question_index > 0:
+        if st.button("⬅️ Предыдущий вопрос", key="prev_btn"):
+            log_event("back")
+            screening.go_back(st.session_state)
+            st.rerun()
+    
+    # Воспроизведение, когда аудио готово; нажатие кнопки ответа прерывает ожидание
+    if speech is not None and tts.play(audio_container, speech):
+        st.session_state.last_question_id = question.id
 
 def prepare_detailed_questions(scale, risk_level):
     """Подготовка дополнительных вопросов для углубленной оценки"""
-    questions = []
-    
-    if risk_level == "medium" and scale in MEDIUM_RISK_QUESTIONS:
-        # Дополнительные вопросы для среднего риска
-        for question in MEDIUM_RISK_QUESTIONS[scale]:
-            questions.append({
-                "id": question["id"],
-                "text": question["text"],
-                "scale": scale
-            })
-    elif risk_level == "high" and scale in HIGH_RISK_QUESTIONS:
-        # Полный опросник для высокого риска
-        for question in HIGH_RISK_QUESTIONS[scale]:
-            questions.append({
-                "id": question["id"],
-                "text": question["text"],
-                "scale": scale
-            })
-    
-    # Если нет специальных вопросов, используем вопросы среднего риска
-    if not questions and scale in MEDIUM_RISK_QUESTIONS:
-        for question in MEDIUM_RISK_QUESTIONS[scale]:
-            questions.append({
-                "id": question["id"],
-                "text": question["text"],
-                "scale": scale
-            })
-    
-    np.random.shuffle(questions)
-    st.session_state.questions_order = questions
-    st.session_state.current_question_index = 0
+    screening.prepare_detailed_questions(st.session_state, scale, risk_level)
 
 def prepare_final_recommendations():
-    """Подготовка итоговых рекомендаций"""
-    recommendations = []
-    
-    # Проверяем наличие высокого риска в любой шкале
-    has_high_risk = False
-    for scale, level in st.session_state.risk_levels_desc.items():
-        if "высокий" in level:
-            has_high_risk = True
-            recommendations.append(f"⚠️ Выявлен высокий уровень риска по шкале '{SCALE_NAMES.get(scale, scale)}'")
-    
-    # Проверка риска экстремизма
-    questionnaire = st.session_state.questionnaire_responses
-    has_religious_teacher = bool(questionnaire.get('religion_teachers', '').strip())
-    frequent_attendance = questionnaire.get('religious_attendance') in ['Несколько раз в неделю', 'Каждый день']
-    no_social_events = questionnaire.get('social_events') == 'Нет'
+    """Подготовка итоговых рекомендаций и сохранение итога обследования"""
+    screening.prepare_final_recommendations(st.session_state)
+    # Итог обследования фиксируется в постоянном хранилище
+    save_assessment()
 
-    if has_religious_teacher and frequent_attendance and no_social_events:
-        has_high_risk = True
-        recommendations.append("⚠️ Выявлен риск экстремизма")
-    
-    # Если есть хотя бы один высокий риск, добавляем общую рекомендацию
-    if has_high_risk:
-        recommendations.append("❌ **Не рекомендуется к военной службе**")
-        st.session_state.military_recommendation = "not_recommended"
-    else:
-        # Проверяем наличие среднего риска
-        medium_risk_scales = []
-        for scale, level in st.session_state.risk_levels_desc.items():
-            if "средний" in level:
-                medium_risk_scales.append(SCALE_NAMES.get(scale, scale))
-        
-        if medium_risk_scales:
-            recommendations.append(f"⚠️ Требуется дополнительное внимание к следующим аспектам: {', '.join(medium_risk_scales)}")
-            recommendations.append("✅ **Рекомендуется к военной службе с ограничениями**")
-            st.session_state.military_recommendation = "recommended_with_restrictions"
-        else:
-            recommendations.append("✅ **Рекомендуется к военной службе**")
-            st.session_state.military_recommendation = "recommended"
-    
-    st.session_state.final_recommendations = recommendations
+def keyword_flag_records(questionnaire):
+    """Совпадения терминов риска в анкете для сохранения вместе с итогом"""
+    try:
+        hits = keyword_flags.scan_questionnaire(questionnaire)
+    except ValueError as e:
+        st.warning(f"Словарь терминов риска не загружен: {str(e)}")
+        return []
+    return keyword_flags.hit_records(hits)
 
-def complete_detailed_assessment(risk_level):
-    """Завершение углубленной оценки для текущей шкалы"""
-    current_scale = st.session_state.current_scale
-    
-    # Подсчет результатов углубленной оценки
-    detailed_score = 0
-    question_count = 0
-    positive_count = 0
-    
-    for question_id, value in st.session_state.responses.items():
-        # Проверяем, относится ли вопрос к текущей углубленной оценке
-        if risk_level == "medium" and current_scale in MEDIUM_RISK_QUESTIONS:
-            if any(q['id'] == question_id for q in MEDIUM_RISK_QUESTIONS[current_scale]):
-                detailed_score += value
-                question_count += 1
-                if value >= 4:  # Считаем ответ положительным, если значение 4 или 5
-                    positive_count += 1
-        elif risk_level == "high" and current_scale in HIGH_RISK_QUESTIONS:
-            if any(q['id'] == question_id for q in HIGH_RISK_QUESTIONS[current_scale]):
-                detailed_score += value
-                question_count += 1
-                if value >= 4:  # Считаем ответ положительным, если значение 4 или 5
-                    positive_count += 1
-    
-    # Сохранение результатов углубленной оценки
-    if question_count > 0:
-        max_possible = question_count * 5  # Максимальный балл (5 баллов за вопрос)
-        percentage = (detailed_score / max_possible) * 100
-        
-        st.session_state.detailed_results[current_scale] = {
-            'score': detailed_score,
-            'max_possible': max_possible,
-            'percentage': percentage,
-            'positive_count': positive_count,
-            'total_questions': question_count
-        }
-        
-        # Обновление уровня риска на основе углубленной оценки
-        if risk_level == "medium":
-            # Если более 50% ответов положительные, переходим к высокой оценке риска
-            if positive_count > question_count / 2:
-                st.session_state.risk_levels_desc[current_scale] = "высокий уровень риска (подтверждено углубленной оценкой)"
-                st.session_state.high_risk_scales.append(current_scale)
-                # Переходим к высокой оценке риска
-                st.session_state.stage = 'high_risk_assessment'
-                prepare_detailed_questions(current_scale, "high")
-                return
-            else:
-                st.session_state.risk_levels_desc[current_scale] = "средний уровень риска (подтверждено углубленной оценкой)"
-        elif risk_level == "high":
-            if percentage >= 70:
-                st.session_state.risk_levels_desc[current_scale] = "высокий уровень риска (подтверждено углубленной оценкой)"
-            else:
-                st.session_state.risk_levels_desc[current_scale] = "средний уровень риска (скорректировано после углубленной оценки)"
-    
-    # Отмечаем шкалу как оцененную
-    if hasattr(st.session_state, 'evaluated_scales'):
-        st.session_state.evaluated_scales.append(current_scale)
-    else:
-        st.session_state.evaluated_scales = [current_scale]
-    
-    # Определяем следующий этап
-    if risk_level == "high":
-        # Убираем текущую шкалу из списка high_risk_scales
-        remaining_high_risk = [s for s in st.session_state.high_risk_scales if s != current_scale]
-        st.session_state.high_risk_scales = remaining_high_risk
-        
-        if remaining_high_risk:
-            # Есть еще шкалы с высоким риском
-            st.session_state.current_scale = remaining_high_risk[0]
-            prepare_detailed_questions(remaining_high_risk[0], "high")
-        else:
-            # Переходим к результатам
-            st.session_state.stage = 'results'
-            prepare_final_recommendations()
-    
-    elif risk_level == "medium":
-        # Убираем текущую шкалу из списка medium_risk_scales
-        remaining_medium_risk = [s for s in st.session_state.medium_risk_scales if s != current_scale]
-        remaining_medium_risk = [s for s in remaining_medium_risk if s not in st.session_state.evaluated_scales]
-        st.session_state.medium_risk_scales = remaining_medium_risk
-        
-        if remaining_medium_risk:
-            # Есть еще шкалы со средним риском
-            st.session_state.current_scale = remaining_medium_risk[0]
-            prepare_detailed_questions(remaining_medium_risk[0], "medium")
-        else:
-            # Проверяем, есть ли шкалы с высоким риском
-            if st.session_state.high_risk_scales:
-                st.session_state.stage = 'high_risk_assessment'
-                st.session_state.current_scale = st.session_state.high_risk_scales[0]
-                prepare_detailed_questions(st.session_state.high_risk_scales[0], "high")
-            else:
-                # Переходим к результатам
-                st.session_state.stage = 'results'
-                prepare_final_recommendations()
+def save_assessment():
+    """Сохранение итога скрининга (анкета, ответы, баллы, уровни риска) в хранилище"""
+    questionnaire = st.session_state.questionnaire_responses
+    record = {
+        'session_id': st.session_state.session_id,
+        'kind': 'screening',
+        'started_at': st.session_state.started_at,
+        'completed_at': datetime.now().isoformat(timespec="seconds"),
+        'unit': store.ASSESSMENT_UNIT,
+        'risk_level': screening.overall_risk_level(st.session_state.risk_levels_desc),
+        'recommendation': st.session_state.military_recommendation,
+        'full_name': questionnaire.get('full_name'),
+        'questionnaire': questionnaire,
+        'results': {
+            'scale_scores': st.session_state.scale_scores,
+            'risk_levels': st.session_state.risk_levels,
+            'risk_levels_desc': st.session_state.risk_levels_desc,
+            'detailed_results': st.session_state.detailed_results,
+            'final_recommendations': st.session_state.final_recommendations,
+            'keyword_flags': keyword_flag_records(questionnaire),
+        },
+    }
+    try:
+        # Итог подтверждается кандидату, поэтому дожидаемся его фиксации на диске
+        writer = store.get_writer()
+        writer.put_assessment(record, st.session_state.responses)
+        if not writer.flush(timeout=store.STORE_PUT_TIMEOUT, session_id=record['session_id']):
+            st.warning("Результаты ещё не записаны в хранилище: очередь записи не успела их зафиксировать")
+    except Exception as e:
+        st.warning(f"Не удалось сохранить результаты в хранилище: {str(e)}")
 
 def show_screening():
     """Отображение экрана первичного скрининга"""
@@ -985,7 +616,7 @@ def show_screening():
     progress = st.session_state.current_question_index / len(st.session_state.questions_order)
     
     # Отображаем текущий вопрос
-    question = st.session_state.questions_order[st.session_state.current_question_index]
+    question = question_bank.ITEMS[st.session_state.questions_order[st.session_state.current_question_index]]
     show_question(question, progress)
 
 def show_sincerity_warning():
@@ -1074,7 +705,7 @@ def show_detailed_assessment():
     progress = st.session_state.current_question_index / len(st.session_state.questions_order)
     
     # Отображаем текущий вопрос
-    question = st.session_state.questions_order[st.session_state.current_question_index]
+    question = question_bank.ITEMS[st.session_state.questions_order[st.session_state.current_question_index]]
     show_question(question, progress)
 
 def show_results():
@@ -1103,44 +734,19 @@ def show_results():
     # Общая оценка готовности к службе
     st.subheader("🪖 Общая оценка готовности к военной службе")
     
-    # Анализ ключевых показателей
-    critical_issues = []
-    warning_issues = []
-    
-    # Проверка критических факторов
-    if questionnaire.get("family_suicides") == "Да" or questionnaire.get("personal_suicides") == "Да":
-        critical_issues.append("Суицидальные факторы")
-    
-    if questionnaire.get("want_serve") == "Нет":
-        critical_issues.append("Нежелание служить")
-    
-    high_risk_scales = [scale for scale, level in st.session_state.risk_levels_desc.items() if "высокий" in level]
-    if high_risk_scales:
-        critical_issues.append(f"Высокие психологические риски ({len(high_risk_scales)} шкал)")
-    
-    # Проверка предупреждающих факторов
-    dependencies = []
-    if questionnaire.get("family_alcoholism") == "Да" or questionnaire.get("personal_alcoholism") == "Да":
-        dependencies.append("алкоголизм")
-    if questionnaire.get("family_drugs") == "Да" or questionnaire.get("personal_drugs") == "Да":
-        dependencies.append("наркомания")
-    if questionnaire.get("personal_gambling") == "Да" or questionnaire.get("betting") == "Да":
-        dependencies.append("игровая зависимость")
-    
-    if dependencies:
-        warning_issues.append(f"Факторы зависимости: {', '.join(dependencies)}")
-    
-    if questionnaire.get("credits"):
-        warning_issues.append("Финансовые обязательства")
-    
-    if questionnaire.get("hidden_health_facts"):
-        warning_issues.append("Скрытые медицинские факты")
-    
-    # Add this to the critical factors check section
-    if (bool(questionnaire.get('religion_teachers', '').strip()) and 
-        questionnaire.get('religious_attendance') in ['Несколько раз в неделю', 'Каждый день'] and 
-        questionnaire.get('social_events') == 'Нет'):
-        critical_issues.append("Риск экстремизма")
+    # Термины риска в свободных ответах (словарь keyword_flags)
+    keyword_issues = ([], [])
+    keyword_hits = []
+    try:
+        keyword_critical, keyword_warning, keyword_hits = keyword_flags.questionnaire_issues(questionnaire)
+        keyword_issues = (keyword_critical, keyword_warning)
+    except ValueError as e:
+        st.warning(f"Словарь терминов риска не загружен: {str(e)}")
+
+    # Критические и предупреждающие факторы — по правилам rules.py, как и итоговая рекомендация
+    evaluation = rules.evaluate(questionnaire, st.session_state.risk_levels_desc, keyword_issues)
+    critical_issues = evaluation.critical
+    warning_issues = evaluation.warning
     
     # Итоговое заключение
     if critical_issues:
@@ -1183,9 +789,17 @@ def show_results():
         st.metric("Предупреждения", len(warning_issues))
     with col4:
         st.metric("Вопросов отвечено", len(st.session_state.responses))
-    
+
+    if keyword_hits:
+        with st.expander(f"🔎 Термины риска в ответах анкеты ({len(keyword_hits)})"):
+            for hit in keyword_hits:
+                field = question_bank.FORM_FIELD_BY_ID.get(hit.field_id)
+                fragment = hit.fragment.replace(hit.text, f"**{hit.text}**", 1)
+                marker = "🔴" if hit.severity == "critical" else "🟡"
+                st.markdown(f"{marker} _{field.text if field else hit.field_id}_: …{fragment}…")
+
     st.markdown("---")
-    
+
     # Детальные результаты психологического тестирования
     st.subheader("🧠 Результаты психологического тестирования")
     
@@ -1232,6 +846,9 @@ def show_results():
                 colors.append('#F44336')  # Красный
         
         if scales:  # Проверяем, что есть данные для отображения
+            import pandas as pd
+            import matplotlib.pyplot as plt
+            
             # Создание DataFrame для графика
             df = pd.DataFrame({
                 'Шкала': scales,
@@ -1479,25 +1096,21 @@ def generate_military_report():
         
         report.append("")
     
-    # Заключение
-    critical_issues = []
-    if questionnaire.get("family_suicides") == "Да" or questionnaire.get("personal_suicides") == "Да":
-        critical_issues.append("Суицидальные факторы")
-    if questionnaire.get("want_serve") == "Нет":
-        critical_issues.append("Нежелание служить")
-    
-    high_risk_scales = []
-    if hasattr(st.session_state, 'risk_levels_desc'):
-        high_risk_scales = [scale for scale, level in st.session_state.risk_levels_desc.items() if "высокий" in level]
-    if high_risk_scales:
-        critical_issues.append(f"Высокие психологические риски")
+    # Заключение — по тем же правилам (rules.py), что экран результатов и итоговая рекомендация
+    risk_levels_desc = getattr(st.session_state, 'risk_levels_desc', None) or {}
+    evaluation = rules.evaluate(questionnaire, risk_levels_desc)
     
     report.append("ЗАКЛЮЧЕНИЕ:")
     report.append("-" * 12)
-    if critical_issues:
+    if evaluation.verdict == "not_recommended":
         report.append("НЕ РЕКОМЕНДУЕТСЯ к военной службе")
         report.append("Критические факторы риска:")
-        for issue in critical_issues:
+        for issue in evaluation.critical:
+            report.append(f"- {issue}")
+    elif evaluation.verdict == "recommended_with_restrictions":
+        report.append("УСЛОВНО ГОДЕН к военной службе")
+        report.append("Факторы, требующие внимания:")
+        for issue in evaluation.warning:
             report.append(f"- {issue}")
     else:
         report.append("РЕКОМЕНДУЕТСЯ к военной службе при соблюдении мер поддержки")
@@ -1561,16 +1174,65 @@ def generate_military_csv():
     writer.writerows(data)
     return output.getvalue()
 
+def show_tts_settings():
+    """Настройки озвучивания в боковой панели: включение, голос и API ключ сессии"""
+    with st.expander("🔊 Озвучивание вопросов"):
+        st.session_state.tts_enabled = st.checkbox(
+            "Включить озвучивание вопросов", value=st.session_state.tts_enabled
+        )
+        voices = tts.voices()
+        st.session_state.tts_voice = st.selectbox(
+            "Выберите голос",
+            voices,
+            index=voices.index(st.session_state.tts_voice) if st.session_state.tts_voice in voices else 0
+        )
+        
+        if not tts_backends.get_backend().needs_api_key:
+            st.caption("Синтез выполняется локально, API ключ не нужен")
+        elif st.session_state.tts_api_key:
+            st.caption("Используется API ключ, введённый в этой сессии")
+            if st.button("Забыть API ключ", key="tts_forget_key"):
+                st.session_state.tts_api_key = None
+                st.rerun()
+        else:
+            if os.environ.get("OPENAI_API_KEY"):
+                st.caption("Используется API ключ сервера")
+            st.markdown("""
+            Для озвучивания вопросов требуется API ключ OpenAI. Вы можете получить ключ API на сайте 
+            [OpenAI](https://platform.openai.com/api-keys).
+            """)
+            api_key = st.text_input(
+                "API ключ OpenAI",
+                type="password",
+                help="Ключ хранится только в текущей сессии"
+            )
+            if api_key and st.button("Сохранить API ключ", key="tts_save_key"):
+                if set_openai_api_key(api_key):
+                    st.success("API ключ успешно сохранен! Функция озвучивания доступна.")
+                    st.rerun()
+                else:
+                    st.error("Не удалось сохранить API ключ.")
+
 # Основная функция приложения
 def main():
     # Инициализация состояния сессии
     initialize_session()
-    
+
+    # Перезагрузка страницы (новая сессия Streamlit) продолжает сессию по коду из адреса
+    if not st.session_state.resume_checked:
+        st.session_state.resume_checked = True
+        code = st.query_params.get("resume")
+        if code and st.session_state.stage == 'start':
+            try:
+                resume_session(code)
+            except ValueError:
+                pass
+
     # Боковая панель с информацией о прогрессе
     with st.sidebar:
         st.header("📋 Прогресс обследования")
 
-        if st.session_state.stage in ['p2_test', 'p2_results']:
+        if st.session_state.stage in ['p2_test', 'p2_results', 'p2_invalid']:
             # Отдельный пайплайн «Прогноз-2»
             st.info("Режим: тест «Прогноз-2»")
             total = len(prognoz2.PROGNOZ2_QUESTIONS)
@@ -1578,6 +1240,8 @@ def main():
                 done = st.session_state.p2_current_index
                 st.progress(done / total)
                 st.metric("Прогресс", f"{done + 1}/{total}")
+            elif st.session_state.stage == 'p2_invalid':
+                st.error("⛔ Тест прерван: протокол недостоверен")
             else:
                 st.success("✅ Тест завершён")
                 result = st.session_state.get('p2_result')
@@ -1620,6 +1284,12 @@ def main():
                     st.write(f"**Кандидат**: {st.session_state.questionnaire_responses['full_name']}")
 
         st.markdown("---")
+
+        if st.session_state.resume_code:
+            st.info(f"🔑 Код продолжения: **{store.format_resume_code(st.session_state.resume_code)}**")
+            st.caption("При сбое или обрыве связи введите его на стартовом экране любого терминала")
+            if st.query_params.get("resume") != st.session_state.resume_code:
+                st.query_params["resume"] = st.session_state.resume_code
         
         # Кнопки управления
         if st.button("🔄 Начать заново"):
@@ -1628,8 +1298,25 @@ def main():
         
         if st.session_state.stage != 'start' and st.button("🏠 В начало"):
             st.session_state.stage = 'start'
+            log_event("stage", "start")
+            st.rerun()
+
+        if admin.available() and st.session_state.stage != 'admin_search' and st.button("🔎 Поиск по анкетам"):
+            admin.open_screen('admin_search')
+            st.rerun()
+
+        if admin.available() and st.session_state.stage != 'admin_psychometrics' and st.button("📈 Психометрика"):
+            admin.open_screen('admin_psychometrics')
+            st.rerun()
+
+        if admin.available() and st.session_state.stage != 'admin_metrics' and st.button("📡 Нагрузка"):
+            admin.open_screen('admin_metrics')
             st.rerun()
         
+        # Настройки озвучивания вопросов
+        if AUDIO_AVAILABLE:
+            show_tts_settings()
+        
         # Информация о системе
         with st.expander("ℹ️ О системе"):
             st.markdown("""
@@ -1661,6 +1348,14 @@ def main():
         prognoz2.show_prognoz2_test()
     elif st.session_state.stage == 'p2_results':
         prognoz2.show_prognoz2_results()
+    elif st.session_state.stage == 'p2_invalid':
+        prognoz2.show_prognoz2_invalid()
+    elif st.session_state.stage == 'admin_search':
+        admin.show_search()
+    elif st.session_state.stage == 'admin_psychometrics':
+        admin.show_psychometrics()
+    elif st.session_state.stage == 'admin_metrics':
+        admin.show_metrics()
     else:
         st.error("❌ Неизвестный этап обследования. Пожалуйста, начните заново.")
         if st.button("🔄 Начать заново"):
@@ -0,0 +1,283 @@
+"""Пакетный пересчёт обследований без Streamlit на всех ядрах.
+
+Итоги скрининга пересчитываются из ответов на пункты теми же функциями, что вызывает UI
+(screening.run_responses: этапы адаптивного скрининга, баллы, уровни риска, углублённая
+оценка, рекомендации по правилам rules.py), «Прогноз-2» — из упакованной записи ответов
+(prognoz2.score_prognoz2, стэны по нормам). Источник — хранилище (store) или файлы JSON
+Lines с ответами. Работа делится на порции по --chunk обследований, порции считаются в
+ProcessPoolExecutor, результаты пишутся в выходной файл JSON Lines по мере готовности в
+порядке источника; в памяти — не больше двух порций на процесс.
+
+Строка входного файла:
+    {"session_id": "...", "kind": "screening", "questionnaire": {...}, "responses": {"ag1": 4, ...}}
+    {"session_id": "...", "kind": "prognoz2", "responses": {"p2_1": true, ...}, "norms_version": "..."}
+
+Запуск:
+    python batch.py --from 2025-01-01 --to 2025-12-31 --out results.jsonl   # хранилище за год
+    python batch.py --input imported.jsonl --out results.jsonl --workers 8
+    python batch.py --bench 100000                                           # замер скорости
+"""
+
+import argparse
+import collections
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import keyword_flags
+import prognoz2
+import question_bank
+import replay
+import screening
+import store
+
+BATCH_CHUNK = int(os.environ.get("BATCH_CHUNK", "500"))  # обследований в порции
+
+# Поля итога скрининга, которые сверяются с сохранёнными
+SCREENING_RESULT_KEYS = ("scale_scores", "risk_levels", "risk_levels_desc", "detailed_results", "final_recommendations")
+
+
+def cpu_count():
+    """Число ядер, доступных процессу."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _as_json(value):
+    return json.loads(json.dumps(value, ensure_ascii=False, default=str))
+
+
+# --- Единицы работы ---
+
+def unit_from_record(record):
+    """Единица работы из записи хранилища (store.iter_assessments(with_responses=True))."""
+    results = record["results"] or {}
+    unit = {
+        "session_id": record["session_id"],
+        "kind": record["kind"],
+        "questionnaire": record.get("questionnaire") or {},
+    }
+    if record["kind"] == "screening":
+        unit["responses"] = record.get("responses") or {}
+        unit["stored"] = {key: results.get(key) for key in SCREENING_RESULT_KEYS}
+        unit["stored"]["recommendation"] = record.get("recommendation")
+    else:
+        unit["p2_answers"] = bytes(record["p2_answers"] or b"")
+        unit["norms_version"] = results.get("norms_version")
+        unit["stored"] = {"results": results}
+    return unit
+
+
+def unit_from_line(line, number):
+    """Единица работы из строки входного файла JSON Lines."""
+    data = json.loads(line)
+    kind = data.get("kind", "screening")
+    if kind not in ("screening", "prognoz2"):
+        raise ValueError(f"Строка {number}: неизвестный вид обследования {kind!r}")
+    unit = {
+        "session_id": data.get("session_id") or f"line-{number}",
+        "kind": kind,
+        "questionnaire": data.get("questionnaire") or {},
+    }
+    if kind == "screening":
+        unit["responses"] = {item_id: int(value) for item_id, value in (data.get("responses") or {}).items()}
+    else:
+        unit["p2_answers"] = prognoz2.prognoz2_pack(data.get("responses") or {})
+        unit["norms_version"] = data.get("norms_version")
+    return unit
+
+
+def read_input(paths):
+    """Единицы работы из файлов JSON Lines (пустые строки пропускаются)."""
+    for path in paths:
+        with open(path, encoding="utf-8") as input_file:
+            for number, line in enumerate(input_file, start=1):
+                if line.strip():
+                    yield unit_from_line(line, number)
+
+
+# --- Пересчёт (в процессах пула) ---
+
+def assess_screening(session_id, questionnaire, responses):
+    """Итог скрининга по ответам на пункты или None, если ответов не хватает до итога."""
+    state = replay.new_state(session_id, questionnaire)
+    if not screening.run_responses(state, responses):
+        return None
+    results = {key: state[key] for key in SCREENING_RESULT_KEYS}
+    results["keyword_flags"] = keyword_flags.hit_records(keyword_flags.scan_questionnaire(questionnaire))
+    return {
+        "risk_level": screening.overall_risk_level(state["risk_levels_desc"]),
+        "recommendation": state["military_recommendation"],
+        "results": results,
+    }
+
+
+def assess_unit(unit, norms_version=None):
+    """Строка результата для единицы работы."""
+    output = {"session_id": unit["session_id"], "kind": unit["kind"]}
+    try:
+        if unit["kind"] == "screening":
+            assessed = assess_screening(unit["session_id"], unit["questionnaire"], unit["responses"])
+            if assessed is None:
+                output["status"] = "incomplete"
+                return output
+            compared = dict(assessed["results"], recommendation=assessed["recommendation"])
+        else:
+            if prognoz2.prognoz2_answered_count(unit["p2_answers"]) < prognoz2.PROGNOZ2_TOTAL:
+                output["status"] = "incomplete"
+                return output
+            result = prognoz2.score_prognoz2(unit["p2_answers"], norms_version or unit.get("norms_version"))
+            assessed = {"risk_level": result["risk_level"], "results": result}
+            compared = {"results": result}
+    except ValueError as e:
+        output["status"] = "error"
+        output["error"] = str(e)
+        return output
+    output["status"] = "ok"
+    output.update(_as_json(assessed))
+    stored = unit.get("stored")
+    if stored is not None:
+        compared = _as_json(compared)
+        output["changed"] = [key for key, value in stored.items() if compared.get(key) != value]
+    return output
+
+
+def assess_chunk(units, norms_version=None):
+    """Порция единиц работы -> строки результата (выполняется в процессе пула)."""
+    return [assess_unit(unit, norms_version) for unit in units]
+
+
+def _chunks(units, chunk_size):
+    chunk = []
+    for unit in units:
+        chunk.append(unit)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run(units, out, workers=None, chunk_size=BATCH_CHUNK, norms_version=None):
+    """Пересчёт единиц работы; строки JSON Lines пишутся в out. Возвращает счётчики.
+
+    Одновременно в работе не больше workers * 2 порций, так что источник читается по мере
+    записи результатов, а порядок строк совпадает с порядком источника.
+    """
+    workers = workers or cpu_count()
+    counts = collections.Counter()
+
+    def write(lines):
+        for line in lines:
+            counts[line["status"]] += 1
+            counts["changed"] += bool(line.get("changed"))
+            out.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+    if workers == 1:
+        # Без пула: удобно для отладки и не тратит время на передачу порций
+        for chunk in _chunks(units, chunk_size):
+            write(assess_chunk(chunk, norms_version))
+        return counts
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = collections.deque()
+        for chunk in _chunks(units, chunk_size):
+            pending.append(pool.submit(assess_chunk, chunk, norms_version))
+            if len(pending) >= workers * 2:
+                write(pending.popleft().result())
+        while pending:
+            write(pending.popleft().result())
+    return counts
+
+
+# --- Замер скорости ---
+
+def synthetic_units(count, seed=1):
+    """Синтетические обследования: ответы на все пункты (скрининг) или на все 86 вопросов «Прогноз-2»."""
+    rng = random.Random(seed)
+    item_ids = [item.id for item in question_bank.ITEMS]
+    for index in range(count):
+        session_id = f"bench-{index:08d}"
+        if index % 2:
+            responses = {question.id: rng.random() < 0.4 for question in prognoz2.PROGNOZ2_QUESTIONS}
+            yield {"session_id": session_id, "kind": "prognoz2", "questionnaire": {},
+                   "p2_answers": prognoz2.prognoz2_pack(responses), "norms_version": None}
+        else:
+            responses = {item_id: rng.choice((1, 2, 3, 4, 5, 5, 4)) for item_id in item_ids}
+            yield {"session_id": session_id, "kind": "screening", "questionnaire": {"want_serve": "Да"},
+                   "responses": responses}
+
+
+def bench(count, workers, chunk_size):
+    units = list(synthetic_units(count))
+    print(f"Обследований: {count} (половина — скрининг, половина — «Прогноз-2»), порция {chunk_size}")
+    for pool_size in sorted({1, workers}):
+        with open(os.devnull, "w", encoding="utf-8") as out:
+            start = time.perf_counter()
+            counts = run(units, out, pool_size, chunk_size)
+            elapsed = time.perf_counter() - start
+        print(f"  процессов {pool_size}: {elapsed:.1f} с ({count / elapsed:,.0f} в секунду); итоги {dict(counts)}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетный пересчёт обследований без Streamlit")
+    parser.add_argument("--input", action="append", default=[], help="файл JSON Lines с ответами (можно несколько)")
+    parser.add_argument("--db", default=None, help="база обследований (по умолчанию ASSESSMENT_DB)")
+    parser.add_argument("--kind", choices=("screening", "prognoz2"), default=None, help="только этот вид")
+    parser.add_argument("--from", dest="date_from", default=None, help="с даты (ISO), по completed_at")
+    parser.add_argument("--to", dest="date_to", default=None, help="по дату (ISO), включительно")
+    parser.add_argument("--norms", default=None, help="версия норм «Прогноз-2» вместо сохранённой")
+    parser.add_argument("--out", default="-", help="выходной файл JSON Lines (по умолчанию stdout)")
+    parser.add_argument("--workers", type=int, default=cpu_count(), help="процессов (по умолчанию — все ядра)")
+    parser.add_argument("--chunk", type=int, default=BATCH_CHUNK, help="обследований в порции")
+    parser.add_argument("--bench", type=int, metavar="N", help="замер на N синтетических обследованиях")
+    args = parser.parse_args()
+    if args.workers < 1 or args.chunk < 1:
+        parser.error("--workers и --chunk должны быть не меньше 1")
+    if args.norms is not None and args.norms not in prognoz2.prognoz2_available_norms():
+        parser.error(f"нормы {args.norms!r} не найдены; доступны {prognoz2.prognoz2_available_norms()}")
+    for option, value in (("--from", args.date_from), ("--to", args.date_to)):
+        if value is None:
+            continue
+        try:
+            date.fromisoformat(value)
+        except ValueError:
+            parser.error(f"{option}: ожидается дата в формате ГГГГ-ММ-ДД, получено {value!r}")
+
+    if args.bench:
+        return bench(args.bench, args.workers, args.chunk)
+
+    if args.input:
+        units = (unit for unit in read_input(args.input) if args.kind is None or unit["kind"] == args.kind)
+    else:
+        db = store.AssessmentStore(args.db) if args.db else store.get_store()
+        records = db.iter_assessments(
+            kind=args.kind, chunk_size=args.chunk * 4, with_responses=True,
+            date_from=args.date_from, date_to=args.date_to,
+        )
+        units = (unit_from_record(record) for record in records)
+
+    out = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8")
+    start = time.perf_counter()
+    try:
+        counts = run(units, out, args.workers, args.chunk, args.norms)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - start
+    total = counts["ok"] + counts["incomplete"] + counts["error"]
+    print(
+        f"Обследований: {total} за {elapsed:.1f} с, процессов {args.workers}; пересчитано {counts['ok']}, "
+        f"не завершено {counts['incomplete']}, ошибок {counts['error']}; итог изменился у {counts['changed']}",
+        file=sys.stderr,
+    )
+    return 1 if counts["error"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+"""Бенчмарк подсчёта «Прогноз-2»: построчный score_prognoz2 против пакетных вариантов.
+
+Запуск:
+    python bench_prognoz2.py [число_бланков]
+
+Генерирует случайную матрицу ответов, считает её обоими способами, сверяет результаты
+поэлементно и печатает время.
+"""
+
+import sys
+import time
+
+import numpy as np
+
+import prognoz2
+
+
+def _rows_to_responses(answers):
+    """Матрица ответов -> список dict {p2_id: bool}, как в st.session_state.p2_responses."""
+    ids = [question.id for question in prognoz2.PROGNOZ2_QUESTIONS]
+    return [dict(zip(ids, row.tolist())) for row in answers]
+
+
+def main(n=20000, seed=2025):
+    rng = np.random.default_rng(seed)
+    # Своя доля ответов «Да» у каждого бланка, чтобы покрыть все стэны
+    answers = rng.random((n, prognoz2.PROGNOZ2_TOTAL)) < rng.random((n, 1))
+    sessions = _rows_to_responses(answers)
+
+    start = time.perf_counter()
+    loop_results = [prognoz2.score_prognoz2(responses) for responses in sessions]
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = prognoz2.score_prognoz2_batch(answers)
+    batch_time = time.perf_counter() - start
+
+    records = prognoz2.prognoz2_pack_batch(answers)
+    start = time.perf_counter()
+    packed = prognoz2.score_prognoz2_packed_batch(records)
+    packed_time = time.perf_counter() - start
+
+    for field in ("npu_raw_score", "sincerity_score", "sincerity_valid", "sten", "risk_level"):
+        expected = [result[field] for result in loop_results]
+        if list(batch[field].tolist()) != expected:
+            raise SystemExit(f"Расхождение в поле {field} (score_prognoz2_batch)")
+        if list(packed[field].tolist()) != expected:
+            raise SystemExit(f"Расхождение в поле {field} (score_prognoz2_packed_batch)")
+
+    print(f"Бланков: {n}; запись бланка: {prognoz2.PROGNOZ2_RECORD_BYTES} байт")
+    print(f"score_prognoz2 (цикл):        {loop_time * 1000:9.1f} мс")
+    print(f"score_prognoz2_batch:         {batch_time * 1000:9.1f} мс  (x{loop_time / batch_time:.0f})")
+    print(f"score_prognoz2_packed_batch:  {packed_time * 1000:9.1f} мс  (x{loop_time / packed_time:.0f})")
+    print("Результаты совпадают")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,103 @@
+"""Бенчмарк полнотекстового поиска по анкетам: индексация и время запросов.
+
+Запуск:
+    python bench_search.py [число_анкет] [путь_к_базе]
+
+Создаёт временную базу (или указанную), заполняет свободные поля анкет синтетическими
+ответами через AssessmentStore.apply пачками, как очередь отложенной записи, и замеряет
+запросы store.search_questionnaire по всем полям и по двум полям: медиану и 95-й
+перцентиль. Частоты слов — по Ципфу, так что частые слова встречаются в сотнях тысяч ответов.
+"""
+
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import question_bank
+import store
+
+_VOCABULARY = (
+    "кредит кредиты кредитам займ долг долги банк ипотека микрозайм штраф судимость суд "
+    "мать отец брат сестра дядя тетя бабушка дедушка живет работает умер болел пенсионер "
+    "Астана Алматы Караганда Шымкент Актобе аул село город школа колледж университет "
+    "армия служба контракт футбол бокс книги рыбалка охота друзья мечеть церковь намаз "
+    "нет не было никогда иногда часто раньше сейчас учитель водитель строитель продавец "
+    "Сирия Турция Россия Казахстан Узбекистан интернет телефон телеграм видео проповедь"
+).split()
+
+_SYLLABLES = "ба ве го да жи за ка ли мо на пе ро са ту фи ха це чу ша ер ин ов ан ук ыл".split()
+RARE_WORDS = 20000  # редкие псевдослова: частоты слов в ответах распределены по Ципфу
+
+QUERIES = ("кредиты", "долг банк", "судимость", "Сирия", "мечеть намаз", "дядя работает", "проповеди", "ипотек")
+
+
+def _vocabulary(rng):
+    """Словарь и накопленные веса Ципфа: частые слова из _VOCABULARY, затем редкие псевдослова."""
+    words = list(_VOCABULARY)
+    rng.shuffle(words)
+    words += ["".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(RARE_WORDS)]
+    weights = []
+    total = 0.0
+    for rank in range(1, len(words) + 1):
+        total += 1 / rank
+        weights.append(total)
+    return words, weights
+
+
+def _answer(rng, vocabulary):
+    words, weights = vocabulary
+    return " ".join(rng.choices(words, cum_weights=weights, k=rng.randint(2, 25)))
+
+
+def main(n=200000, path=None, seed=2025, batch=500):
+    rng = random.Random(seed)
+    path = path or os.path.join(tempfile.mkdtemp(), "bench_search.db")
+    db = store.AssessmentStore(path)
+    if not db.search_available:
+        print("SQLite собран без FTS5: поиск недоступен")
+        return 1
+
+    vocabulary = _vocabulary(rng)
+    fields = question_bank.FREE_TEXT_FIELDS
+    start = time.perf_counter()
+    operations = []
+    for _ in range(n):
+        session_id = store.new_session_id()
+        operations.append(("field", session_id, "full_name", json.dumps(f"Кандидат {rng.randint(1, 10**6)}")))
+        for field_id in rng.sample(fields, rng.randint(3, len(fields))):
+            operations.append(("field", session_id, field_id, json.dumps(_answer(rng, vocabulary), ensure_ascii=False)))
+        if len(operations) >= batch:
+            db.apply(operations)
+            operations = []
+    if operations:
+        db.apply(operations)
+    elapsed = time.perf_counter() - start
+    print(f"Анкет: {n}, индексация {elapsed:.1f} с ({n / elapsed:,.0f} анкет в секунду), база {path}")
+    start = time.perf_counter()
+    db.optimize_search_index()
+    print(f"Слияние сегментов индекса: {time.perf_counter() - start:.1f} с")
+
+    # Последнее слово словаря — одно из самых редких
+    queries = QUERIES + (vocabulary[0][-1],)
+    for query, field_ids in [(query, None) for query in queries] + [(query, ("credits", "religion_teachers")) for query in queries]:
+        timings = []
+        for _ in range(20):
+            start = time.perf_counter()
+            results = db.search_questionnaire(query, field_ids)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        print(
+            f"  {query!r:<18} {'по двум полям' if field_ids else 'все поля':<14} медиана {statistics.median(timings):7.1f} мс, "
+            f"p95 {timings[int(len(timings) * 0.95) - 1]:7.1f} мс, результатов {len(results)}"
+        )
+    db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    sys.exit(main(count, sys.argv[2] if len(sys.argv) > 2 else None))
@@ -0,0 +1,97 @@
+"""Проверка времени холодного старта app.py по отчёту `python -X importtime`.
+
+Запуск:
+    python check_startup.py [--budget-ms 1000] [--runs 3] [--top 15]
+
+Импортирует app.py в отдельном процессе (несколько раз, берётся лучший результат),
+печатает самые тяжёлые модули верхнего уровня и завершается с кодом 1, если время импорта
+превышает бюджет или при старте загружен модуль, который должен импортироваться лениво.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+# Бюджет холодного импорта app.py, мс (включая сам streamlit)
+STARTUP_BUDGET_MS = int(os.environ.get("STARTUP_BUDGET_MS", "1000"))
+
+# Модули, которые app.py загружает только на экранах, где они нужны
+LAZY_MODULES = ("pandas", "matplotlib", "openai", "seaborn")
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def measure_import(module="app"):
+    """Отчёт -X importtime для импорта module: список (self_us, cumulative_us, depth, name)."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Не удалось импортировать {module}:\n{completed.stderr[-2000:]}")
+
+    rows = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        rows.append((int(self_us), int(cumulative_us), depth, name.strip()))
+    return rows
+
+
+def _direct_children(rows, module):
+    """Прямые импорты module: в отчёте дочерние строки идут перед строкой родителя."""
+    pending = []
+    for row in rows:
+        if row[2] == 0:
+            if row[3] == module:
+                return pending
+            pending = []
+        elif row[2] == 1:
+            pending.append(row)
+    return []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка бюджета времени старта app.py")
+    parser.add_argument("--budget-ms", type=int, default=STARTUP_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    best = None
+    for _ in range(max(args.runs, 1)):
+        rows = measure_import()
+        total_us = next(cumulative for _, cumulative, depth, name in rows if depth == 0 and name == "app")
+        if best is None or total_us < best[0]:
+            best = (total_us, rows)
+    total_us, rows = best
+    children = _direct_children(rows, "app")
+
+    print(f"Импорт app.py: {total_us / 1000:.0f} мс (бюджет {args.budget_ms} мс)")
+    print("Самые тяжёлые импорты:")
+    direct = sorted(children, key=lambda row: row[1], reverse=True)
+    for _, cumulative_us, _, name in direct[: args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} мс  {name}")
+
+    loaded = {name for _, _, _, name in rows}
+    eager = [module for module in LAZY_MODULES if module in loaded]
+
+    failed = False
+    if eager:
+        print(f"ОШИБКА: при старте загружены модули, которые должны быть ленивыми: {', '.join(eager)}")
+        failed = True
+    if total_us / 1000 > args.budget_ms:
+        print(f"ОШИБКА: время импорта превышает бюджет на {total_us / 1000 - args.budget_ms:.0f} мс")
+        failed = True
+    if not failed:
+        print("OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""Самопроверка очереди отложенной записи store.WriteBehindQueue на временной базе.
+
+Запуск:
+    python check_store.py [--records 2000] [--batch-ms 50]
+
+Проверяет групповую фиксацию (записи нескольких сессий ложатся в общие транзакции и все
+доходят до базы), сообщение flush(session_id=...) о «битой» записи только той сессии, которой
+она принадлежит, и повтор по одной остальных записей той же группы. Завершается с кодом 1,
+если какая-то проверка не прошла.
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import store
+
+
+def _count(path, table, session_id):
+    with sqlite3.connect(path) as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {table} WHERE session_id = ?", (session_id,)).fetchone()[0]
+
+
+def check_group_commit(path, records, batch_ms):
+    """Записи двух сессий вперемешку: все зафиксированы, транзакций заметно меньше, чем записей."""
+    writer = store.WriteBehindQueue(store.AssessmentStore(path), batch_ms=batch_ms)
+    start = time.perf_counter()
+    for index in range(records):
+        writer.put_response(f"group-{index % 2}", f"item-{index // 2}", index % 5 + 1)
+    flushed = writer.flush(timeout=30)
+    elapsed = time.perf_counter() - start
+    stats = writer.stats()
+    writer.close()
+    saved = _count(path, "responses", "group-0") + _count(path, "responses", "group-1")
+    print(
+        f"Групповая фиксация: {records} записей за {elapsed * 1000:.0f} мс, транзакций {stats['batches']}, "
+        f"в среднем {stats['avg_batch']:.1f} записей"
+    )
+    errors = []
+    if not flushed:
+        errors.append("flush не дождался фиксации")
+    if saved != records or stats["records"] != records:
+        errors.append(f"в базе {saved} записей, учтено {stats['records']} из {records}")
+    if stats["batches"] >= records:
+        errors.append("записи фиксируются по одной, группы не собираются")
+    return errors
+
+
+def check_poisoned_record(path, batch_ms):
+    """«Битая» запись сессии poisoned в одной группе со здоровыми записями её и сессии healthy."""
+    # Окно больше времени постановки, чтобы все записи попали в одну транзакцию
+    writer = store.WriteBehindQueue(store.AssessmentStore(path), batch_ms=max(batch_ms, 200))
+    for index in range(10):
+        writer.put_response("healthy", f"item-{index}", 3)
+        writer.put_response("poisoned", f"item-{index}", 3)
+    # Журнал событий должен быть байтами: привязать dict sqlite не может
+    writer.put_event("poisoned", {"not": "bytes"})
+    writer.put_field("poisoned", "unit", "в/ч 00000")
+    writer.put_field("healthy", "unit", "в/ч 00000")
+
+    errors = []
+    try:
+        writer.flush(timeout=30, session_id="healthy")
+    except RuntimeError as e:
+        errors.append(f"flush чужой сессии сообщил об ошибке: {e}")
+    try:
+        writer.flush(timeout=30, session_id="poisoned")
+        errors.append("flush не сообщил о несохранённой записи")
+    except RuntimeError as e:
+        print(f"«Битая» запись: {e}")
+    try:
+        writer.flush(timeout=30, session_id="poisoned")
+    except RuntimeError:
+        errors.append("об ошибке сообщено повторно")
+    stats = writer.stats()
+    writer.close()
+
+    print(f"Повтор по одной: сохранено {stats['records']}, не сохранено {stats['failed']}")
+    if stats["failed"] != 1:
+        errors.append(f"не сохранено {stats['failed']} записей вместо одной")
+    for session_id in ("healthy", "poisoned"):
+        responses = _count(path, "responses", session_id)
+        fields = _count(path, "questionnaire_answers", session_id)
+        if responses != 10 or fields != 1:
+            errors.append(f"сессия {session_id}: в базе {responses} ответов и {fields} полей вместо 10 и 1")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Самопроверка очереди отложенной записи")
+    parser.add_argument("--records", type=int, default=2000, help="записей в проверке групповой фиксации")
+    parser.add_argument("--batch-ms", type=int, default=store.STORE_BATCH_MS, help="окно групповой фиксации, мс")
+    args = parser.parse_args()
+    if args.records < 2:
+        parser.error("--records должно быть не меньше 2")
+
+    with tempfile.TemporaryDirectory() as directory:
+        errors = check_group_commit(os.path.join(directory, "group.db"), args.records, args.batch_ms)
+        errors += check_poisoned_record(os.path.join(directory, "poisoned.db"), args.batch_ms)
+
+    for error in errors:
+        print(f"ОШИБКА: {error}")
+    if not errors:
+        print("OK")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,562 @@
+"""Колоночная выгрузка обследований для аналитики по подразделениям и когортам.
+
+Итоги из хранилища (store.py) раскладываются по столбцам фиксированной ширины — отдельный
+файл на столбец: ответы на пункты (uint8, 0 — нет ответа), запись «Прогноз-2» (22 байта
+битами, как prognoz2_pack), баллы и уровни риска шкал, стэн, заключение, коды вариантов
+ответов анкеты и признаки заполненных свободных полей. Файлы открываются через np.memmap,
+поэтому запросы к миллиону кандидатов не загружают выгрузку в память целиком: фильтры —
+векторные сравнения столбцов, сводка считается блоками по BLOCK_ROWS строк.
+
+Строка — одно обследование (скрининг или «Прогноз-2»). Новые итоги дописываются порциями
+в порядке записи в хранилище (store.iter_completed, по seq); seq последнего прочитанного
+итога хранится в manifest.json вместе с числом строк и раскладкой столбцов. Перезаписанный
+итог заменяет свою строку на месте: строку по (сессия, вид) находит индекс сессий —
+хэш-таблица с открытой адресацией в session_index.bin. Поколение выгрузки (generation в
+manifest.json) меняется при пересборке и при замене строк, чтобы накопленные по выгрузке
+суммы (psychometrics.py) пересчитывались заново. Если раскладка устарела (изменился банк
+вопросов или варианты ответов анкеты), выгрузку нужно пересобрать (--rebuild).
+
+Запуск:
+    python cohort_store.py --sync                                   # дописать новые итоги
+    python cohort_store.py --summary --unit "в/ч 1234" --from 2025-01-01
+    python cohort_store.py --bench 1000000                          # замер на синтетической выгрузке
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import prognoz2
+import question_bank
+import rules
+import store
+from question_bank import SCALE_NAMES, SCREENING_QUESTIONS
+
+COHORT_DIR = os.environ.get("COHORT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cohort"))
+COHORT_FORMAT = 2
+BLOCK_ROWS = 1 << 16  # строк в блоке при подсчёте сводки
+INDEX_MIN_SLOTS = 1 << 12  # ячеек индекса сессий; заполнение держится не выше половины
+
+KINDS = ("screening", "prognoz2")
+SCALES = tuple(SCREENING_QUESTIONS)
+SCALE_LEVELS = ("", "low", "medium", "high")  # код 0 — шкала не оценивалась
+ITEM_IDS = tuple(item.id for item in question_bank.ITEMS)
+# Поля анкеты с вариантами ответа: код — номер варианта с 1, 0 — поле не заполнено
+CHOICE_FIELDS = tuple(field.id for field in question_bank.FORM_FIELDS if field.type in ("select", "radio"))
+TEXT_FIELDS = question_bank.FREE_TEXT_FIELDS
+
+# Столбцы: (имя, тип, форма строки, значение «нет данных»)
+COLUMNS = (
+    ("session_id", "S26", (), b""),
+    ("kind", "u1", (), 0),
+    ("completed", "M8[D]", (), np.datetime64("NaT")),
+    ("unit", "u2", (), 0),
+    ("risk_level", "i1", (), -1),
+    ("recommendation", "i1", (), -1),
+    ("responses", "u1", (len(ITEM_IDS),), 0),
+    ("scale_scores", "i2", (len(SCALES),), -1),
+    ("scale_levels", "u1", (len(SCALES),), 0),
+    ("sincerity_warning", "?", (), False),
+    ("p2_record", "u1", (prognoz2.PROGNOZ2_RECORD_BYTES,), 0),
+    ("p2_sten", "i1", (), -1),
+    ("p2_raw", "i2", (), -1),
+    ("p2_sincerity", "i2", (), -1),
+    ("fields", "u1", (len(CHOICE_FIELDS),), 0),
+    ("text_present", "?", (len(TEXT_FIELDS),), False),
+)
+COLUMN_BY_NAME = {column[0]: column for column in COLUMNS}
+
+_ITEM_INDEX = {item_id: index for index, item_id in enumerate(ITEM_IDS)}
+_OPTION_CODES = {
+    field_id: {option: code for code, option in enumerate(question_bank.FORM_FIELD_BY_ID[field_id].options, start=1)}
+    for field_id in CHOICE_FIELDS
+}
+
+
+def _layout():
+    """Раскладка столбцов: при расхождении с manifest.json выгрузку нужно пересобрать."""
+    return {
+        "format": COHORT_FORMAT,
+        "columns": [[name, dtype, list(shape)] for name, dtype, shape, _ in COLUMNS],
+        "items": list(ITEM_IDS),
+        "scales": list(SCALES),
+        "fields": {field_id: list(question_bank.FORM_FIELD_BY_ID[field_id].options) for field_id in CHOICE_FIELDS},
+        "text_fields": list(TEXT_FIELDS),
+    }
+
+
+def _new_generation():
+    return os.urandom(8).hex()
+
+
+def key_hash(session_ids, kinds):
+    """64-битный хэш ключа (сессия, код вида) для индекса сессий."""
+    words = np.ascontiguousarray(np.asarray(session_ids, dtype="S26").astype("S32")).view(np.uint64).reshape(-1, 4)
+    value = np.asarray(kinds, dtype=np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    with np.errstate(over="ignore"):
+        for column in range(4):
+            value = (value ^ words[:, column]) * np.uint64(0xBF58476D1CE4E5B9)
+            value ^= value >> np.uint64(31)
+    return value
+
+
+def _place(table, hashes, rows):
+    """Запись номеров строк в свободные ячейки таблицы (линейное пробирование, векторно)."""
+    mask = np.uint64(table.size - 1)
+    slot = (hashes & mask).astype(np.int64)
+    pending = np.arange(rows.size)
+    while pending.size:
+        candidates = pending[table[slot[pending]] == 0]
+        # На свободную ячейку претендует несколько ключей — занимает первый
+        _, first = np.unique(slot[candidates], return_index=True)
+        placed = candidates[first]
+        table[slot[placed]] = rows[placed] + 1
+        pending = np.setdiff1d(pending, placed, assume_unique=True)
+        slot[pending] = (slot[pending] + 1) & (table.size - 1)
+
+
+def empty_columns(rows):
+    """Столбцы на rows строк, заполненные значениями «нет данных»."""
+    return {name: np.full((rows,) + shape, missing, dtype=dtype) for name, dtype, shape, missing in COLUMNS}
+
+
+class CohortStore:
+    """Колоночная выгрузка в каталоге path: файл <столбец>.bin на столбец и manifest.json."""
+
+    def __init__(self, path=COHORT_DIR):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        manifest_path = os.path.join(path, "manifest.json")
+        if os.path.exists(manifest_path):
+            with open(manifest_path, encoding="utf-8") as manifest_file:
+                manifest = json.load(manifest_file)
+            if manifest.get("layout") != _layout():
+                raise ValueError(
+                    f"Раскладка выгрузки {path} устарела (изменился банк вопросов или анкета); "
+                    "пересоберите её: python cohort_store.py --rebuild"
+                )
+        else:
+            manifest = {"layout": _layout(), "rows": 0, "watermark": 0, "units": [], "generation": _new_generation()}
+        self.rows = manifest["rows"]
+        self.watermark = manifest["watermark"]
+        self.units = list(manifest["units"])
+        self.generation = manifest["generation"]
+        self._unit_codes = {unit: code for code, unit in enumerate(self.units)}
+        self._columns = {}
+        if not os.path.exists(manifest_path):
+            self._write_manifest()
+
+    def _file(self, name):
+        return os.path.join(self.path, f"{name}.bin")
+
+    def _write_manifest(self):
+        manifest = {"layout": _layout(), "rows": self.rows, "watermark": self.watermark, "units": self.units,
+                    "generation": self.generation}
+        temporary = os.path.join(self.path, "manifest.json.tmp")
+        with open(temporary, "w", encoding="utf-8") as manifest_file:
+            json.dump(manifest, manifest_file, ensure_ascii=False)
+        os.replace(temporary, os.path.join(self.path, "manifest.json"))
+
+    def column(self, name):
+        """Столбец только для чтения (np.memmap формы (rows, ...))."""
+        if name not in self._columns:
+            _, dtype, shape, _ = COLUMN_BY_NAME[name]
+            if self.rows == 0:
+                self._columns[name] = np.empty((0,) + shape, dtype=dtype)
+            else:
+                self._columns[name] = np.memmap(self._file(name), dtype=dtype, mode="r", shape=(self.rows,) + shape)
+        return self._columns[name]
+
+    # --- Дозапись ---
+
+    def unit_code(self, unit):
+        code = self._unit_codes.get(unit)
+        if code is None:
+            code = self._unit_codes[unit] = len(self.units)
+            self.units.append(unit)
+        return code
+
+    def encode(self, records):
+        """Записи обследований (с ответами на пункты) -> столбцы порции."""
+        columns = empty_columns(len(records))
+        for row, record in enumerate(records):
+            results = record.get("results") or {}
+            questionnaire = record.get("questionnaire") or {}
+            columns["session_id"][row] = record["session_id"].encode("ascii")
+            columns["kind"][row] = KINDS.index(record["kind"])
+            columns["completed"][row] = np.datetime64(record["completed_at"][:10], "D")
+            columns["unit"][row] = self.unit_code(record.get("unit") or "")
+            if record.get("risk_level") in store.RISK_LEVELS:
+                columns["risk_level"][row] = store.RISK_LEVELS.index(record["risk_level"])
+            if record.get("recommendation") in rules.VERDICTS:
+                columns["recommendation"][row] = rules.VERDICTS.index(record["recommendation"])
+            for column, field_id in enumerate(CHOICE_FIELDS):
+                columns["fields"][row, column] = _OPTION_CODES[field_id].get(questionnaire.get(field_id), 0)
+            for column, field_id in enumerate(TEXT_FIELDS):
+                value = questionnaire.get(field_id)
+                columns["text_present"][row, column] = value is not None and str(value).strip() != ""
+
+            if record["kind"] == "screening":
+                for item_id, value in (record.get("responses") or {}).items():
+                    index = _ITEM_INDEX.get(item_id)
+                    if index is not None:
+                        columns["responses"][row, index] = value
+                scores = results.get("scale_scores") or {}
+                descriptions = results.get("risk_levels_desc") or {}
+                for column, scale in enumerate(SCALES):
+                    if scale in scores:
+                        columns["scale_scores"][row, column] = scores[scale]
+                    if scale in descriptions:
+                        columns["scale_levels"][row, column] = SCALE_LEVELS.index(rules.scale_level(descriptions[scale]) or "low")
+                columns["sincerity_warning"][row] = (results.get("risk_levels") or {}).get("sincerity") == "warning"
+            else:
+                record_bytes = bytes(record.get("p2_answers") or b"")
+                if len(record_bytes) == prognoz2.PROGNOZ2_RECORD_BYTES:
+                    columns["p2_record"][row] = np.frombuffer(record_bytes, dtype=np.uint8)
+                if results.get("sten") is not None:
+                    columns["p2_sten"][row] = results["sten"]
+                    columns["p2_raw"][row] = results["npu_raw_score"]
+                    columns["p2_sincerity"][row] = results["sincerity_score"]
+        return columns
+
+    def append(self, columns, watermark=None):
+        """Дописывание порции столбцов; число строк в manifest.json меняется последним.
+
+        Ключи (сессия, вид) порции не должны быть в выгрузке (см. locate). Если прошлая
+        дозапись оборвалась, хвосты файлов сверх числа строк отрезаются.
+        """
+        rows = len(columns["kind"])
+        prepared = []
+        for name, dtype, shape, _ in COLUMNS:
+            data = np.ascontiguousarray(columns[name], dtype=dtype)
+            if data.shape != (rows,) + shape:
+                raise ValueError(f"Столбец {name}: форма {data.shape}, ожидается {(rows,) + shape}")
+            prepared.append((name, data, np.dtype(dtype).itemsize * int(np.prod(shape, dtype=np.int64))))
+        # Отображения в память закрываются до изменения файлов
+        self._columns = {}
+        for name, data, width in prepared:
+            path = self._file(name)
+            with open(path, "r+b" if os.path.exists(path) else "wb") as column_file:
+                column_file.truncate(self.rows * width)
+                column_file.seek(0, os.SEEK_END)
+                column_file.write(data.tobytes())
+        self._index_add(columns["session_id"], columns["kind"], self.rows)
+        self.rows += rows
+        # Индекс читал столбцы прежней длины
+        self._columns = {}
+        if watermark is not None:
+            self.watermark = watermark
+        self._write_manifest()
+        return rows
+
+    def replace(self, rows, columns):
+        """Замена строк rows данными порции columns на месте; поколение выгрузки меняется."""
+        self._columns = {}
+        for name, dtype, shape, _ in COLUMNS:
+            column = np.memmap(self._file(name), dtype=dtype, mode="r+", shape=(self.rows,) + shape)
+            column[rows] = columns[name]
+            column.flush()
+            del column
+        self.generation = _new_generation()
+        self._write_manifest()
+
+    # --- Индекс сессий ---
+
+    def _index_slots(self):
+        path = self._file("session_index")
+        return os.path.getsize(path) // 8 if os.path.exists(path) else 0
+
+    def _index_add(self, session_ids, kinds, first_row):
+        """Ключи строк first_row... в индекс; при заполнении больше половины — перестройка."""
+        needed = first_row + len(kinds)
+        if 2 * needed > self._index_slots():
+            slots = INDEX_MIN_SLOTS
+            while 2 * needed > slots:
+                slots *= 2
+            table = np.zeros(slots, dtype=np.int64)
+            sid_column, kind_column = self.column("session_id"), self.column("kind")
+            for start in range(0, first_row, BLOCK_ROWS):
+                stop = min(start + BLOCK_ROWS, first_row)
+                _place(table, key_hash(sid_column[start:stop], kind_column[start:stop]), np.arange(start, stop))
+            _place(table, key_hash(session_ids, kinds), np.arange(first_row, needed))
+            # Новая таблица подменяет старую целиком: обрыв не оставит полузаписанный индекс
+            temporary = self._file("session_index") + ".tmp"
+            table.tofile(temporary)
+            os.replace(temporary, self._file("session_index"))
+            return
+        table = np.memmap(self._file("session_index"), dtype=np.int64, mode="r+")
+        _place(table, key_hash(session_ids, kinds), np.arange(first_row, needed))
+        table.flush()
+        del table
+
+    def locate(self, session_ids, kinds):
+        """Номера строк по ключам (сессия, код вида); -1 — ключа нет в выгрузке."""
+        session_ids = np.asarray(session_ids, dtype="S26")
+        kinds = np.asarray(kinds, dtype=np.uint8)
+        found = np.full(len(kinds), -1, dtype=np.int64)
+        if self.rows == 0 or not len(kinds):
+            return found
+        table = np.memmap(self._file("session_index"), dtype=np.int64, mode="r")
+        sid_column, kind_column = self.column("session_id"), self.column("kind")
+        slot = (key_hash(session_ids, kinds) & np.uint64(table.size - 1)).astype(np.int64)
+        pending = np.arange(len(kinds))
+        while pending.size:
+            rows = table[slot[pending]] - 1
+            # Ячейки, записанные оборванной дозаписью, указывают за число строк — они не в счёт
+            occupied = (rows >= 0) & (rows < self.rows)
+            matched = np.zeros(pending.size, dtype=bool)
+            candidates = rows[occupied]
+            matched[occupied] = (
+                (sid_column[candidates] == session_ids[pending[occupied]])
+                & (kind_column[candidates] == kinds[pending[occupied]])
+            )
+            found[pending[matched]] = rows[matched]
+            pending = pending[(rows != -1) & ~matched]
+            slot[pending] = (slot[pending] + 1) & (table.size - 1)
+        return found
+
+    def sync(self, db, chunk_size=20000):
+        """Дозапись итогов, записанных в хранилище после прошлой синхронизации; возвращает число новых строк.
+
+        Перезаписанный итог (сессия и вид уже в выгрузке) заменяет свою строку.
+        """
+        appended = 0
+        records = []
+        for record in db.iter_completed(self.watermark, chunk_size, with_responses=True):
+            records.append(record)
+            if len(records) >= chunk_size:
+                appended += self._store_records(records)
+                records = []
+        if records:
+            appended += self._store_records(records)
+        return appended
+
+    def _store_records(self, records):
+        columns = self.encode(records)
+        rows = self.locate(columns["session_id"], columns["kind"])
+        saved = rows >= 0
+        if saved.any():
+            self.replace(rows[saved], {name: data[saved] for name, data in columns.items()})
+        return self.append({name: data[~saved] for name, data in columns.items()}, records[-1]["seq"])
+
+    def clear(self):
+        """Удаление всех строк (перед пересборкой)."""
+        self._columns = {}
+        for name in [column[0] for column in COLUMNS] + ["session_index"]:
+            if os.path.exists(self._file(name)):
+                os.remove(self._file(name))
+        self.rows, self.watermark, self.units, self._unit_codes = 0, 0, [], {}
+        self.generation = _new_generation()
+        self._write_manifest()
+
+    # --- Запросы ---
+
+    def mask(self, kind=None, unit=None, date_from=None, date_to=None, risk_level=None, recommendation=None,
+             answers=None):
+        """Булева маска строк; условия объединяются по «и».
+
+        date_from / date_to — ISO-даты завершения (включительно), answers — {id поля: вариант}
+        для полей с вариантами ответа (CHOICE_FIELDS).
+        """
+        selected = np.ones(self.rows, dtype=bool)
+        if kind is not None:
+            selected &= self.column("kind") == KINDS.index(kind)
+        if unit is not None:
+            if unit not in self._unit_codes:
+                return np.zeros(self.rows, dtype=bool)
+            selected &= self.column("unit") == self._unit_codes[unit]
+        if date_from:
+            selected &= self.column("completed") >= np.datetime64(date_from, "D")
+        if date_to:
+            selected &= self.column("completed") <= np.datetime64(date_to, "D")
+        if risk_level is not None:
+            selected &= self.column("risk_level") == store.RISK_LEVELS.index(risk_level)
+        if recommendation is not None:
+            selected &= self.column("recommendation") == rules.VERDICTS.index(recommendation)
+        for field_id, value in (answers or {}).items():
+            if field_id not in _OPTION_CODES:
+                raise ValueError(f"Поле {field_id!r} не входит в выгрузку (только поля с вариантами ответа)")
+            if value not in _OPTION_CODES[field_id]:
+                raise ValueError(f"У поля {field_id} нет варианта {value!r}")
+            selected &= self.column("fields")[:, CHOICE_FIELDS.index(field_id)] == _OPTION_CODES[field_id][value]
+        return selected
+
+    def summary(self, selected=None):
+        """Сводка по строкам маски (по умолчанию — по всем): счётчики, средние, распределения."""
+        if selected is None:
+            selected = np.ones(self.rows, dtype=bool)
+        kind = self.column("kind")
+        screening = selected & (kind == KINDS.index("screening"))
+        p2 = selected & (kind == KINDS.index("prognoz2"))
+
+        score_sum = np.zeros(len(SCALES), dtype=np.int64)
+        score_count = np.zeros(len(SCALES), dtype=np.int64)
+        level_counts = np.zeros((len(SCALE_LEVELS), len(SCALES)), dtype=np.int64)
+        item_sum = np.zeros(len(ITEM_IDS), dtype=np.int64)
+        item_answered = np.zeros(len(ITEM_IDS), dtype=np.int64)
+        item_endorsed = np.zeros(len(ITEM_IDS), dtype=np.int64)
+        scores, levels, responses = self.column("scale_scores"), self.column("scale_levels"), self.column("responses")
+        # Блоками, чтобы не копировать выборку из большой выгрузки целиком
+        for start in range(0, self.rows, BLOCK_ROWS):
+            block = slice(start, start + BLOCK_ROWS)
+            rows = screening[block]
+            if not rows.any():
+                continue
+            block_scores = scores[block][rows]
+            assessed = block_scores >= 0
+            score_sum += np.where(assessed, block_scores, 0).sum(axis=0)
+            score_count += assessed.sum(axis=0)
+            block_levels = levels[block][rows]
+            for code in range(1, len(SCALE_LEVELS)):
+                level_counts[code] += (block_levels == code).sum(axis=0)
+            block_responses = responses[block][rows]
+            item_sum += block_responses.sum(axis=0, dtype=np.int64)
+            item_answered += (block_responses > 0).sum(axis=0)
+            item_endorsed += (block_responses >= 4).sum(axis=0)
+
+        stens = self.column("p2_sten")[p2]
+        stens = stens[stens > 0]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return {
+                "rows": int(selected.sum()),
+                "screening": int(screening.sum()),
+                "prognoz2": int(p2.sum()),
+                "recommendation": dict(zip(("",) + rules.VERDICTS, np.bincount(
+                    self.column("recommendation")[screening] + 1, minlength=len(rules.VERDICTS) + 1).tolist())),
+                "risk_level": dict(zip(("",) + store.RISK_LEVELS, np.bincount(
+                    self.column("risk_level")[selected] + 1, minlength=len(store.RISK_LEVELS) + 1).tolist())),
+                "scale_mean": dict(zip(SCALES, (score_sum / score_count).tolist())),
+                "scale_levels": {
+                    scale: dict(zip(SCALE_LEVELS[1:], level_counts[1:, column].tolist()))
+                    for column, scale in enumerate(SCALES)
+                },
+                "item_mean": item_sum / item_answered,
+                "item_endorsement": item_endorsed / item_answered,
+                "item_answered": item_answered,
+                "sincerity_warning": int(self.column("sincerity_warning")[screening].sum()),
+                "sten_counts": np.bincount(stens, minlength=11)[1:].tolist(),
+                "sten_mean": float(stens.mean()) if stens.size else float("nan"),
+            }
+
+
+# --- Замер скорости ---
+
+def synthetic_columns(start, rows, rng, units=8):
+    """Синтетическая порция: половина строк — скрининг, половина — «Прогноз-2»."""
+    columns = empty_columns(rows)
+    # Соседние строки — один кандидат: скрининг и «Прогноз-2» одной сессии
+    columns["session_id"][:] = np.char.mod("B%025d", np.arange(start, start + rows) // 2).astype("S26")
+    kind = (np.arange(start, start + rows) % 2).astype(np.uint8)
+    screening = kind == 0
+    count = int(screening.sum())
+    columns["kind"][:] = kind
+    columns["completed"][:] = np.datetime64("2025-01-01") + rng.integers(0, 365, rows).astype("m8[D]")
+    columns["unit"][:] = rng.integers(0, units, rows)
+    columns["risk_level"][:] = rng.choice(3, rows, p=(0.6, 0.3, 0.1))
+    columns["recommendation"][screening] = rng.choice(3, count, p=(0.1, 0.5, 0.4))
+    responses = rng.integers(1, 6, (count, len(ITEM_IDS)), dtype=np.uint8)
+    responses[rng.random((count, len(ITEM_IDS))) < 0.6] = 0  # углублённые пункты отвечают не все
+    columns["responses"][screening] = responses
+    columns["scale_scores"][screening] = rng.integers(3, 16, (count, len(SCALES)))
+    columns["scale_levels"][screening] = rng.choice(np.arange(1, 4), (count, len(SCALES)), p=(0.8, 0.15, 0.05))
+    answers = rng.random((rows - count, prognoz2.PROGNOZ2_TOTAL)) < 0.4
+    columns["p2_record"][~screening] = prognoz2.prognoz2_pack_batch(answers)
+    scored = prognoz2.score_prognoz2_packed_batch(columns["p2_record"][~screening])
+    columns["p2_sten"][~screening] = scored["sten"]
+    columns["p2_raw"][~screening] = scored["npu_raw_score"]
+    columns["p2_sincerity"][~screening] = scored["sincerity_score"]
+    columns["fields"][:] = rng.integers(0, 3, (rows, len(CHOICE_FIELDS)))
+    columns["text_present"][:] = rng.random((rows, len(TEXT_FIELDS))) < 0.5
+    return columns
+
+
+def bench(rows, chunk=100_000, seed=1):
+    rng = np.random.default_rng(seed)
+    path = tempfile.mkdtemp(prefix="cohort_bench_")
+    try:
+        cohort = CohortStore(path)
+        for unit in range(8):
+            cohort.unit_code(f"в/ч {unit + 1}")
+        start = time.perf_counter()
+        for offset in range(0, rows, chunk):
+            cohort.append(synthetic_columns(offset, min(chunk, rows - offset), rng))
+        elapsed = time.perf_counter() - start
+        size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+        print(f"Строк: {rows}; дозапись порциями по {chunk}: {elapsed:.1f} с; выгрузка {size / 2**20:.0f} МБ")
+
+        # Запросы — к заново открытой выгрузке, как из другого процесса
+        cohort = CohortStore(path)
+        for title, query in (
+            ("вся выгрузка", {}),
+            ("подразделение за квартал", {"unit": "в/ч 3", "date_from": "2025-04-01", "date_to": "2025-06-30"}),
+            ("скрининг, высокий риск", {"kind": "screening", "risk_level": "high"}),
+        ):
+            start = time.perf_counter()
+            selected = cohort.mask(**query)
+            masked = time.perf_counter() - start
+            start = time.perf_counter()
+            summary = cohort.summary(selected)
+            summarized = time.perf_counter() - start
+            print(f"  {title:<26} строк {summary['rows']:>8}: фильтр {masked * 1000:6.1f} мс, сводка {summarized * 1000:6.1f} мс")
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+    return 0
+
+
+def print_summary(summary):
+    print(f"Обследований: {summary['rows']} (скрининг {summary['screening']}, «Прогноз-2» {summary['prognoz2']})")
+    print("Заключения: " + ", ".join(f"{verdict} {count}" for verdict, count in summary["recommendation"].items() if verdict))
+    print("Итоговый риск: " + ", ".join(f"{level} {count}" for level, count in summary["risk_level"].items() if level))
+    for scale in SCALES:
+        levels = summary["scale_levels"][scale]
+        print(
+            f"  {SCALE_NAMES.get(scale, scale)}: средний балл {summary['scale_mean'][scale]:.1f}; "
+            f"средний риск {levels['medium']}, высокий {levels['high']}"
+        )
+    if summary["prognoz2"]:
+        print(f"Стэны «Прогноз-2» (1–10): {summary['sten_counts']}, средний {summary['sten_mean']:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Колоночная выгрузка обследований для аналитики")
+    parser.add_argument("--dir", default=COHORT_DIR, help="каталог выгрузки (COHORT_DIR)")
+    parser.add_argument("--sync", action="store_true", help="дописать итоги, завершённые после прошлой выгрузки")
+    parser.add_argument("--rebuild", action="store_true", help="пересобрать выгрузку из хранилища")
+    parser.add_argument("--summary", action="store_true", help="сводка по выгрузке")
+    parser.add_argument("--unit", default=None, help="подразделение")
+    parser.add_argument("--from", dest="date_from", default=None, help="с даты (ISO)")
+    parser.add_argument("--to", dest="date_to", default=None, help="по дату (ISO), включительно")
+    parser.add_argument("--bench", type=int, metavar="N", help="замер на синтетической выгрузке из N строк")
+    args = parser.parse_args()
+
+    if args.bench:
+        return bench(args.bench)
+    if not (args.sync or args.rebuild or args.summary):
+        parser.print_help()
+        return 2
+
+    if args.rebuild:
+        # Устаревшая раскладка не мешает пересборке: manifest.json создаётся заново
+        manifest_path = os.path.join(args.dir, "manifest.json")
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+    cohort = CohortStore(args.dir)
+    if args.rebuild:
+        cohort.clear()
+    if args.sync or args.rebuild:
+        start = time.perf_counter()
+        appended = cohort.sync(store.get_store())
+        print(f"Дописано строк: {appended} за {time.perf_counter() - start:.1f} с; всего {cohort.rows}")
+    if args.summary:
+        print_summary(cohort.summary(cohort.mask(unit=args.unit, date_from=args.date_from, date_to=args.date_to)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
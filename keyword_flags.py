@@ -0,0 +1,355 @@
+"""Термины риска в свободных ответах анкеты: словарь, автомат Ахо — Корасик, проверка архива.
+
+Словарь (dictionaries/risk_terms/<версия>.json) делит термины на категории — диагнозы,
+психоактивные вещества, азартные игры, долги, запрещённые организации, проповедники из
+перечня — и задаёт каждой серьёзность: critical или warning. При первом обращении все
+термины компилируются в один автомат Ахо — Корасик, и текст проходится за один проход:
+время поиска линейно по длине текста и не зависит от числа терминов в словаре.
+
+Перед поиском текст и термины сворачиваются textnorm.fold_chars (регистр, «ё», казахские
+буквы, латинские двойники), поэтому «Нaркотики» с латинской «a» и «есірткі» находятся так
+же, как «наркотики» и «есиртки». Термин совпадает с целым словом, термин с «*» в конце —
+с началом слова.
+
+Запуск:
+    python keyword_flags.py --archive [--out flags.csv]   # проверка всех анкет в хранилище
+    python keyword_flags.py --bench --terms 100000        # скорость при большом словаре
+"""
+
+import argparse
+import csv
+import functools
+import json
+import os
+import random
+import re
+import sys
+import time
+from collections import deque
+
+import question_bank
+import textnorm
+
+# Словари хранятся в версионированных файлах dictionaries/risk_terms/<версия>.json
+KEYWORD_DICT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dictionaries", "risk_terms")
+KEYWORD_DICTIONARY = os.environ.get("KEYWORD_DICTIONARY", "ru-kk-v1")
+SEVERITIES = ("critical", "warning")
+FRAGMENT_CHARS = 40  # символов контекста с каждой стороны совпадения
+
+# Сумма: число (с разрядами через пробел) и множитель или валюта — «1,5 млн», «800 000 тг»
+_AMOUNT = re.compile(
+    r"(\d+(?:[ \u00a0]\d{3})*(?:[.,]\d+)?)\s*(млрд|миллиард\w*|млн|миллион\w*|тыс\w*)?\.?\s*(тг|тенге|₸|руб\w*)?"
+)
+_MULTIPLIERS = {"млрд": 10**9, "миллиард": 10**9, "млн": 10**6, "миллион": 10**6, "тыс": 10**3}
+
+
+def available_dictionaries():
+    """Версии словарей, доступные в KEYWORD_DICT_DIR."""
+    if not os.path.isdir(KEYWORD_DICT_DIR):
+        return []
+    return sorted(name[: -len(".json")] for name in os.listdir(KEYWORD_DICT_DIR) if name.endswith(".json"))
+
+
+class Hit:
+    """Совпадение термина в ответе анкеты (неизменяемая запись).
+
+    start и end — позиции совпавшего слова (слов) в исходном тексте поля, text — само
+    совпадение, term — термин словаря, fragment — совпадение с контекстом.
+    """
+
+    __slots__ = ("field_id", "category", "severity", "term", "start", "end", "text", "fragment")
+
+    def __init__(self, field_id, category, severity, term, start, end, text, fragment):
+        values = (field_id, category, severity, term, start, end, text, fragment)
+        for name, value in zip(self.__slots__, values):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Совпадение термина неизменяемо")
+
+    def __repr__(self):
+        return f"Hit({self.field_id!r}, {self.category!r}, {self.text!r})"
+
+
+def _is_word_char(char):
+    return char.isalnum() or char == "_"
+
+
+class KeywordMatcher:
+    """Скомпилированный словарь: автомат Ахо — Корасик по всем терминам всех категорий."""
+
+    def __init__(self, spec, version):
+        self.version = spec.get("version", version)
+        self.title = spec.get("title", version)
+        self.categories = {}
+        self._patterns = []  # (свёрнутый термин, термин словаря, категория, префиксный)
+        for name, category in spec["categories"].items():
+            severity = category.get("severity")
+            if severity not in SEVERITIES:
+                raise ValueError(f"Словарь «{version}», категория {name}: неизвестная серьёзность {severity!r}")
+            fields = tuple(category.get("fields") or question_bank.FREE_TEXT_FIELDS)
+            unknown = [field_id for field_id in fields if field_id not in question_bank.FREE_TEXT_FIELDS]
+            if unknown:
+                raise ValueError(f"Словарь «{version}», категория {name}: нет свободных полей {', '.join(unknown)}")
+            amounts = category.get("amounts")
+            if amounts:
+                amounts = dict(amounts, fields=frozenset(amounts.get("fields") or fields))
+            self.categories[name] = {
+                "title": category.get("title", name),
+                "severity": severity,
+                "fields": frozenset(fields),
+                "amounts": amounts,
+            }
+            for term in category["terms"]:
+                prefix = term.endswith("*")
+                folded = textnorm.fold_chars(term[:-1] if prefix else term).strip()
+                if not folded or "*" in folded:
+                    raise ValueError(f"Словарь «{version}», категория {name}: недопустимый термин {term!r}")
+                self._patterns.append((folded, term, name, prefix))
+        self._build()
+
+    def _build(self):
+        """Бор терминов и суффиксные ссылки; выход состояния включает выходы по ссылкам."""
+        goto = [{}]
+        outputs = [[]]
+        for index, (folded, _, _, _) in enumerate(self._patterns):
+            state = 0
+            for char in folded:
+                following = goto[state].get(char)
+                if following is None:
+                    following = len(goto)
+                    goto[state][char] = following
+                    goto.append({})
+                    outputs.append([])
+                state = following
+            outputs[state].append(index)
+
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, following in goto[state].items():
+                queue.append(following)
+                link = fail[state]
+                while link and char not in goto[link]:
+                    link = fail[link]
+                fail[following] = goto[link].get(char, 0)
+                # Очередь в ширину: выходы по ссылке уже собраны
+                outputs[following].extend(outputs[fail[following]])
+        self._goto = goto
+        self._fail = fail
+        self._outputs = [tuple(output) for output in outputs]
+
+    @property
+    def term_count(self):
+        return len(self._patterns)
+
+    def scan(self, text):
+        """Совпадения в тексте: [(начало, конец, категория, термин)], в порядке конца совпадения."""
+        folded = textnorm.fold_chars(text)
+        goto, fail, outputs, patterns = self._goto, self._fail, self._outputs, self._patterns
+        length = len(folded)
+        matches = []
+        state = 0
+        for position, char in enumerate(folded):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if not outputs[state]:
+                continue
+            end = position + 1
+            for index in outputs[state]:
+                term, source, category, prefix = patterns[index]
+                start = end - len(term)
+                if start > 0 and _is_word_char(folded[start - 1]):
+                    continue
+                if prefix:
+                    # Префиксный термин: совпадение продолжается до конца слова
+                    word_end = end
+                    while word_end < length and _is_word_char(folded[word_end]):
+                        word_end += 1
+                    matches.append((start, word_end, category, source))
+                elif end == length or not _is_word_char(folded[end]):
+                    matches.append((start, end, category, source))
+        return matches
+
+    def _amounts(self, text):
+        """Суммы в тексте: [(начало, конец, значение)]; учитываются только с множителем или валютой."""
+        amounts = []
+        for match in _AMOUNT.finditer(textnorm.fold_chars(text)):
+            number, multiplier, currency = match.groups()
+            if not multiplier and not currency:
+                continue
+            value = float(re.sub(r"\s", "", number).replace(",", "."))
+            if multiplier:
+                value *= next(factor for stem, factor in _MULTIPLIERS.items() if multiplier.startswith(stem))
+            amounts.append((match.start(), match.end(), value))
+        return amounts
+
+    def scan_questionnaire(self, questionnaire):
+        """Совпадения во всех свободных ответах анкеты: список Hit в порядке полей анкеты."""
+        hits = []
+        for field_id in question_bank.FREE_TEXT_FIELDS:
+            text = questionnaire.get(field_id)
+            if not text or not isinstance(text, str):
+                continue
+            for start, end, category, term in self.scan(text):
+                rule = self.categories[category]
+                if field_id in rule["fields"]:
+                    hits.append(self._hit(field_id, category, rule["severity"], term, text, start, end))
+            for category, rule in self.categories.items():
+                amounts = rule["amounts"]
+                if not amounts or field_id not in amounts["fields"]:
+                    continue
+                for start, end, value in self._amounts(text):
+                    if value >= amounts["min"]:
+                        hits.append(self._hit(field_id, category, rule["severity"], amounts.get("title", "сумма"),
+                                              text, start, end))
+        return hits
+
+    @staticmethod
+    def _hit(field_id, category, severity, term, text, start, end):
+        fragment = text[max(start - FRAGMENT_CHARS, 0):end + FRAGMENT_CHARS].strip()
+        return Hit(field_id, category, severity, term, start, end, text[start:end].strip(), fragment)
+
+    def issues(self, hits):
+        """Формулировки для critical_issues и warning_issues: по одной на категорию."""
+        found = {}
+        for hit in hits:
+            words = found.setdefault(hit.category, [])
+            if hit.text.lower() not in (word.lower() for word in words):
+                words.append(hit.text)
+        critical, warning = [], []
+        for category, words in found.items():
+            rule = self.categories[category]
+            issue = f"{rule['title']}: {', '.join(words)}"
+            (critical if rule["severity"] == "critical" else warning).append(issue)
+        return critical, warning
+
+
+@functools.lru_cache(maxsize=None)
+def _load_matcher(version):
+    path = os.path.join(KEYWORD_DICT_DIR, f"{version}.json")
+    if not os.path.isfile(path):
+        raise ValueError(f"Словарь терминов «{version}» не найден. Доступны: {available_dictionaries()}")
+    with open(path, encoding="utf-8") as dictionary_file:
+        spec = json.load(dictionary_file)
+    return KeywordMatcher(spec, version)
+
+
+def get_matcher(version=None):
+    """Скомпилированный словарь (кэшируется на процесс по версии)."""
+    return _load_matcher(version or KEYWORD_DICTIONARY)
+
+
+def scan_questionnaire(questionnaire, version=None):
+    """Совпадения терминов в свободных ответах анкеты."""
+    return get_matcher(version).scan_questionnaire(questionnaire)
+
+
+def questionnaire_issues(questionnaire, version=None):
+    """(critical_issues, warning_issues, совпадения) по свободным ответам анкеты."""
+    matcher = get_matcher(version)
+    hits = matcher.scan_questionnaire(questionnaire)
+    critical, warning = matcher.issues(hits)
+    return critical, warning, hits
+
+
+def hit_records(hits):
+    """Совпадения в виде записей для сохранения вместе с итогом (results["keyword_flags"])."""
+    return [
+        {"field_id": hit.field_id, "category": hit.category, "severity": hit.severity, "term": hit.term, "text": hit.text}
+        for hit in hits
+    ]
+
+
+# --- Проверка архива и замер скорости ---
+
+def scan_archive(db, out, version=None):
+    """Проверка всех анкет хранилища; строки совпадений пишутся в out (CSV). Возвращает счётчики."""
+    matcher = get_matcher(version)
+    writer = csv.writer(out)
+    writer.writerow(("session_id", "field_id", "category", "severity", "term", "text", "fragment"))
+    sessions = flagged = chars = 0
+    for session_id, questionnaire in db.iter_questionnaires(question_bank.FREE_TEXT_FIELDS):
+        sessions += 1
+        chars += sum(len(value) for value in questionnaire.values() if isinstance(value, str))
+        hits = matcher.scan_questionnaire(questionnaire)
+        flagged += bool(hits)
+        for hit in hits:
+            writer.writerow((session_id, hit.field_id, hit.category, hit.severity, hit.term, hit.text, hit.fragment))
+    return {"sessions": sessions, "flagged": flagged, "chars": chars}
+
+
+def _synthetic_spec(base, terms, rng):
+    """Базовый словарь с добавленной категорией из terms случайных слов."""
+    letters = "абвгдежзиклмнопрстуфхцчшщыэюя"
+    spec = json.loads(json.dumps(base))
+    spec["categories"]["synthetic"] = {
+        "title": "Синтетические термины",
+        "severity": "warning",
+        "terms": ["".join(rng.choice(letters) for _ in range(rng.randint(5, 12))) + rng.choice(("", "*"))
+                  for _ in range(terms)],
+    }
+    return spec
+
+
+def bench(terms, megabytes, seed=1):
+    rng = random.Random(seed)
+    with open(os.path.join(KEYWORD_DICT_DIR, f"{KEYWORD_DICTIONARY}.json"), encoding="utf-8") as dictionary_file:
+        base = json.load(dictionary_file)
+    words = ("работал водителем в Астане два года кредит в банке мать отец брат дядя живет село "
+             "болел гриппом ставки на спорт не было никогда наркотики нет есірткі Қарағанды").split()
+    text = ""
+    while len(text) < megabytes * 1_000_000:
+        text += " ".join(rng.choice(words) for _ in range(2000)) + "\n"
+    for label, spec in (("базовый словарь", base), (f"+{terms} терминов", _synthetic_spec(base, terms, rng))):
+        start = time.perf_counter()
+        matcher = KeywordMatcher(spec, KEYWORD_DICTIONARY)
+        compiled = time.perf_counter() - start
+        start = time.perf_counter()
+        matches = matcher.scan(text)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{label:<20} терминов {matcher.term_count:>7}, компиляция {compiled:6.2f} с, "
+            f"поиск {len(text) / elapsed / 1e6:5.2f} млн символов/с, совпадений {len(matches)}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Термины риска в свободных ответах анкеты")
+    parser.add_argument("--archive", action="store_true", help="проверить все анкеты в хранилище")
+    parser.add_argument("--out", help="файл CSV для совпадений (по умолчанию — stdout)")
+    parser.add_argument("--dictionary", default=None, help="версия словаря")
+    parser.add_argument("--bench", action="store_true", help="замер скорости на синтетическом тексте")
+    parser.add_argument("--terms", type=int, default=100_000, help="терминов, добавляемых к словарю в замере")
+    parser.add_argument("--megabytes", type=float, default=5, help="объём текста в замере, млн символов")
+    args = parser.parse_args()
+
+    if args.bench:
+        bench(args.terms, args.megabytes)
+        return 0
+    if not args.archive:
+        parser.print_help()
+        return 2
+
+    import store
+
+    start = time.perf_counter()
+    out = open(args.out, "w", encoding="utf-8", newline="") if args.out else sys.stdout
+    try:
+        counts = scan_archive(store.get_store(), out, args.dictionary)
+    finally:
+        if args.out:
+            out.close()
+    elapsed = time.perf_counter() - start
+    print(
+        f"Анкет: {counts['sessions']}, с совпадениями: {counts['flagged']}; "
+        f"{counts['chars'] / 1e6:.1f} млн символов за {elapsed:.1f} с",
+        file=sys.stderr,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""Локальный заглушечный сервер TTS API для проверки озвучивания без сети.
+
+Запуск:
+    python mock_tts_server.py [--port 8765] [--latency-ms 50] [--error-rate 0.0]
+
+Отвечает на POST /v1/audio/speech как OpenAI: возвращает детерминированные «MP3»-байты,
+зависящие от модели, голоса и текста. С долей запросов error-rate отвечает 429, чтобы
+проверить повторы и контроль допуска. Клиенту достаточно base_url http://127.0.0.1:<port>/v1.
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def fake_audio(model, voice, text):
+    """Содержимое ответа заглушки: заголовок ID3 и хэш запроса."""
+    digest = hashlib.sha256("\x1f".join((model, voice, text)).encode("utf-8")).digest()
+    return b"ID3" + digest
+
+
+class MockTTSHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    error_rate = 0.0
+    requests = 0
+    _lock = threading.Lock()
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/audio/speech"):
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with self._lock:
+            MockTTSHandler.requests += 1
+        time.sleep(self.latency)
+
+        if random.random() < self.error_rate:
+            payload = json.dumps({"error": {"message": "rate limited", "type": "rate_limit"}}).encode()
+            self.send_response(429)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Retry-After", "1")
+        else:
+            payload = fake_audio(body.get("model", ""), body.get("voice", ""), body.get("input", ""))
+            self.send_response(200)
+            self.send_header("Content-Type", "audio/mpeg")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=8765, latency_ms=0, error_rate=0.0):
+    """Запуск сервера в фоновом потоке; возвращает объект сервера (shutdown() — остановка)."""
+    MockTTSHandler.latency = latency_ms / 1000
+    MockTTSHandler.error_rate = error_rate
+    server = ThreadingHTTPServer(("127.0.0.1", port), MockTTSHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Заглушка TTS API для локальных проверок")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=int, default=50)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = serve(args.port, args.latency_ms, args.error_rate)
+    print(f"Заглушка TTS: http://127.0.0.1:{server.server_port}/v1 (Ctrl+C — остановка)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,16 +2,24 @@
 
 Самодостаточный модуль — вся логика (вопросы, ключи, подсчёт) и UI (тест, результаты)
 здесь. Основной адаптивный скрининг в app.py не затрагивается. Модуль использует
-собственные ключи состояния (p2_responses / p2_current_index / p2_result), поэтому не
+собственные ключи состояния (p2_answers / p2_current_index / p2_result), поэтому не
 пересекается с состоянием основного потока.
 """
 
 import io
+import os
 import csv
+import json
+import functools
 from datetime import datetime
 
+import numpy as np
 import streamlit as st
-import matplotlib.pyplot as plt
+
+import question_bank
+import session_log
+import store
+import tts
 
 # --- Опросник «Прогноз-2»: вопросы, ключи и подсчёт результатов ---
 # Номера пунктов 1-based, как в бланке методики.
@@ -24,87 +32,233 @@ PROGNOZ2_TOTAL = len(PROGNOZ2_QUESTION_TEXTS)  # 86
 PROGNOZ2_MAX_NPU = len(PROGNOZ2_NPU_YES) + len(PROGNOZ2_NPU_NO)  # 72
 PROGNOZ2_SINCERITY_THRESHOLD = 10  # >= 10 совпадений => недостоверно
 
-PROGNOZ2_QUESTIONS = [
-    {"id": f"p2_{index}", "number": index, "text": text, "scale": "prognoz2", "answer_type": "yes_no"}
-    for index, text in enumerate(PROGNOZ2_QUESTION_TEXTS, start=1)
-]
+# Неизменяемые записи question_bank.Item: PROGNOZ2_QUESTIONS[i] — пункт номер i + 1
+PROGNOZ2_QUESTIONS = question_bank.compile_items(
+    "prognoz2",
+    [("prognoz2", f"p2_{index}", text) for index, text in enumerate(PROGNOZ2_QUESTION_TEXTS, start=1)],
+)
 
 
-def prognoz2_raw_to_sten(raw_score):
-    """Перевод первичного балла НПУ в стэны по ключу «Прогноз-2»."""
-    if raw_score >= 43:
-        return 1
-    if raw_score >= 37:
-        return 2
-    if raw_score >= 33:
-        return 3
-    if raw_score >= 29:
-        return 4
-    if raw_score >= 23:
-        return 5
-    if raw_score >= 19:
-        return 6
-    if raw_score >= 15:
-        return 7
-    if raw_score >= 11:
-        return 8
-    if raw_score >= 9:
-        return 9
-    return 10
-
-
-def prognoz2_interpret_sten(sten):
-    """Интерпретация стэна: низкий стэн означает высокий риск срывов."""
-    if sten in (1, 2, 3):
-        return (
-            "high",
-            "высокий риск: низкий уровень нервно-психической устойчивости; рекомендуется очная оценка профильным специалистом",
+# --- Нормы: перевод сырого балла в стэны и интерпретация ---
+# Нормы хранятся в версионированных файлах norms/prognoz2/<версия>.json и при первом
+# обращении компилируются в таблицы поиска: сырой балл 0..72 -> стэн, стэн 1..10 -> риск.
+PROGNOZ2_NORMS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "norms", "prognoz2")
+PROGNOZ2_DEFAULT_NORMS = os.environ.get("PROGNOZ2_NORMS", "rybnikov-v1")
+PROGNOZ2_RISK_LEVELS = ("high", "medium", "low")
+
+
+def prognoz2_available_norms():
+    """Версии норм, доступные в PROGNOZ2_NORMS_DIR."""
+    if not os.path.isdir(PROGNOZ2_NORMS_DIR):
+        return []
+    return sorted(
+        name[: -len(".json")] for name in os.listdir(PROGNOZ2_NORMS_DIR) if name.endswith(".json")
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _load_prognoz2_norms(version):
+    path = os.path.join(PROGNOZ2_NORMS_DIR, f"{version}.json")
+    if not os.path.isfile(path):
+        raise ValueError(
+            f"Нормы Прогноз-2 «{version}» не найдены. Доступны: {prognoz2_available_norms()}"
         )
-    if sten in (4, 5, 6):
-        return (
-            "medium",
-            "средний риск: нервно-психическая устойчивость достаточная, но в напряженных ситуациях возможны срывы",
+    with open(path, encoding="utf-8") as norms_file:
+        spec = json.load(norms_file)
+
+    # Версия в результатах — имя файла: по ней нормы находятся снова (пересчёт, аудит)
+    if spec.get("version", version) != version:
+        raise ValueError(f"Нормы «{version}»: в файле указана версия {spec['version']!r}, ожидается имя файла")
+
+    thresholds = spec["sten_min_raw"]
+    max_raw = spec.get("max_raw_score", PROGNOZ2_MAX_NPU)
+    if max_raw != PROGNOZ2_MAX_NPU:
+        raise ValueError(f"Нормы «{version}»: max_raw_score={max_raw}, ожидается {PROGNOZ2_MAX_NPU}")
+    if len(thresholds) != 9 or any(a <= b for a, b in zip(thresholds, thresholds[1:])):
+        raise ValueError(f"Нормы «{version}»: sten_min_raw должен содержать 9 убывающих порогов")
+    if thresholds[0] > max_raw or thresholds[-1] < 0:
+        raise ValueError(f"Нормы «{version}»: пороги выходят за диапазон 0..{max_raw}")
+
+    # Стэн k (1..9) — если балл >= k-го порога; ниже последнего порога — стэн 10
+    raw = np.arange(max_raw + 1)
+    sten_by_raw = (1 + np.sum(raw[:, None] < np.array(thresholds)[None, :], axis=1)).astype(np.int8)
+
+    risk_by_sten = np.full(11, "", dtype=object)
+    conclusions = {}
+    for level, rule in spec["risk_levels"].items():
+        if level not in PROGNOZ2_RISK_LEVELS:
+            raise ValueError(f"Нормы «{version}»: неизвестный уровень риска {level!r}")
+        for sten in rule["stens"]:
+            if risk_by_sten[sten]:
+                raise ValueError(f"Нормы «{version}»: стэн {sten} отнесён к нескольким уровням риска")
+            risk_by_sten[sten] = level
+        conclusions[level] = rule["conclusion"]
+    if not all(risk_by_sten[1:]):
+        raise ValueError(f"Нормы «{version}»: не всем стэнам 1..10 назначен уровень риска")
+
+    sten_by_raw.flags.writeable = False
+    risk_by_sten.flags.writeable = False
+    return {
+        "version": version,
+        "title": spec.get("title", version),
+        "sten_by_raw": sten_by_raw,
+        "risk_by_sten": risk_by_sten,
+        "conclusions": conclusions,
+    }
+
+
+def prognoz2_norms(version=None):
+    """Скомпилированные нормы (кэшируются на процесс по версии)."""
+    return _load_prognoz2_norms(version or PROGNOZ2_DEFAULT_NORMS)
+
+
+def prognoz2_raw_to_sten(raw_score, norms_version=None):
+    """Перевод первичного балла НПУ в стэны по таблице норм."""
+    sten_by_raw = prognoz2_norms(norms_version)["sten_by_raw"]
+    return int(sten_by_raw[min(max(raw_score, 0), PROGNOZ2_MAX_NPU)])
+
+
+def prognoz2_interpret_sten(sten, norms_version=None):
+    """Интерпретация стэна: низкий стэн означает высокий риск срывов."""
+    norms = prognoz2_norms(norms_version)
+    risk_level = norms["risk_by_sten"][sten]
+    return risk_level, norms["conclusions"][risk_level]
+
+
+def prognoz2_apply_norms(raw_scores, norms_version=None):
+    """Векторный перевод массива сырых баллов в стэны и уровни риска по выбранным нормам."""
+    norms = prognoz2_norms(norms_version)
+    sten = norms["sten_by_raw"][np.asarray(raw_scores)]
+    return sten, norms["risk_by_sten"][sten]
+
+
+# --- Упакованное представление ответов ---
+# Запись бланка — 22 байта: 11 байт ответов («Да» = 1) и 11 байт маски отвеченных пунктов.
+# Пункт N хранится в бите N-1 старшим битом вперёд (как np.packbits), поэтому ключи
+# методики тоже упаковываются в битовые маски и подсчёт сводится к AND + popcount.
+PROGNOZ2_PACKED_BYTES = (PROGNOZ2_TOTAL + 7) // 8  # 11
+PROGNOZ2_RECORD_BYTES = 2 * PROGNOZ2_PACKED_BYTES  # 22
+
+
+def _p2_bit(number):
+    """Бит пункта number (1-based) в упакованном 88-битном векторе."""
+    return 1 << (8 * PROGNOZ2_PACKED_BYTES - number)
+
+
+def _p2_bits(numbers):
+    bits = 0
+    for number in numbers:
+        bits |= _p2_bit(number)
+    return bits
+
+
+def _p2_numbers(bits):
+    """Номера пунктов, чьи биты установлены, по возрастанию."""
+    return [number for number in range(1, PROGNOZ2_TOTAL + 1) if bits & _p2_bit(number)]
+
+
+def _popcount(value):
+    return bin(value).count("1")
+
+
+_P2_ALL_BITS = _p2_bits(range(1, PROGNOZ2_TOTAL + 1))
+_P2_SINCERITY_NO_BITS = _p2_bits(PROGNOZ2_SINCERITY_NO)
+_P2_NPU_YES_BITS = _p2_bits(PROGNOZ2_NPU_YES)
+_P2_NPU_NO_BITS = _p2_bits(PROGNOZ2_NPU_NO)
+_P2_NUMBER_BY_ID = {question.id: question.number for question in PROGNOZ2_QUESTIONS}
+
+
+def _p2_record_to_ints(record):
+    if len(record) != PROGNOZ2_RECORD_BYTES:
+        raise ValueError(
+            f"Запись Прогноз-2 должна занимать {PROGNOZ2_RECORD_BYTES} байта, получено {len(record)}"
         )
+    answers = int.from_bytes(record[:PROGNOZ2_PACKED_BYTES], "big")
+    answered = int.from_bytes(record[PROGNOZ2_PACKED_BYTES:], "big")
+    return answers, answered
+
+
+def _p2_ints_to_record(answers, answered):
     return (
-        "low",
-        "низкий риск: высокий уровень нервно-психической устойчивости, нервно-психические срывы маловероятны",
+        answers.to_bytes(PROGNOZ2_PACKED_BYTES, "big")
+        + answered.to_bytes(PROGNOZ2_PACKED_BYTES, "big")
     )
 
 
-def score_prognoz2(responses):
+PROGNOZ2_EMPTY_RECORD = _p2_ints_to_record(0, 0)
+
+
+def prognoz2_pack(responses):
+    """Упаковка ответов {p2_id: bool} в 22-байтную запись."""
+    answers = 0
+    answered = 0
+    for question_id, value in responses.items():
+        number = _P2_NUMBER_BY_ID.get(question_id)
+        if number is None or value is None:
+            continue
+        answered |= _p2_bit(number)
+        if value:
+            answers |= _p2_bit(number)
+    return _p2_ints_to_record(answers, answered)
+
+
+def prognoz2_unpack(record):
+    """Распаковка записи обратно в dict {p2_id: bool} (только отвеченные пункты)."""
+    answers, answered = _p2_record_to_ints(record)
+    return {
+        f"p2_{number}": bool(answers & _p2_bit(number))
+        for number in _p2_numbers(answered)
+    }
+
+
+def prognoz2_set_answer(record, number, value):
+    """Новая запись с ответом value на пункт number."""
+    answers, answered = _p2_record_to_ints(record)
+    bit = _p2_bit(number)
+    answers = answers | bit if value else answers & ~bit
+    return _p2_ints_to_record(answers, answered | bit)
+
+
+def prognoz2_get_answer(record, number):
+    """Ответ на пункт number: True/False или None, если пункт не отвечен."""
+    answers, answered = _p2_record_to_ints(record)
+    bit = _p2_bit(number)
+    if not answered & bit:
+        return None
+    return bool(answers & bit)
+
+
+def prognoz2_answered_count(record):
+    return _popcount(_p2_record_to_ints(record)[1])
+
+
+def score_prognoz2(responses, norms_version=None):
     """Подсчёт «Прогноз-2» по ключам методики.
 
-    responses: dict {p2_id: bool} — ответы да/нет по вопросам.
+    responses: упакованная запись (bytes, см. prognoz2_pack) или dict {p2_id: bool}.
+    norms_version: версия норм для перевода в стэны (по умолчанию PROGNOZ2_DEFAULT_NORMS).
     Возвращает dict с результатом. Бросает ValueError, если отвечены не все вопросы.
     """
-    answers = {}
-    for question in PROGNOZ2_QUESTIONS:
-        value = responses.get(question["id"])
-        if value is None:
-            continue
-        answers[question["number"]] = bool(value)
+    record = prognoz2_pack(responses) if isinstance(responses, dict) else bytes(responses)
+    answers, answered = _p2_record_to_ints(record)
 
-    missing = [number for number in range(1, PROGNOZ2_TOTAL + 1) if number not in answers]
+    missing = _P2_ALL_BITS & ~answered
     if missing:
-        raise ValueError(f"Не отвечены вопросы Прогноз-2: {missing}")
+        raise ValueError(f"Не отвечены вопросы Прогноз-2: {_p2_numbers(missing)}")
+
+    no_answers = _P2_ALL_BITS & ~answers
+    matched_sincerity = no_answers & _P2_SINCERITY_NO_BITS
+    matched_npu = (answers & _P2_NPU_YES_BITS) | (no_answers & _P2_NPU_NO_BITS)
+
+    return _prognoz2_result(
+        _popcount(matched_sincerity), _popcount(matched_npu), matched_sincerity, matched_npu, norms_version
+    )
 
-    matched_sincerity = [
-        number for number in PROGNOZ2_SINCERITY_NO
-        if answers[number] is False
-    ]
-    matched_npu = [
-        number
-        for number in range(1, PROGNOZ2_TOTAL + 1)
-        if (
-            (number in PROGNOZ2_NPU_YES and answers[number] is True)
-            or (number in PROGNOZ2_NPU_NO and answers[number] is False)
-        )
-    ]
 
-    sincerity_score = len(matched_sincerity)
-    raw_score = len(matched_npu)
-    sten = prognoz2_raw_to_sten(raw_score)
-    risk_level, conclusion = prognoz2_interpret_sten(sten)
+def _prognoz2_result(sincerity_score, raw_score, matched_sincerity, matched_npu, norms_version):
+    norms = prognoz2_norms(norms_version)
+    sten = prognoz2_raw_to_sten(raw_score, norms["version"])
+    risk_level, conclusion = prognoz2_interpret_sten(sten, norms["version"])
 
     return {
         "sincerity_score": sincerity_score,
@@ -113,18 +267,295 @@ def score_prognoz2(responses):
         "sten": sten,
         "risk_level": risk_level,
         "conclusion": conclusion,
-        "matched_sincerity_items": matched_sincerity,
-        "matched_npu_items": matched_npu,
+        "matched_sincerity_items": _p2_numbers(matched_sincerity),
+        "matched_npu_items": _p2_numbers(matched_npu),
+        "norms_version": norms["version"],
     }
 
 
+# --- Инкрементальный подсчёт во время прохождения теста ---
+# Вклад ответа в счётчики (НПУ, искренность) по номеру пункта: [пункт][0 — «Нет», 1 — «Да»].
+_P2_ITEM_WEIGHTS = [((0, 0), (0, 0))] + [
+    (
+        (int(number in PROGNOZ2_NPU_NO), int(number in PROGNOZ2_SINCERITY_NO)),
+        (int(number in PROGNOZ2_NPU_YES), 0),
+    )
+    for number in range(1, PROGNOZ2_TOTAL + 1)
+]
+PROGNOZ2_EMPTY_COUNTS = (0, 0)
+
+# Политика при досрочном достижении порога искренности:
+# off — ничего не делать, flag — предупредить и предложить повторный инструктаж,
+# stop — прервать прохождение, протокол недостоверен.
+PROGNOZ2_INVALID_POLICIES = ("off", "flag", "stop")
+PROGNOZ2_EARLY_INVALID_POLICY = os.environ.get("PROGNOZ2_EARLY_INVALID_POLICY", "flag")
+if PROGNOZ2_EARLY_INVALID_POLICY not in PROGNOZ2_INVALID_POLICIES:
+    raise ValueError(
+        f"PROGNOZ2_EARLY_INVALID_POLICY={PROGNOZ2_EARLY_INVALID_POLICY!r}: "
+        f"ожидается одно из {PROGNOZ2_INVALID_POLICIES}"
+    )
+
+
+def prognoz2_update_counts(counts, number, old_value, new_value):
+    """O(1)-обновление счётчиков (сырой балл НПУ, искренность) при смене ответа на пункт.
+
+    old_value — прежний ответ (None, если пункт ещё не отвечен), new_value — новый.
+    """
+    npu, sincerity = counts
+    if old_value is not None:
+        npu_weight, sincerity_weight = _P2_ITEM_WEIGHTS[number][bool(old_value)]
+        npu -= npu_weight
+        sincerity -= sincerity_weight
+    npu_weight, sincerity_weight = _P2_ITEM_WEIGHTS[number][bool(new_value)]
+    return npu + npu_weight, sincerity + sincerity_weight
+
+
+def prognoz2_is_invalid(counts):
+    """Протокол уже недостоверен: порог искренности достигнут, остальные ответы не помогут."""
+    return counts[1] >= PROGNOZ2_SINCERITY_THRESHOLD
+
+
+def prognoz2_result_from_counts(record, counts, norms_version=None):
+    """Итог по накопленным счётчикам без повторного подсчёта баллов по ключам."""
+    answers, answered = _p2_record_to_ints(record)
+    missing = _P2_ALL_BITS & ~answered
+    if missing:
+        raise ValueError(f"Не отвечены вопросы Прогноз-2: {_p2_numbers(missing)}")
+    no_answers = _P2_ALL_BITS & ~answers
+    raw_score, sincerity_score = counts
+    return _prognoz2_result(
+        sincerity_score,
+        raw_score,
+        no_answers & _P2_SINCERITY_NO_BITS,
+        (answers & _P2_NPU_YES_BITS) | (no_answers & _P2_NPU_NO_BITS),
+        norms_version,
+    )
+
+
+# --- Пакетный подсчёт (векторизованный) ---
+# Маски ключей по позициям 0..85 (пункт N -> индекс N-1), строятся один раз при импорте.
+_P2_SINCERITY_NO_MASK = np.zeros(PROGNOZ2_TOTAL, dtype=bool)
+_P2_SINCERITY_NO_MASK[np.array(PROGNOZ2_SINCERITY_NO) - 1] = True
+_P2_NPU_YES_MASK = np.zeros(PROGNOZ2_TOTAL, dtype=bool)
+_P2_NPU_YES_MASK[np.array(PROGNOZ2_NPU_YES) - 1] = True
+_P2_NPU_NO_MASK = np.zeros(PROGNOZ2_TOTAL, dtype=bool)
+_P2_NPU_NO_MASK[np.array(PROGNOZ2_NPU_NO) - 1] = True
+
+
+def score_prognoz2_batch(answers, norms_version=None):
+    """Векторизованный подсчёт «Прогноз-2» для матрицы ответов.
+
+    answers: массив формы (n, 86), True/1 — «Да», False/0 — «Нет»; столбец i — пункт i+1.
+    Возвращает dict массивов длины n с теми же полями, что и score_prognoz2
+    (npu_raw_score, sincerity_score, sincerity_valid, sten, risk_level) и norms_version.
+    """
+    answers = np.asarray(answers)
+    if answers.ndim != 2 or answers.shape[1] != PROGNOZ2_TOTAL:
+        raise ValueError(
+            f"Ожидается матрица ответов формы (n, {PROGNOZ2_TOTAL}), получено {answers.shape}"
+        )
+    yes = answers.astype(bool, copy=False)
+    no = ~yes
+
+    sincerity_score = np.count_nonzero(no & _P2_SINCERITY_NO_MASK, axis=1)
+    raw_score = (
+        np.count_nonzero(yes & _P2_NPU_YES_MASK, axis=1)
+        + np.count_nonzero(no & _P2_NPU_NO_MASK, axis=1)
+    )
+    return _p2_batch_result(raw_score, sincerity_score, norms_version)
+
+
+def _p2_batch_result(raw_score, sincerity_score, norms_version):
+    sten, risk_level = prognoz2_apply_norms(raw_score, norms_version)
+    return {
+        "sincerity_score": sincerity_score,
+        "sincerity_valid": sincerity_score < PROGNOZ2_SINCERITY_THRESHOLD,
+        "npu_raw_score": raw_score,
+        "sten": sten,
+        "risk_level": risk_level,
+        "norms_version": prognoz2_norms(norms_version)["version"],
+    }
+
+
+# Ключи в виде байтовых масок и таблица popcount для байта — для пакетного подсчёта записей
+_P2_ALL_BYTES = np.frombuffer(_P2_ALL_BITS.to_bytes(PROGNOZ2_PACKED_BYTES, "big"), dtype=np.uint8)
+_P2_SINCERITY_NO_BYTES = np.frombuffer(
+    _P2_SINCERITY_NO_BITS.to_bytes(PROGNOZ2_PACKED_BYTES, "big"), dtype=np.uint8
+)
+_P2_NPU_YES_BYTES = np.frombuffer(_P2_NPU_YES_BITS.to_bytes(PROGNOZ2_PACKED_BYTES, "big"), dtype=np.uint8)
+_P2_NPU_NO_BYTES = np.frombuffer(_P2_NPU_NO_BITS.to_bytes(PROGNOZ2_PACKED_BYTES, "big"), dtype=np.uint8)
+_POPCOUNT8 = np.array([_popcount(value) for value in range(256)], dtype=np.uint8)
+
+
+def prognoz2_pack_batch(answers):
+    """Упаковка матрицы ответов (n, 86) в массив записей uint8 формы (n, 22)."""
+    answers = np.asarray(answers, dtype=bool)
+    if answers.ndim != 2 or answers.shape[1] != PROGNOZ2_TOTAL:
+        raise ValueError(
+            f"Ожидается матрица ответов формы (n, {PROGNOZ2_TOTAL}), получено {answers.shape}"
+        )
+    packed = np.packbits(answers, axis=1)
+    answered = np.broadcast_to(_P2_ALL_BYTES, packed.shape)
+    return np.ascontiguousarray(np.concatenate([packed, answered], axis=1))
+
+
+def score_prognoz2_packed_batch(records, norms_version=None):
+    """Подсчёт «Прогноз-2» по массиву упакованных записей uint8 формы (n, 22).
+
+    Записи могут быть склеены из prognoz2_pack (bytes) или получены prognoz2_pack_batch.
+    Возвращает те же поля, что и score_prognoz2_batch.
+    """
+    records = np.asarray(records, dtype=np.uint8)
+    if records.ndim != 2 or records.shape[1] != PROGNOZ2_RECORD_BYTES:
+        raise ValueError(
+            f"Ожидается массив записей формы (n, {PROGNOZ2_RECORD_BYTES}), получено {records.shape}"
+        )
+    answers = records[:, :PROGNOZ2_PACKED_BYTES]
+    answered = records[:, PROGNOZ2_PACKED_BYTES:]
+
+    incomplete = np.flatnonzero(((answered & _P2_ALL_BYTES) != _P2_ALL_BYTES).any(axis=1))
+    if incomplete.size:
+        raise ValueError(f"Не все вопросы Прогноз-2 отвечены в записях: {incomplete.tolist()}")
+
+    no_answers = ~answers & _P2_ALL_BYTES
+    sincerity_score = _POPCOUNT8[no_answers & _P2_SINCERITY_NO_BYTES].sum(axis=1, dtype=np.int64)
+    raw_score = (
+        _POPCOUNT8[answers & _P2_NPU_YES_BYTES].sum(axis=1, dtype=np.int64)
+        + _POPCOUNT8[no_answers & _P2_NPU_NO_BYTES].sum(axis=1, dtype=np.int64)
+    )
+    return _p2_batch_result(raw_score, sincerity_score, norms_version)
+
+
+def prognoz2_responses_to_row(responses):
+    """Перевод ответов сессии {p2_id: bool} в строку матрицы для score_prognoz2_batch."""
+    row = np.zeros(PROGNOZ2_TOTAL, dtype=bool)
+    for question in PROGNOZ2_QUESTIONS:
+        value = responses.get(question.id)
+        if value is None:
+            raise ValueError(f"Не отвечен вопрос Прогноз-2: {question.number}")
+        row[question.number - 1] = bool(value)
+    return row
+
+
+# --- Прохождение теста: переходы состояния ---
+# Функции работают с состоянием как с отображением (dict или st.session_state): их вызывает
+# и UI, и воспроизведение журнала сессии (replay.py).
+
+def prognoz2_start(state, norms_version=None, invalid_policy=None):
+    """Начало (или повтор) теста: сброс ответов и счётчиков, этап p2_test."""
+    state["p2_answers"] = PROGNOZ2_EMPTY_RECORD
+    state["p2_counts"] = PROGNOZ2_EMPTY_COUNTS
+    state["p2_current_index"] = 0
+    state["p2_result"] = None
+    # Версия норм фиксируется в сессии и попадает в результат и отчёты
+    state["p2_norms_version"] = norms_version or PROGNOZ2_DEFAULT_NORMS
+    state["p2_invalid_policy"] = invalid_policy or PROGNOZ2_EARLY_INVALID_POLICY
+    state["stage"] = "p2_test"
+
+
+def prognoz2_answer(state, value):
+    """Ответ на текущий пункт и переход дальше; True — тест завершён и результат готов."""
+    idx = state["p2_current_index"]
+    number = PROGNOZ2_QUESTIONS[idx].number
+    # Запись разбирается один раз: прежний ответ и новая запись из тех же целых
+    answers, answered = _p2_record_to_ints(state["p2_answers"])
+    bit = _p2_bit(number)
+    previous = bool(answers & bit) if answered & bit else None
+    answers = answers | bit if value else answers & ~bit
+    state["p2_answers"] = _p2_ints_to_record(answers, answered | bit)
+    state["p2_counts"] = prognoz2_update_counts(state["p2_counts"], number, previous, value)
+
+    if prognoz2_is_invalid(state["p2_counts"]) and state["p2_invalid_policy"] == "stop":
+        # Протокол уже недостоверен — прерываем, чтобы провести повторный инструктаж
+        state["stage"] = "p2_invalid"
+        return False
+    if idx < len(PROGNOZ2_QUESTIONS) - 1:
+        state["p2_current_index"] = idx + 1
+        return False
+    # Все вопросы отвечены — итог по накопленным счётчикам
+    state["p2_result"] = prognoz2_result_from_counts(state["p2_answers"], state["p2_counts"], state["p2_norms_version"])
+    state["stage"] = "p2_results"
+    return True
+
+
+def prognoz2_back(state):
+    """Возврат к предыдущему пункту."""
+    if state["p2_current_index"] > 0:
+        state["p2_current_index"] -= 1
+
+
 # --- UI пайплайна ---
 
+def _log_event(kind, *args):
+    """Событие в журнал сессии; сбой записи не прерывает тест."""
+    try:
+        session_log.append(st.session_state, kind, *args)
+    except Exception as e:
+        st.warning(f"Не удалось записать событие в журнал сессии: {str(e)}")
+
+
 def prepare_prognoz2():
-    """Сброс состояния перед прохождением теста «Прогноз-2»."""
-    st.session_state.p2_responses = {}
-    st.session_state.p2_current_index = 0
-    st.session_state.p2_result = None
+    """Начало теста «Прогноз-2» в сессии: сброс состояния и запись в журнал."""
+    prognoz2_start(st.session_state, st.session_state.get("p2_norms_version"), st.session_state.get("p2_invalid_policy"))
+    st.session_state.p2_last_spoken = None
+    _log_event("p2_start", st.session_state.p2_norms_version, st.session_state.p2_invalid_policy)
+
+
+def _request_prognoz2_speech(question, idx):
+    """Запуск озвучивания вопроса, если включено; оставшиеся пункты синтезируются в фоне.
+
+    Возвращает (контейнер, Future) или None; ожидание — в конце экрана, после кнопок.
+    """
+    api_key = tts.session_api_key(st.session_state)
+    if not (st.session_state.get("tts_enabled") and tts.can_speak(api_key)):
+        return None
+    voice = st.session_state.get("tts_voice", "alloy")
+    language = st.session_state.get("tts_language", "ru")
+    session_id = st.session_state.get("session_id")
+    # Порядок пунктов фиксирован — в очередь ставится весь остаток списка
+    remaining = [item.text for item in PROGNOZ2_QUESTIONS[idx + 1:]]
+    tts.prefetch(remaining, voice, language, api_key, session_id)
+
+    container = st.empty()
+    if st.session_state.get("p2_last_spoken") == question.id:
+        return None
+    return container, tts.request(question.text, voice, language, api_key, session_id)
+
+
+def _cancel_prognoz2_speech(question):
+    if st.session_state.get("tts_enabled"):
+        tts.cancel(
+            question.text,
+            st.session_state.get("tts_voice", "alloy"),
+            st.session_state.get("tts_language", "ru"),
+            st.session_state.get("session_id"),
+        )
+
+
+def _save_prognoz2_result():
+    """Сохранение результата теста и упакованной записи ответов в хранилище."""
+    result = st.session_state.p2_result
+    questionnaire = st.session_state.get("questionnaire_responses") or {}
+    record = {
+        "session_id": st.session_state.session_id,
+        "kind": "prognoz2",
+        "started_at": st.session_state.get("started_at") or datetime.now().isoformat(timespec="seconds"),
+        "completed_at": datetime.now().isoformat(timespec="seconds"),
+        "unit": store.ASSESSMENT_UNIT,
+        "risk_level": result["risk_level"],
+        "full_name": questionnaire.get("full_name"),
+        "questionnaire": questionnaire,
+        "results": result,
+        "p2_answers": st.session_state.p2_answers,
+    }
+    try:
+        # Итог подтверждается кандидату, поэтому дожидаемся его фиксации на диске
+        writer = store.get_writer()
+        writer.put_assessment(record)
+        if not writer.flush(timeout=store.STORE_PUT_TIMEOUT, session_id=record["session_id"]):
+            st.warning("Результаты ещё не записаны в хранилище: очередь записи не успела их зафиксировать")
+    except Exception as e:
+        st.warning(f"Не удалось сохранить результаты в хранилище: {str(e)}")
 
 
 def show_prognoz2_test():
@@ -152,45 +583,95 @@ def show_prognoz2_test():
         st.metric("Прогресс", f"{int(progress * 100)}%")
     st.progress(progress)
 
-    st.markdown(f"### 💭 {question['text']}")
+    st.markdown(f"### 💭 {question.text}")
+    speech = _request_prognoz2_speech(question, idx)
     st.markdown("**Выберите ответ:**")
 
     selected_value = None
     col_yes, col_no = st.columns(2)
     with col_yes:
-        if st.button("Да", key=f"p2_btn_{question['id']}_yes", use_container_width=True):
+        if st.button("Да", key=f"p2_btn_{question.id}_yes", use_container_width=True):
             selected_value = True
     with col_no:
-        if st.button("Нет", key=f"p2_btn_{question['id']}_no", use_container_width=True):
+        if st.button("Нет", key=f"p2_btn_{question.id}_no", use_container_width=True):
             selected_value = False
 
     if selected_value is not None:
-        st.session_state.p2_responses[question["id"]] = selected_value
-
-        if idx < total - 1:
-            st.session_state.p2_current_index += 1
-        else:
-            # Все вопросы отвечены — считаем результат и переходим к результатам
-            st.session_state.p2_result = score_prognoz2(st.session_state.p2_responses)
-            st.session_state.stage = "p2_results"
+        _cancel_prognoz2_speech(question)
+        _log_event("answer", question.number, int(selected_value))
+        if prognoz2_answer(st.session_state, selected_value):
+            _save_prognoz2_result()
         st.rerun()
 
+    if prognoz2_is_invalid(st.session_state.p2_counts) and st.session_state.p2_invalid_policy == "flag":
+        st.error(
+            f"⚠️ Шкала искренности уже достигла порога ({PROGNOZ2_SINCERITY_THRESHOLD}): протокол будет "
+            "недостоверен. Рекомендуется прервать тест и провести повторный инструктаж."
+        )
+        if st.button("🔄 Начать заново после инструктажа", key="p2_rebrief_btn"):
+            prepare_prognoz2()
+            st.rerun()
+
     # Предыдущий ответ и навигация назад
-    if question["id"] in st.session_state.p2_responses:
-        prev = "Да" if st.session_state.p2_responses[question["id"]] else "Нет"
+    previous = prognoz2_get_answer(st.session_state.p2_answers, question.number)
+    if previous is not None:
+        prev = "Да" if previous else "Нет"
         st.info(f"Ваш предыдущий ответ: {prev}")
 
     if idx > 0:
         if st.button("⬅️ Предыдущий вопрос", key="p2_prev_btn"):
-            st.session_state.p2_current_index -= 1
+            _log_event("back")
+            prognoz2_back(st.session_state)
             st.rerun()
 
+    # Воспроизведение, когда аудио готово; ответ кандидата прерывает ожидание
+    if speech is not None and tts.play(*speech):
+        st.session_state.p2_last_spoken = question.id
 
-def _draw_sten_chart(result):
-    """Компактная шкала стэна 1-10 с зонами риска."""
-    color = {"high": "#F44336", "medium": "#FFC107", "low": "#4CAF50"}[result["risk_level"]]
-    fig, ax = plt.subplots(figsize=(8, 1.7))
-    ax.barh([0], [result["sten"]], color=color, height=0.5)
+
+def show_prognoz2_invalid():
+    """Экран досрочно прерванного теста (политика stop): протокол недостоверен."""
+    st.title("⚠️ Тест «Прогноз-2» прерван")
+    answered = prognoz2_answered_count(st.session_state.p2_answers)
+    st.error(
+        f"""
+    Шкала искренности достигла порога ({PROGNOZ2_SINCERITY_THRESHOLD}) после {answered} из
+    {PROGNOZ2_TOTAL} ответов — результат теста будет недостоверен при любых оставшихся ответах.
+    """
+    )
+    st.info(
+        "💡 Проведите повторный инструктаж: объясните, что важны искренние ответы, "
+        "и предложите пройти тест заново."
+    )
+
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("🔄 Пройти заново", use_container_width=True):
+            prepare_prognoz2()
+            st.rerun()
+    with col2:
+        if st.button("🏠 В начало", use_container_width=True):
+            st.session_state.stage = "start"
+            _log_event("stage", "start")
+            st.rerun()
+
+
+PROGNOZ2_RISK_COLORS = {"high": "#F44336", "medium": "#FFC107", "low": "#4CAF50"}
+
+
+@functools.lru_cache(maxsize=None)
+def _sten_chart_png(sten, risk_level):
+    """PNG компактной шкалы стэна 1-10 с зонами риска.
+
+    Возможных картинок всего 10 стэнов x 3 цвета, поэтому каждая рендерится один раз на
+    процесс и дальше отдаётся из кэша. Используется Figure без pyplot: фигура не попадает
+    в глобальный реестр и не держит память сессии.
+    """
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(8, 1.7))
+    ax = fig.subplots()
+    ax.barh([0], [sten], color=PROGNOZ2_RISK_COLORS[risk_level], height=0.5)
     ax.axvspan(0.5, 3.5, alpha=0.12, color="red")
     ax.axvspan(3.5, 6.5, alpha=0.12, color="gold")
     ax.axvspan(6.5, 10.5, alpha=0.12, color="green")
@@ -199,9 +680,17 @@ def _draw_sten_chart(result):
     ax.set_yticks([])
     ax.set_xticks(range(1, 11))
     ax.set_xlabel("Стэн НПУ (1 — высокий риск, 10 — норма)")
-    ax.set_title(f"Стэн: {result['sten']} из 10")
-    plt.tight_layout()
-    st.pyplot(fig)
+    ax.set_title(f"Стэн: {sten} из 10")
+    fig.tight_layout()
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    return buffer.getvalue()
+
+
+def _draw_sten_chart(result):
+    """Шкала стэна из кэша готовых картинок."""
+    st.image(_sten_chart_png(result["sten"], result["risk_level"]))
 
 
 def _prognoz2_report(result):
@@ -214,6 +703,7 @@ def _prognoz2_report(result):
         "",
         f"Сырой балл НПУ: {result['npu_raw_score']} из {PROGNOZ2_MAX_NPU}",
         f"Стэн: {result['sten']} из 10",
+        f"Нормы: {result['norms_version']}",
         f"Шкала искренности: {result['sincerity_score']} (порог {PROGNOZ2_SINCERITY_THRESHOLD})",
         "Достоверность: " + ("в норме" if result["sincerity_valid"] else "НИЗКАЯ — результаты под вопросом"),
         "",
@@ -234,6 +724,7 @@ def _prognoz2_csv(result):
     writer.writerow(["Сырой балл НПУ", result["npu_raw_score"]])
     writer.writerow(["Максимум НПУ", PROGNOZ2_MAX_NPU])
     writer.writerow(["Стэн", result["sten"]])
+    writer.writerow(["Нормы", result["norms_version"]])
     writer.writerow(["Шкала искренности", result["sincerity_score"]])
     writer.writerow(["Порог искренности", PROGNOZ2_SINCERITY_THRESHOLD])
     writer.writerow(["Достоверность", "в норме" if result["sincerity_valid"] else "низкая"])
@@ -251,7 +742,6 @@ def show_prognoz2_results():
         st.warning("Нет данных о прохождении теста. Пожалуйста, пройдите тест.")
         if st.button("📋 Пройти тест «Прогноз-2»"):
             prepare_prognoz2()
-            st.session_state.stage = "p2_test"
             st.rerun()
         return
 
@@ -316,11 +806,11 @@ def show_prognoz2_results():
     with col1:
         if st.button("🔄 Пройти заново", use_container_width=True):
             prepare_prognoz2()
-            st.session_state.stage = "p2_test"
             st.rerun()
     with col2:
         if st.button("🏠 В начало", use_container_width=True):
             st.session_state.stage = "start"
+            _log_event("stage", "start")
             st.rerun()
 
     st.warning(
@@ -0,0 +1,353 @@
+"""Психометрический анализ по когорте: пункты, надёжность шкал, связь методик.
+
+По колоночной выгрузке (cohort_store.py) считаются:
+- для вопросов «Прогноз-2» — доля ответов «Да» и исправленная корреляция пункта (по ключу)
+  с сырым баллом НПУ без вклада самого пункта, а также KR-20 по ключу НПУ;
+- для шкал скрининга — α Кронбаха по пунктам каждого этапа (скрининг, углублённая оценка
+  среднего и высокого риска) у ответивших на все пункты этапа;
+- корреляция стэна «Прогноз-2» с баллом шкалы нервно-психической устойчивости (stability)
+  у кандидатов, прошедших обе методики.
+
+Выборки не хранятся: для каждого набора переменных накапливаются число наблюдений, суммы и
+матрица попарных произведений (Moments). Новый кандидат добавляет O(k²) операций для k
+переменных, а α, доли и корреляции выводятся из сумм, так что пересчитывать всю когорту не
+нужно. Суммы сохраняются в каталоге выгрузки (psychometrics.npz) вместе с числом учтённых
+строк и поколением выгрузки; refresh дописывает выгрузку из хранилища и учитывает только
+новые строки, а если поколение сменилось (выгрузку пересобрали или строки в ней заменены),
+считает суммы заново. Экран — admin.show_psychometrics.
+
+Запуск:
+    python psychometrics.py                 # обновить выгрузку и показать сводку
+    python psychometrics.py --bench 1000000 # замер на синтетической выгрузке
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+import cohort_store
+import prognoz2
+import question_bank
+import store
+from question_bank import SCALE_NAMES
+
+STATE_FILE = "psychometrics.npz"
+TIERS = ("screening", "medium", "high")
+TIER_NAMES = {"screening": "скрининг", "medium": "средний риск", "high": "высокий риск"}
+# Шкалы, для которых считается α (искренность — контрольная шкала, не конструкт)
+ALPHA_SCALES = tuple(scale for scale in cohort_store.SCALES if scale != "sincerity")
+STEN_SCALE = "stability"
+WEAK_ITEM_TOTAL = 0.2  # исправленная корреляция пункта ниже этой — пункт слабо связан со шкалой
+
+# Пункты шкалы на этапе: номера столбцов в cohort_store "responses" (порядок question_bank.ITEMS)
+SCALE_ITEMS = {
+    (scale, tier): tuple(question_bank.tier_items(tier, scale))
+    for scale in ALPHA_SCALES
+    for tier in TIERS
+    if len(question_bank.tier_items(tier, scale)) > 1
+}
+# Направление ключа НПУ по пункту «Прогноз-2»: +1 — «Да», -1 — «Нет», 0 — пункт не входит в НПУ
+P2_KEY = np.zeros(prognoz2.PROGNOZ2_TOTAL, dtype=np.int64)
+P2_KEY[np.array(prognoz2.PROGNOZ2_NPU_YES) - 1] = 1
+P2_KEY[np.array(prognoz2.PROGNOZ2_NPU_NO) - 1] = -1
+
+_refresh_lock = threading.Lock()
+
+
+class Moments:
+    """Накопленные моменты k переменных: n, Σx и Σxxᵀ (целые, без ошибок округления)."""
+
+    __slots__ = ("n", "sums", "cross")
+
+    def __init__(self, size):
+        self.n = 0
+        self.sums = np.zeros(size, dtype=np.int64)
+        self.cross = np.zeros((size, size), dtype=np.int64)
+
+    def add(self, values):
+        """Добавление наблюдений: строка (k,) — один кандидат, матрица (m, k) — порция."""
+        values = np.asarray(values)
+        if values.ndim == 1:
+            values = values[np.newaxis, :]
+        if not len(values):
+            return
+        self.n += len(values)
+        self.sums += values.sum(axis=0, dtype=np.int64)
+        # Произведение через BLAS в float64: на порции до 2**16 строк значения целые и точные
+        block = values.astype(np.float64)
+        self.cross += np.rint(block.T @ block).astype(np.int64)
+
+    def covariance(self):
+        """Выборочная ковариационная матрица (NaN, если наблюдений меньше двух)."""
+        if self.n < 2:
+            return np.full(self.cross.shape, np.nan)
+        return (self.cross - np.outer(self.sums, self.sums) / self.n) / (self.n - 1)
+
+    def means(self):
+        return self.sums / self.n if self.n else np.full(self.sums.shape, np.nan)
+
+
+def cronbach_alpha(covariance):
+    """α Кронбаха по ковариационной матрице пунктов."""
+    size = len(covariance)
+    total = covariance.sum()
+    if size < 2 or not total > 0:
+        return float("nan")
+    return float(size / (size - 1) * (1 - np.trace(covariance) / total))
+
+
+def _correlation(covariance, first, second):
+    denominator = np.sqrt(covariance[first, first] * covariance[second, second])
+    return float(covariance[first, second] / denominator) if denominator > 0 else float("nan")
+
+
+class PsychometricState:
+    """Накопленные суммы по первым rows строкам выгрузки поколения generation."""
+
+    def __init__(self, generation=None):
+        self.rows = 0
+        self.generation = generation
+        self.scales = {key: Moments(len(items)) for key, items in SCALE_ITEMS.items()}
+        self.p2 = Moments(prognoz2.PROGNOZ2_TOTAL + 1)  # ответы «Да» по пунктам и сырой балл НПУ
+        self.pair = Moments(2)  # стэн «Прогноз-2» и балл шкалы STEN_SCALE
+
+    # --- Обновление ---
+
+    def add_screening(self, responses):
+        """Ответы кандидатов на пункты (строки cohort_store "responses", 0 — нет ответа)."""
+        responses = np.atleast_2d(responses)
+        for key, items in SCALE_ITEMS.items():
+            values = responses[:, items]
+            self.scales[key].add(values[(values > 0).all(axis=1)])
+
+    def add_prognoz2(self, records, raw_scores):
+        """Упакованные записи «Прогноз-2» (m, 22) завершённых протоколов и их сырые баллы НПУ."""
+        records = np.atleast_2d(records)
+        answers = np.unpackbits(records[:, :prognoz2.PROGNOZ2_PACKED_BYTES], axis=1)[:, :prognoz2.PROGNOZ2_TOTAL]
+        self.p2.add(np.column_stack([answers, np.atleast_1d(raw_scores)]))
+
+    def add_pairs(self, stens, scores):
+        self.pair.add(np.column_stack([stens, scores]))
+
+    def absorb(self, cohort, stop=None):
+        """Учёт строк выгрузки с self.rows по stop (по умолчанию — до конца)."""
+        start, stop = self.rows, cohort.rows if stop is None else stop
+        if stop <= start:
+            return 0
+        kind = cohort.column("kind")
+        sten = cohort.column("p2_sten")
+        responses, records, raw = cohort.column("responses"), cohort.column("p2_record"), cohort.column("p2_raw")
+        for block_start in range(start, stop, cohort_store.BLOCK_ROWS):
+            block = slice(block_start, min(block_start + cohort_store.BLOCK_ROWS, stop))
+            block_kind = kind[block]
+            screening = block_kind == cohort_store.KINDS.index("screening")
+            if screening.any():
+                self.add_screening(responses[block][screening])
+            # Стэн есть только у завершённых протоколов
+            complete = (block_kind == cohort_store.KINDS.index("prognoz2")) & (sten[block] > 0)
+            if complete.any():
+                self.add_prognoz2(records[block][complete], raw[block][complete])
+        p2_rows, screening_rows = _new_pairs(cohort, start, stop)
+        scores = cohort.column("scale_scores")[screening_rows, cohort_store.SCALES.index(STEN_SCALE)]
+        assessed = scores >= 0
+        self.add_pairs(sten[p2_rows][assessed], scores[assessed])
+        self.rows = stop
+        return stop - start
+
+    # --- Показатели ---
+
+    def report(self):
+        """Показатели, выведенные из накопленных сумм."""
+        p2_covariance = self.p2.covariance()
+        items = prognoz2.PROGNOZ2_TOTAL
+        variance = np.diag(p2_covariance)[:items]
+        with_total = p2_covariance[:items, items]
+        total_variance = p2_covariance[items, items]
+        # Сумма без пункта: T - a·x (постоянный сдвиг у пунктов с ключом «Нет» на корреляцию не влияет)
+        rest_covariance = with_total - P2_KEY * variance
+        rest_variance = total_variance - 2 * P2_KEY * with_total + P2_KEY ** 2 * variance
+        with np.errstate(invalid="ignore", divide="ignore"):
+            item_total = rest_covariance / np.sqrt(variance * rest_variance)
+        # По ключу: у пунктов с ключом «Нет» в балл идёт ответ «Нет», знак корреляции меняется
+        item_total = np.where(P2_KEY < 0, -item_total, item_total)
+        keyed = P2_KEY != 0
+        # Сырой балл — сумма пунктов с ключом, поэтому его дисперсия — дисперсия суммы в KR-20
+        kr20 = float("nan")
+        if total_variance > 0:
+            kr20 = float(keyed.sum() / (keyed.sum() - 1) * (1 - variance[keyed].sum() / total_variance))
+        return {
+            "rows": self.rows,
+            "p2": {
+                "n": self.p2.n,
+                "endorsement": self.p2.means()[:items],
+                "item_total": item_total,
+                "kr20": kr20,
+            },
+            "scales": [
+                {
+                    "scale": scale,
+                    "tier": tier,
+                    "items": len(SCALE_ITEMS[scale, tier]),
+                    "n": self.scales[scale, tier].n,
+                    "alpha": cronbach_alpha(self.scales[scale, tier].covariance()),
+                }
+                for scale, tier in SCALE_ITEMS
+            ],
+            "sten_scale": {"scale": STEN_SCALE, "n": self.pair.n, "r": _correlation(self.pair.covariance(), 0, 1)},
+        }
+
+    # --- Сохранение ---
+
+    def save(self, path):
+        arrays = {"rows": np.array(self.rows), "generation": np.array(self.generation or ""),
+                  "layout": np.array(_layout())}
+        for name, moments in self._moments():
+            arrays[f"{name}.n"] = np.array(moments.n)
+            arrays[f"{name}.sums"] = moments.sums
+            arrays[f"{name}.cross"] = moments.cross
+        temporary = os.path.join(path, STATE_FILE + ".tmp.npz")
+        np.savez(temporary, **arrays)
+        os.replace(temporary, os.path.join(path, STATE_FILE))
+
+    @classmethod
+    def load(cls, path):
+        """Сохранённые суммы или пустое состояние (если файла нет или изменилась раскладка)."""
+        state = cls()
+        state_path = os.path.join(path, STATE_FILE)
+        if not os.path.exists(state_path):
+            return state
+        with np.load(state_path) as arrays:
+            if str(arrays["layout"]) != _layout():
+                return state
+            state.rows = int(arrays["rows"])
+            state.generation = str(arrays["generation"]) if "generation" in arrays else None
+            for name, moments in state._moments():
+                moments.n = int(arrays[f"{name}.n"])
+                moments.sums = arrays[f"{name}.sums"].astype(np.int64)
+                moments.cross = arrays[f"{name}.cross"].astype(np.int64)
+        return state
+
+    def _moments(self):
+        yield "p2", self.p2
+        yield "pair", self.pair
+        for (scale, tier), moments in self.scales.items():
+            yield f"{scale}.{tier}", moments
+
+
+def _layout():
+    return json.dumps(
+        {"items": cohort_store.ITEM_IDS, "scales": {f"{scale}.{tier}": items for (scale, tier), items in SCALE_ITEMS.items()},
+         "p2": prognoz2.PROGNOZ2_TOTAL, "sten_scale": STEN_SCALE},
+        ensure_ascii=False,
+    )
+
+
+def _new_pairs(cohort, start, stop):
+    """Пары строк («Прогноз-2», скрининг) одной сессии, в которых позднее из двух — новое (>= start).
+
+    Строку другого вида той же сессии находит индекс сессий выгрузки (CohortStore.locate),
+    поэтому работа пропорциональна числу новых строк, а не размеру выгрузки.
+    """
+    rows = np.arange(start, stop)
+    kind = np.asarray(cohort.column("kind")[start:stop])
+    partners = cohort.locate(cohort.column("session_id")[start:stop], 1 - kind)
+    # Пара учитывается один раз — строкой, пришедшей позже
+    paired = (partners >= 0) & (partners < rows)
+    p2 = kind == cohort_store.KINDS.index("prognoz2")
+    p2_rows = np.where(p2, rows, partners)[paired]
+    screening_rows = np.where(p2, partners, rows)[paired]
+    # Стэн есть только у завершённых протоколов
+    complete = cohort.column("p2_sten")[p2_rows] > 0
+    return p2_rows[complete], screening_rows[complete]
+
+
+def refresh(db=None, cohort_dir=None):
+    """Дозапись выгрузки из хранилища и учёт новых строк; возвращает (состояние, новых строк)."""
+    with _refresh_lock:
+        cohort = cohort_store.CohortStore(cohort_dir or cohort_store.COHORT_DIR)
+        if db is not None:
+            cohort.sync(db)
+        state = PsychometricState.load(cohort.path)
+        if state.generation != cohort.generation or state.rows > cohort.rows:
+            # Выгрузку пересобрали или заменили в ней строки — суммы считаются заново
+            state = PsychometricState(cohort.generation)
+        absorbed = state.absorb(cohort)
+        if absorbed:
+            state.save(cohort.path)
+        return state, absorbed
+
+
+# --- Вывод и замер скорости ---
+
+def print_report(report):
+    print(f"Строк выгрузки учтено: {report['rows']}")
+    print("α Кронбаха:")
+    for row in report["scales"]:
+        print(
+            f"  {SCALE_NAMES.get(row['scale'], row['scale'])}, {TIER_NAMES[row['tier']]} "
+            f"({row['items']} пунктов, n={row['n']}): {row['alpha']:.3f}"
+        )
+    p2 = report["p2"]
+    if p2["n"]:
+        print(f"«Прогноз-2»: протоколов {p2['n']}, KR-20 по НПУ {p2['kr20']:.3f}")
+        weak = (np.flatnonzero((P2_KEY != 0) & (np.nan_to_num(p2["item_total"], nan=1.0) < WEAK_ITEM_TOTAL)) + 1).tolist()
+        print(f"  пункты со слабой связью с НПУ (r < {WEAK_ITEM_TOTAL}): {weak or 'нет'}")
+    pair = report["sten_scale"]
+    print(f"Стэн «Прогноз-2» и {SCALE_NAMES.get(pair['scale'], pair['scale'])}: r = {pair['r']:.3f} (n={pair['n']})")
+
+
+def bench(rows, seed=1):
+    rng = np.random.default_rng(seed)
+    path = tempfile.mkdtemp(prefix="psychometrics_bench_")
+    try:
+        cohort = cohort_store.CohortStore(path)
+        chunk = 100_000
+        for offset in range(0, rows, chunk):
+            cohort.append(cohort_store.synthetic_columns(offset, min(chunk, rows - offset), rng))
+        print(f"Выгрузка: {rows} строк (скрининг и «Прогноз-2» у каждого кандидата)")
+
+        state = PsychometricState()
+        start = time.perf_counter()
+        state.absorb(cohort, rows - 1000)
+        full = time.perf_counter() - start
+        print(f"  полный подсчёт по {rows - 1000} строкам: {full:.2f} с")
+        start = time.perf_counter()
+        state.absorb(cohort)
+        increment = time.perf_counter() - start
+        print(f"  учёт 1000 новых строк: {increment * 1000:.1f} мс (включая поиск пар по индексу сессий)")
+
+        single = PsychometricState()
+        responses = np.asarray(cohort.column("responses")[:1000:2])
+        start = time.perf_counter()
+        for row in responses:
+            single.add_screening(row)
+        print(f"  по одному кандидату: {(time.perf_counter() - start) / len(responses) * 1e6:.0f} мкс на скрининг")
+        print_report(state.report())
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Психометрический анализ по когорте")
+    parser.add_argument("--dir", default=cohort_store.COHORT_DIR, help="каталог выгрузки (COHORT_DIR)")
+    parser.add_argument("--bench", type=int, metavar="N", help="замер на синтетической выгрузке из N строк")
+    args = parser.parse_args()
+    if args.bench:
+        return bench(args.bench)
+    start = time.perf_counter()
+    state, absorbed = refresh(store.get_store(), args.dir)
+    print(f"Учтено новых строк: {absorbed} за {time.perf_counter() - start:.1f} с")
+    print_report(state.report())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,378 @@
+"""Банк вопросов: исходные списки вопросов и их скомпилированное представление.
+
+Streamlit при каждом действии заново выполняет app.py, но импортированные модули живут весь
+процесс. Поэтому банки (скрининг, углубленная оценка, военная анкета) объявлены здесь и
+один раз компилируются в неизменяемые записи с целочисленными номерами: тексты хранятся
+в процессе в единственном экземпляре, а сессия держит только перестановку номеров пунктов.
+"""
+
+from types import MappingProxyType
+
+# Скрининговые вопросы (первичная оценка)
+SCREENING_QUESTIONS = {
+    "aggression": [
+        {"id": "ag1", "text": "Я раздражаюсь, когда у меня что-то не получается."},
+        {"id": "ag2", "text": "Иногда, когда я неважно себя чувствую, я бываю раздражительным."},
+        {"id": "ag3", "text": "Некоторые мои друзья считают, что я вспыльчив."}
+    ],
+    "isolation": [
+        {"id": "is1", "text": "Мне трудно заводить друзей."},
+        {"id": "is2", "text": "Мне не хватает общения."},
+        {"id": "is3", "text": "Мне не с кем поговорить."}
+    ],
+    "somatic": [
+        {"id": "som1", "text": "Иногда у меня бывает ускоренное сердцебиение"},
+        {"id": "som2", "text": "Иногда я чувствую, что я не могу контролировать свои мысли"},
+        {"id": "som3", "text": "Иногда у меня бывают желудочно-кишечные расстройства "}
+    ],
+    "anxiety": [
+        {"id": "anx1", "text": "Я испытываю напряженность, мне не по себе"},
+        {"id": "anx2", "text": "Приступы плохого настроения у меня бывают редко."},
+        {"id": "anx3", "text": "Иногда совершенно безо всякой причины у меня вдруг наступает период необычайной веселости."}
+    ],
+    "stability": [
+        {"id": "stab1", "text": "Я могу получить удовольствие от хорошей книги, радио- или телепрограммы "},
+        {"id": "stab2", "text": "Бывало, что при обсуждении некоторых вопросов я, особенно не задумываясь, соглашался с мнением других."},
+        {"id": "stab3", "text": "У меня часто бывают подъемы и спады настроения."}
+    ],
+    "military_adaptation": [
+        {"id": "mil1", "text": "Мне трудно выполнять приказы без объяснения причин."},
+        {"id": "mil2", "text": "Я боюсь физических нагрузок и испытаний."},
+        {"id": "mil3", "text": "Мне сложно находиться далеко от дома длительное время."}
+    ],
+    "sincerity": [
+        {"id": "sin1", "text": "Бывало, что я говорил о вещах, в которых не разбираюсь."},
+        {"id": "sin2", "text": "Бывает, что я сержусь."},
+        {"id": "sin3", "text": "Иногда я говорю неправду."}
+    ]
+}
+
+# Дополнительные вопросы для шкал со средним риском
+MEDIUM_RISK_QUESTIONS = {
+    "aggression": [
+        {"id": "ag_med1", "text": "Я дерусь чаще, чем окружающие."},
+        {"id": "ag_med2", "text": "Если кто-то ударит меня, я дам сдачи."},
+        {"id": "ag_med3", "text": "Иногда я выхожу из себя без особой причины."},
+        {"id": "ag_med4", "text": "Мне трудно сдерживать раздражение."},
+        {"id": "ag_med5", "text": "Иногда я настолько выходил из себя, что ломал вещи."}
+    ],
+    "isolation": [
+        {"id": "is_med1", "text": "Счастливей всего я бываю, когда я один."},
+        {"id": "is_med2", "text": "Если бы люди не были настроены против меня, я достиг бы в жизни гораздо большего."},
+        {"id": "is_med3", "text": "Иногда я бываю, уверен, что другие люди знают, о чем я думаю."},
+        {"id": "is_med4", "text": "Мне кажется, что по отношению именно ко мне особенно часто поступают несправедливо."},
+        {"id": "is_med5", "text": "Часто, даже когда все складывается для меня хорошо, я чувствую, что мне все безразлично."},
+        {"id": "is_med6", "text": "Мне кажется, что я все чувствую более остро, чем другие."}
+    
+    ],
+    "somatic": [
+        {"id": "som_med1", "text": "Бывало, что я целыми днями или даже неделями ничего не мог делать, потому что никак не мог заставить себя взяться за работу."},
+        {"id": "som_med2", "text": "Иногда я чувствую, что у меня удушье"},
+        {"id": "som_med3", "text": "Иногда я чувствую, что у меня затрудненное дыхание"},
+        {"id": "som_med4", "text": "Когда я пытаюсь что-то сделать, то часто замечаю, что у меня дрожат руки."},
+        {"id": "som_med5", "text": "Иногда я чувствую Испуг"},
+        {"id": "som_med6", "text": "Беспокойные мысли крутятся у меня в голове"}
+    ],
+    "anxiety": [
+        {"id": "anx_med1", "text": "у меня бывает внезапное чуство паники"},
+        {"id": "anx_med2", "text": "Я испытываю внутреннее напряжение или дрожь"},
+        {"id": "anx_med3", "text": "Я испытываю неусидчивость, словно мне постоянно нужно двигаться"},
+        {"id": "anx_med4", "text": "То, что приносило мне большое удовольствие, и сейчас вызывает у меня такое же чувство"},
+        {"id": "anx_med5", "text": "Работа, требующая пристального внимания, мне нравится."}
+    ],
+    "stability": [
+        {"id": "stab_med1", "text": "Определенно судьба не благосклонна ко мне."},
+        {"id": "stab_med2", "text": "Я легко теряю терпение с людьми."},
+        {"id": "stab_med3", "text": "Люди проявляют ко мне столько сочувствия и симпатии, сколько я заслуживаю."},
+        {"id": "stab_med4", "text": "Иногда мне в голову приходят такие нехорошие мысли, что лучше о них никому не рассказывать."},
+        {"id": "stab_med5", "text": "Должен признать, что временами я волнуюсь из-за пустяков."},
+        {"id": "stab_med6", "text": "Я часто предаюсь грустным размышлениям."},
+        {"id": "stab_med7", "text": "Я человек нервный и легковозбудимый.."}
+    ],
+    "military_adaptation": [
+        {"id": "mil_med1", "text": "Мне трудно принимать решения в стрессовых ситуациях."},
+        {"id": "mil_med2", "text": "Я плохо переношу критику от старших."},
+        {"id": "mil_med3", "text": "Мне сложно работать в команде."},
+        {"id": "mil_med4", "text": "Я избегаю ответственности за других людей."},
+        {"id": "mil_med5", "text": "Мне трудно соблюдать строгий распорядок дня."}
+    ]
+}
+
+# Полные опросники для шкал с высоким риском
+HIGH_RISK_QUESTIONS = {
+    "aggression": [
+        {"id": "ag_full1", "text": "Иногда я не могу сдержать желание ударить другого человека."},
+        {"id": "ag_full2", "text": "Я быстро вспыхиваю, но и быстро остываю."},
+        {"id": "ag_full3", "text": "Бывает, что я просто схожу с ума от ревности."},
+        {"id": "ag_full4", "text": "Если меня спровоцировать, я могу ударить другого человека."},
+        {"id": "ag_full5", "text": "Иногда я не могу сдержать желание ударить другого человека."},
+        {"id": "ag_full6", "text": "Временами мне кажется, что жизнь мне что-то недодала."},
+        {"id": "ag_full7", "text": "Я легко теряю терпение с людьми."},
+        {"id": "ag_full8", "text": "Иногда я чувствую, что вот-вот взорвусь."},
+        {"id": "ag_full9", "text": "Другим постоянно везет."},
+        {"id": "ag_full10", "text": "Я дерусь чаще, чем окружающие."}
+    ],
+    "isolation": [
+        {"id": "is_high1", "text": "Я несчастлив, занимаясь столькими вещами в одиночку."},
+        {"id": "is_high2", "text": "Я чувствую себя изолированным от других."},
+        {"id": "is_high3", "text": "Я чувствую себя покинутым."},
+        {"id": "is_high4", "text": "Я впечатлительнее большинства других людей."},
+        {"id": "is_high5", "text": "я несчастен будучи таким отверженным."},
+        {"id": "is_high6", "text": "Я чувствую себя совершенно одиноким."}
+     ],
+    "somatic": [
+        {"id": "som_high1", "text": "Голова у меня болит часто."},
+        {"id": "som_high2", "text": "Иногда мой слух настолько обостряется, что это мне даже мешает."},
+        {"id": "som_high3", "text": "Иногда я чувствую, что у меня затрудненное дыхание"},
+        {"id": "som_high4", "text": "Иногда я чувствую страх смерти"},
+        {"id": "som_high5", "text": "Раз в неделю или чаще я бываю возбужденным и взволнованным."},
+        {"id": "som_high6", "text": "Иногда я принимаю валериану, элениум или другие успокаивающие средства."}
+    ],
+    "anxiety": [
+        {"id": "anx_high1", "text": "Я испытываю страх, кажется, будто что-то ужасное может вот-вот случиться"},
+        {"id": "anx_high2", "text": "Некоторые вещи настолько меня волнуют, что мне даже говорить о них трудно."},
+        {"id": "anx_high3", "text": "Иногда меня подводят нервы"},
+        {"id": "anx_high4", "text": "Думаю, что я человек обреченный."},
+        {"id": "anx_high5", "text": "Временами я бываю совершенно уверен в своей никчемности."}
+    ],
+    "stability": [
+        {"id": "stab_high1", "text": "Теперь мне трудно надеяться на то, что я чего-нибудь добьюсь в жизни."},
+        {"id": "stab_high2", "text": "Я легко теряю терпение с людьми."},
+        {"id": "stab_high3", "text": "У меня бывали периоды, когда я что-то делал, а потом не знал, что именно я делал."},
+        {"id": "stab_high4", "text": "Иногда у меня бывает чувство, что передо мной нагромоздилось столько трудностей, что одолеть их просто невозможно."},
+        {"id": "stab_high5", "text": "Если в моих неудачах кто-то виноват, я не оставляю его безнаказанным."},
+        {"id": "stab_high6", "text": "Мне очень трудно приспособиться к новым условиям жизни, работы или учебы. Переход к новым условиям жизни, работы или учебы кажется мне невыносимо трудным."},
+        {"id": "stab_high7", "text": "Иногда я чувствую, что близок к нервному срыву."}
+    ],
+    "military_adaptation": [
+        {"id": "mil_high1", "text": "Мне трудно принимать решения в стрессовых ситуациях."},
+        {"id": "mil_high2", "text": "Я плохо переношу критику от старших."},
+        {"id": "mil_high3", "text": "Мне сложно работать в команде."},
+        {"id": "mil_high4", "text": "Я избегаю ответственности за других людей."},
+        {"id": "mil_high5", "text": "Мне трудно соблюдать строгий распорядок дня."}
+    ]
+}
+   
+
+# Названия шкал
+SCALE_NAMES = {
+    "aggression": "Шкала агрессии (Басса-Перри)",
+    "isolation": "Шкала изоляции/депривации (Д. Рассел)",
+    "somatic": "Шкала соматической депрессии (Бека)",
+    "anxiety": "Шкала тревожности и депрессии (NUDS)",
+    "stability": "Шкала нервно-психической устойчивости",
+    "military_adaptation": "Шкала военной адаптации",
+    "sincerity": "Шкала искренности"
+}
+
+# Расширенная анкета для военнослужащих
+MILITARY_QUESTIONNAIRE = {
+    "personal_info": {
+        "title": "👤 Личная информация",
+        "questions": [
+            {"id": "full_name", "text": "ФИО", "type": "text", "required": True},
+            {"id": "birth_date", "text": "Дата рождения", "type": "date", "required": True},
+            {"id": "birth_place", "text": "Место рождения", "type": "text", "required": True},
+            {"id": "residence", "text": "Место жительства", "type": "text", "required": True},   
+            {"id": "residence_coliving", "text": "С кем в настоящее время проживаете и в течении какого времени", "type": "text", "required": True},
+            {"id": "team_senior", "text": "Старший команды", "type": "text", "required": False},
+            {"id": "nationality", "text": "Национальность", "type": "text", "required": True},
+            {"id": "marital_status", "text": "Семейное положение", "type": "select", "options": ["Холост", "Женат", "Разведен"], "required": True},
+            {"id": "education", "text": "Образование", "type": "select", "options": ["Среднее", "Среднее специальное", "Высшее", "Неполное высшее"], "required": True},
+            {"id": "social_media", "text": "Укажите ваши аккаунты в соц сетях", "type": "textarea", "required": False}
+        ]
+    },
+    "achievements_family": {
+        "title": "🏆 Достижения и семья",
+        "questions": [
+            {"id": "sports_achievements", "text": "Есть ли у вас спортивные достижения? Какие?", "type": "textarea", "required": False},
+            {"id": "family_completeness", "text": "Вы воспитывались в полной/неполной семье", "type": "select", "options": ["Полной", "Неполной"], "required": True},
+            {"id": "deceased_relatives", "text": "Есть ли умершие среди близких родственников? (кто, год смерти, причина)", "type": "textarea", "required": False}
+        ]
+    },
+    "family_info": {
+        "title": "👨‍👩‍👧‍👦 Информация о семье",
+        "questions": [
+            {"id": "father_info", "text": "ФИО отца, возраст, место работы", "type": "textarea", "required": False},
+            {"id": "father_relationship", "text": "Взаимоотношения с отцом", "type": "select", "options": ["Отличные", "Хорошие", "Удовлетворительные", "Плохие", "Отсутствуют"], "required": False},
+            {"id": "mother_info", "text": "ФИО матери, возраст, место работы", "type": "textarea", "required": False},
+            {"id": "mother_relationship", "text": "Взаимоотношения с матерью", "type": "select", "options": ["Отличные", "Хорошие", "Удовлетворительные", "Плохие", "Отсутствуют"], "required": False},
+            {"id": "siblings", "text": "Братья и сестры (ФИО, возраст)", "type": "textarea", "required": False},
+            {"id": "home_escapes", "text": "Бывали ли у вас случаи побегов из дома?", "type": "radio", "options": ["Да", "Нет"], "required": True}
+        ]
+    },
+    "social_connections": {
+        "title": "🌐 Социальные связи",
+        "questions": [
+            {"id": "astana_contacts", "text": "Есть ли в городе Астана родственники или знакомые (ФИО и адрес)", "type": "textarea", "required": False},
+            {"id": "family_suicides", "text": "Были ли самоубийства или суицидальные попытки у родственников", "type": "radio", "options": ["Да", "Нет"], "required": True},
+            {"id": "personal_suicides", "text": "Имелись ли у вас в прошлом суицидальные попытки/мысли", "type": "radio", "options": ["Да", "Нет"], "required": True}
+        ]
+    },
+    "health_history": {
+        "title": "🏥 Медицинская история",
+        "questions": [
+            {"id": "family_alcoholism", "text": "Был ли в вашей семье алкоголизм", "type": "radio", "options": ["Да", "Нет"], "required": True},
+            {"id": "family_drugs", "text": "Была ли в вашей семье наркомания", "type": "radio", "options": ["Да", "Нет"], "required": True},
+            {"id": "family_criminal", "text": "Была ли в вашей семье судимость", "type": "radio", "options": ["Да", "Нет"], "required": True},
+            {"id": "family_mental", "text": "Были ли в семье наследственные нервно-психические заболевания", "type": "radio", "options": ["Да", "Нет"], "required": True},
+            {"id": "personal_alcoholism", "text": "Были ли у вас до армии факты алкоголизма", "type": "radio", "options": ["Да", "Нет"], "required": True},
+            {"id": "personal_drugs", "text": "Были ли у вас до армии факты наркомании", "type": "radio", "options": ["Да", "Нет"], "required": True},
+            {"id": "personal_criminal", "text": "Были ли у вас до армии судимости", "type": "radio", "options": ["Да", "Нет"], "required": True},
+            {"id": "personal_mental", "text": "Были ли у вас до армии нервно-психические заболевания", "type": "radio", "options": ["Да", "Нет"], "required": True},
+	        {"id": "personal_headtrauma", "text": "Были ли у Вас сотрясения мозга/травмы головы", "type": "radio", "options": ["Да", "Нет"], "required": True},
+            {"id": "personal_gambling", "text": "Была ли у вас игромания", "type": "radio", "options": ["Да", "Нет"], "required": True},
+            {"id": "hereditary_diseases", "text": "Имеешь ли ты тяжёлые наследственные заболевания? (онкологические, дыхательные, гипертония, сердечные и т.д.)", "type": "textarea", "required": False},
+            {"id": "seizures", "text": "Были ли у ближайших родственников или у вас судорожные припадки", "type": "radio", "options": ["Да", "Нет"], "required": True},
+            {"id": "bedwetting", "text": "Было ли у вас ночное недержание мочи?", "type": "radio", "options": ["Да", "Нет"], "required": True},
+            {"id": "bedwetting_age", "text": "В каком возрасте? (если было недержание)", "type": "number", "required": False}
+        ]
+    },
+    "work_military": {
+        "title": "💼 Работа и военная служба",
+        "questions": [
+            {"id": "work_before_army", "text": "Кем работал до армии, сколько времени?", "type": "textarea", "required": False},
+            {"id": "want_serve", "text": "Желаете ли вы проходить военную службу", "type": "radio", "options": ["Да", "Нет"], "required": True},
+            {"id": "serve_reason", "text": "Причина (если не желаете служить)", "type": "textarea", "required": False},
+            {"id": "service_difficulties", "text": "В чем для вас будет трудность воинской службы", "type": "multiselect", "options": ["Беспрекословное подчинение", "Физические нагрузки", "Удаленность от дома", "Высокая личная ответственность", "Преодоление собственных отрицательных привычек", "Другое"], "required": True}
+        ]
+    },
+    "religion_lifestyle": {
+        "title": "🕌 Религия и образ жизни",
+        "questions": [
+            {"id": "religion_type", "text": "Какую религию исповедуешь", "type": "text", "required": False},
+            {"id": "religion_direction", "text": "Какое направление религии", "type": "text", "required": False},
+            {"id": "religion_teachers", "text": "Если ты слушаешь духовных учителей, то перечисли их", "type": "text", "required": False},
+            {"id": "religious_attendance", "text": "Как часто ходишь в мечеть/церковь", "type": "select", "options": ["Каждый день", "Несколько раз в неделю", "Раз в неделю", "Несколько раз в месяц", "Редко", "Никогда"], "required": False},
+            {"id": "traditional_holidays", "text": "Празднуете ли вы традиционные праздники?", "type": "radio", "options": ["Да", "Нет"], "required": True},
+            {"id": "social_events", "text": "Ходите на различные торжества (дни рождения, свадьбы)", "type": "radio", "options": ["Да", "Нет"], "required": True},
+            {"id": "girlfriend", "text": "Есть ли девушка?", "type": "radio", "options": ["Да", "Нет"], "required": True},
+            {"id": "relationship_closeness", "text": "Насколько близкие отношения по шкале от 1 до 5", "type": "slider", "min": 1, "max": 5, "required": False},
+            {"id": "relationship_period", "text": "Сколько времени вы в отношениях", "type": "text", "required": False}
+        ]
+    },
+    "financial_health": {
+        "title": "💰 Финансы и здоровье",
+        "questions": [
+            {"id": "betting", "text": "Делаешь ли ставки в букмекерских конторах или онлайн", "type": "radio", "options": ["Да", "Нет"], "required": True},
+            {"id": "credits", "text": "Есть у тебя кредиты/займы (сколько, на какую сумму, кто оплачивает)", "type": "textarea", "required": False},
+            {"id": "medical_examination", "text": "При прохождении ВВК в ДДО полностью ли вы прошли обследование у врачей", "type": "radio", "options": ["Да", "Нет"], "required": True},
+            {"id": "hidden_health_facts", "text": "Есть ли факты относительно вашего здоровья (диагнозы по которым ранее вас не брали на службу), о которых вы не сказали вашему старшему", "type": "textarea", "required": False}
+        ]
+    }
+}
+
+
+class Item:
+    """Пункт психологического теста (неизменяемая запись).
+
+    num — целочисленный номер пункта в своём банке (индекс в кортеже банка),
+    id — строковый ключ ответа, tier — этап ("screening", "medium", "high", "prognoz2"),
+    position — позиция в списке шкалы (0-based).
+    """
+
+    __slots__ = ("num", "id", "text", "scale", "tier", "position")
+
+    def __init__(self, num, id, text, scale, tier, position):
+        for name, value in zip(self.__slots__, (num, id, text, scale, tier, position)):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Пункт банка вопросов неизменяем")
+
+    @property
+    def number(self):
+        """Номер пункта в списке шкалы (1-based, как в бланке методики)."""
+        return self.position + 1
+
+    def __repr__(self):
+        return f"Item({self.num}, {self.id!r}, scale={self.scale!r}, tier={self.tier!r})"
+
+
+class FormField:
+    """Поле военной анкеты (неизменяемая запись)."""
+
+    __slots__ = ("num", "id", "text", "section", "type", "options", "required", "min", "max")
+
+    def __init__(self, num, section, question):
+        values = (
+            num,
+            question["id"],
+            question["text"],
+            section,
+            question["type"],
+            tuple(question.get("options", ())),
+            question.get("required", False),
+            question.get("min"),
+            question.get("max"),
+        )
+        for name, value in zip(self.__slots__, values):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Поле анкеты неизменяемо")
+
+    def __repr__(self):
+        return f"FormField({self.num}, {self.id!r}, type={self.type!r})"
+
+
+def compile_items(tier, entries, start=0):
+    """Компиляция последовательности (шкала, id, текст) в кортеж записей Item.
+
+    Позиция считается внутри каждой шкалы, номер — сквозной начиная со start.
+    """
+    items = []
+    positions = {}
+    for num, (scale, item_id, text) in enumerate(entries, start=start):
+        position = positions.get(scale, 0)
+        positions[scale] = position + 1
+        items.append(Item(num, item_id, text, scale, tier, position))
+    return tuple(items)
+
+
+def _compile_main_bank():
+    items = []
+    for tier, bank in (("screening", SCREENING_QUESTIONS),
+                       ("medium", MEDIUM_RISK_QUESTIONS),
+                       ("high", HIGH_RISK_QUESTIONS)):
+        entries = [(scale, q["id"], q["text"]) for scale, questions in bank.items() for q in questions]
+        items.extend(compile_items(tier, entries, start=len(items)))
+    return tuple(items)
+
+
+# Скомпилированный банк психологических тестов: ITEMS[num] — пункт с номером num
+ITEMS = _compile_main_bank()
+ITEM_BY_ID = MappingProxyType({item.id: item for item in ITEMS})
+
+
+def _group_by_tier_scale(items):
+    groups = {}
+    for item in items:
+        groups.setdefault((item.tier, item.scale), []).append(item.num)
+    return MappingProxyType({key: tuple(nums) for key, nums in groups.items()})
+
+
+_TIER_SCALE_NUMS = _group_by_tier_scale(ITEMS)
+
+
+def tier_items(tier, scale):
+    """Номера пунктов этапа tier для шкалы scale (пустой кортеж, если их нет)."""
+    return _TIER_SCALE_NUMS.get((tier, scale), ())
+
+
+# Скомпилированная анкета: FORM_FIELDS[num] — поле с номером num
+FORM_FIELDS = tuple(
+    FormField(num, section, question)
+    for num, (section, question) in enumerate(
+        (section, question)
+        for section, section_data in MILITARY_QUESTIONNAIRE.items()
+        for question in section_data["questions"]
+    )
+)
+FORM_FIELD_BY_ID = MappingProxyType({field.id: field for field in FORM_FIELDS})
+
+# Поля анкеты со свободным текстом — индексируются для полнотекстового поиска (store).
+# ФИО не индексируется: оно показывается в результатах поиска, а не ищется.
+FREE_TEXT_FIELDS = tuple(
+    field.id for field in FORM_FIELDS if field.type in ("text", "textarea") and field.id != "full_name"
+)
@@ -0,0 +1,224 @@
+"""Воспроизведение журнала сессии: восстановление состояния и проверка заключений.
+
+Состояние сессии строится из событий журнала (session_log.py) теми же функциями, что
+вызывает UI: screening.answer / analyze_results / complete_detailed_assessment для
+адаптивного скрининга и prognoz2_answer для «Прогноз-2». Порядок вопросов зависит только
+от id сессии, поэтому воспроизведение детерминировано: продолжение сессии по коду
+(app.resume_session) и аудит прошлых заключений дают ровно то состояние, что было в UI.
+
+Запуск:
+    python replay.py --audit SESSION_ID        # журнал сессии и сверка с сохранённым итогом
+    python replay.py --sessions 1000000        # замер скорости воспроизведения
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime
+
+import prognoz2
+import question_bank
+import screening
+import session_log
+import store
+
+# Этапы, на которых отвечают на пункты адаптивного скрининга
+SCREENING_STAGES = screening.SCREENING_STAGES
+
+
+def new_state(session_id, questionnaire=None):
+    """Начальное состояние сессии: ключи, которые меняют события журнала."""
+    return {
+        "session_id": session_id,
+        "stage": "start",
+        "questionnaire_responses": dict(questionnaire or {}),
+        "questionnaire_completed": False,
+        "responses": {},
+        "scale_totals": {},
+        "questions_order": [],
+        "current_question_index": 0,
+        "current_scale": None,
+        "scale_scores": {},
+        "risk_levels": {},
+        "risk_levels_desc": {},
+        "medium_risk_scales": [],
+        "high_risk_scales": [],
+        "evaluated_scales": [],
+        "detailed_results": {},
+        "p2_answers": prognoz2.PROGNOZ2_EMPTY_RECORD,
+        "p2_counts": prognoz2.PROGNOZ2_EMPTY_COUNTS,
+        "p2_current_index": 0,
+        "p2_result": None,
+    }
+
+
+def apply_events(state, events):
+    """Применение событий к состоянию state (dict или st.session_state); возвращает state."""
+    clock = state.get("log_clock_ms") or session_log.session_start_ms(state["session_id"])
+    for event in events:
+        kind = event[0]
+        clock += event[1]
+        if kind == "answer":
+            number, value = event[2], event[3]
+            stage = state["stage"]
+            if stage == "p2_test":
+                expected = prognoz2.PROGNOZ2_QUESTIONS[state["p2_current_index"]].number
+                if number != expected:
+                    raise ValueError(f"Журнал: ответ на пункт {number}, а текущий — {expected}")
+                prognoz2.prognoz2_answer(state, bool(value))
+            elif stage in SCREENING_STAGES:
+                item = question_bank.ITEMS[state["questions_order"][state["current_question_index"]]]
+                if number != item.num:
+                    raise ValueError(f"Журнал: ответ на пункт {number}, а текущий — {item.num}")
+                screening.answer(state, item.id, value)
+            else:
+                raise ValueError(f"Журнал: ответ на этапе {stage!r}")
+        elif kind == "stage":
+            stage = event[2]
+            state["stage"] = stage
+            if stage == "screening":
+                state["questionnaire_completed"] = True
+                screening.prepare_screening_questions(state)
+        elif kind == "back":
+            if state["stage"] == "p2_test":
+                prognoz2.prognoz2_back(state)
+            else:
+                screening.go_back(state)
+        elif kind == "p2_start":
+            prognoz2.prognoz2_start(state, event[2], event[3])
+    state["log_clock_ms"] = clock
+    return state
+
+
+def replay(session_id, data, questionnaire=None):
+    """Состояние сессии по байтам её журнала."""
+    return apply_events(new_state(session_id, questionnaire), session_log.decode_events(data))
+
+
+def timeline(session_id, data):
+    """События журнала с абсолютным временем: [(ISO-время, вид, аргументы)]."""
+    clock = session_log.session_start_ms(session_id)
+    rows = []
+    for event in session_log.decode_events(data):
+        clock += event[1]
+        moment = datetime.fromtimestamp(clock / 1000).isoformat(timespec="milliseconds")
+        rows.append((moment, event[0], event[2:]))
+    return rows
+
+
+def _as_json(value):
+    return json.loads(json.dumps(value, ensure_ascii=False, default=str))
+
+
+def audit(session_id, db=None):
+    """Сверка сохранённых итогов сессии с воспроизведением журнала.
+
+    Возвращает список расхождений [(вид обследования, поле, сохранено, воспроизведено)];
+    пустой список — заключения воспроизводятся точно.
+    """
+    db = db or store.get_store()
+    data = db.get_session_log(session_id)
+    mismatches = []
+    for kind in ("screening", "prognoz2"):
+        record = db.get_assessment(session_id, kind)
+        if record is None:
+            continue
+        # Итог зависит и от анкеты — берётся та, что сохранена вместе с ним
+        state = replay(session_id, data, record["questionnaire"])
+        if kind == "screening":
+            replayed = {
+                "scale_scores": state["scale_scores"],
+                "risk_levels": state["risk_levels"],
+                "risk_levels_desc": state["risk_levels_desc"],
+                "detailed_results": state["detailed_results"],
+                "final_recommendations": state.get("final_recommendations"),
+            }
+            saved = {key: record["results"].get(key) for key in replayed}
+            replayed["recommendation"] = state.get("military_recommendation")
+            saved["recommendation"] = record["recommendation"]
+        else:
+            replayed = {"results": state["p2_result"], "p2_answers": state["p2_answers"].hex()}
+            saved = {"results": record["results"], "p2_answers": (record["p2_answers"] or b"").hex()}
+        for key, value in _as_json(replayed).items():
+            if value != saved[key]:
+                mismatches.append((kind, key, saved[key], value))
+    return mismatches
+
+
+# --- Замер скорости ---
+
+def simulate(session_id, rng):
+    """Журнал синтетической сессии (скрининг или «Прогноз-2») со случайными ответами."""
+    state = new_state(session_id)
+    events = []
+
+    def emit(*event):
+        events.append(event)
+        apply_events(state, [event])
+
+    if rng.random() < 0.5:
+        emit("stage", 0, "questionnaire")
+        emit("stage", rng.randint(60_000, 600_000), "screening")
+        while state["stage"] in SCREENING_STAGES:
+            if state["current_question_index"] > 0 and rng.random() < 0.03:
+                emit("back", rng.randint(500, 3000))
+                continue
+            number = state["questions_order"][state["current_question_index"]]
+            emit("answer", rng.randint(1500, 20_000), number, rng.choice((1, 2, 3, 4, 5, 5, 4)))
+    else:
+        emit("p2_start", 0, prognoz2.PROGNOZ2_DEFAULT_NORMS, "flag")
+        while state["stage"] == "p2_test":
+            if state["p2_current_index"] > 0 and rng.random() < 0.03:
+                emit("back", rng.randint(500, 3000))
+                continue
+            number = prognoz2.PROGNOZ2_QUESTIONS[state["p2_current_index"]].number
+            emit("answer", rng.randint(1500, 20_000), number, int(rng.random() < 0.4))
+    return session_log.encode_events(events)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Воспроизведение журналов сессий")
+    parser.add_argument("--audit", metavar="SESSION_ID", help="сверить итоги сессии с её журналом")
+    parser.add_argument("--sessions", type=int, default=1_000_000, help="сессий в замере")
+    parser.add_argument("--distinct", type=int, default=2000, help="различных синтетических журналов")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.audit:
+        db = store.get_store()
+        for moment, kind, event_args in timeline(args.audit, db.get_session_log(args.audit)):
+            print(f"  {moment}  {kind:<8} {' '.join(map(str, event_args))}")
+        mismatches = audit(args.audit, db)
+        for kind, key, saved, replayed in mismatches:
+            print(f"РАСХОЖДЕНИЕ [{kind}] {key}: сохранено {saved!r}, воспроизведено {replayed!r}")
+        print("Заключения воспроизводятся точно" if not mismatches else f"Расхождений: {len(mismatches)}")
+        return 1 if mismatches else 0
+
+    rng = random.Random(args.seed)
+    session_ids = [store.new_session_id() for _ in range(args.distinct)]
+    logs = [(session_id, simulate(session_id, rng)) for session_id in session_ids]
+    sizes = [len(data) for _, data in logs]
+    print(
+        f"Журналов: {len(logs)}; размер: в среднем {sum(sizes) / len(sizes):.0f} байт, "
+        f"максимум {max(sizes)} байт"
+    )
+
+    start = time.perf_counter()
+    completed = 0
+    for index in range(args.sessions):
+        session_id, data = logs[index % len(logs)]
+        state = replay(session_id, data)
+        completed += state["stage"] in ("results", "p2_results")
+    elapsed = time.perf_counter() - start
+    print(
+        f"Воспроизведено сессий: {args.sessions} за {elapsed:.1f} с "
+        f"({args.sessions / elapsed:,.0f} в секунду, {elapsed / args.sessions * 1e6:.0f} мкс на сессию); "
+        f"завершённых: {completed}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
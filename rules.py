@@ -0,0 +1,492 @@
+"""Правила критических и предупреждающих факторов: описание данными, один движок.
+
+Правила (policies/risk_rules/<версия>.json) задают условия над полями анкеты, уровнями
+риска шкал и терминами риска из keyword_flags, серьёзность (critical или warning) и
+тексты для заключения. При первом обращении набор компилируется в план: каждое условие —
+в пару функций, для одной сессии и для столбцов когорты (NumPy). Экран результатов, отчёт
+и итоговая рекомендация скрининга (screening.prepare_final_recommendations) берут факторы
+из одного вызова evaluate, а перепроверка архива после смены правил — из evaluate_cohort
+по тем же правилам, поэтому заключения везде совпадают.
+
+Заключение: есть критический фактор — «не рекомендуется», есть предупреждающий —
+«рекомендуется с ограничениями», иначе — «рекомендуется».
+
+Запуск:
+    python rules.py --archive [--out changes.csv]   # перепроверка заключений в хранилище
+    python rules.py --archive --stored-keywords     # с терминами риска, сохранёнными в итогах
+    python rules.py --bench 100000                  # замер на синтетической когорте
+"""
+
+import argparse
+import csv
+import functools
+import json
+import logging
+import os
+import random
+import re
+import sys
+import time
+
+import numpy as np
+
+import keyword_flags
+import question_bank
+from question_bank import SCALE_NAMES
+
+# Наборы правил хранятся в версионированных файлах policies/risk_rules/<версия>.json
+RISK_RULES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "policies", "risk_rules")
+RISK_RULES = os.environ.get("RISK_RULES", "military-v1")
+SEVERITIES = ("critical", "warning")
+VERDICTS = ("not_recommended", "recommended_with_restrictions", "recommended")
+SCALE_LEVELS = ("high", "medium")
+
+_TEMPLATE_FIELD = re.compile(r"\{(\w+)\}")
+_log = logging.getLogger(__name__)
+
+
+def available_rule_sets():
+    """Версии наборов правил, доступные в RISK_RULES_DIR."""
+    if not os.path.isdir(RISK_RULES_DIR):
+        return []
+    return sorted(name[: -len(".json")] for name in os.listdir(RISK_RULES_DIR) if name.endswith(".json"))
+
+
+def scale_level(description):
+    """Уровень риска шкалы по её описанию в risk_levels_desc: high, medium или None."""
+    if "высокий" in description:
+        return "high"
+    if "средний" in description:
+        return "medium"
+    return None
+
+
+def _nonempty(value):
+    return value is not None and str(value).strip() != ""
+
+
+class Evaluation:
+    """Результат правил для одной сессии.
+
+    critical и warning — формулировки факторов (critical_issues / warning_issues),
+    recommendations — строки итоговых рекомендаций, verdict — одно из VERDICTS,
+    fired — id сработавших правил.
+    """
+
+    __slots__ = ("critical", "warning", "recommendations", "verdict", "fired")
+
+    def __init__(self, critical, warning, recommendations, verdict, fired):
+        self.critical = critical
+        self.warning = warning
+        self.recommendations = recommendations
+        self.verdict = verdict
+        self.fired = fired
+
+    def __repr__(self):
+        return f"Evaluation({self.verdict!r}, fired={self.fired!r})"
+
+
+class RulePlan:
+    """Скомпилированный набор правил."""
+
+    def __init__(self, spec, version):
+        self.version = spec.get("version", version)
+        self.title = spec.get("title", version)
+        self.verdict_texts = spec["verdicts"]
+        missing = [verdict for verdict in VERDICTS if verdict not in self.verdict_texts]
+        if missing:
+            raise ValueError(f"Правила «{version}»: нет текстов заключений {', '.join(missing)}")
+        self.fields = set()  # поля анкеты, от которых зависят правила
+        self.uses_keywords = False
+        self.rules = []
+        for rule in spec["rules"]:
+            self.rules.append(self._compile_rule(rule, version))
+        ids = [rule["id"] for rule in self.rules]
+        if len(set(ids)) != len(ids):
+            raise ValueError(f"Правила «{version}»: id правил повторяются")
+
+    # --- Компиляция ---
+
+    def _compile_rule(self, rule, version):
+        where = f"Правила «{version}», правило {rule.get('id')!r}"
+        if rule.get("severity") not in SEVERITIES:
+            raise ValueError(f"{where}: неизвестная серьёзность {rule.get('severity')!r}")
+        compiled = {
+            "id": rule["id"],
+            "severity": rule["severity"],
+            "issue": rule["issue"],
+            "recommendation": rule.get("recommendation"),
+            "each_scale": bool(rule.get("each_scale")),
+            "parts": None,
+            "scale_level": None,
+            "keywords": None,
+        }
+        if "parts" in rule:
+            parts = [(part["label"],) + self._compile(part["when"], where, compiled) for part in rule["parts"]]
+            compiled["parts"] = [(label, single) for label, single, _ in parts]
+            compiled["single"] = lambda context, parts=parts: any(single(context) for _, single, _ in parts)
+            compiled["vector"] = lambda table, parts=parts: np.logical_or.reduce([vector(table) for _, _, vector in parts])
+        else:
+            compiled["single"], compiled["vector"] = self._compile(rule["when"], where, compiled)
+        if compiled["keywords"] and rule["when"] != {"keywords": compiled["keywords"]}:
+            raise ValueError(f"{where}: условие keywords не сочетается с другими")
+
+        # Переменные текстов должны быть определены условием правила
+        allowed = set()
+        if compiled["scale_level"]:
+            allowed |= {"count", "scales"} | ({"scale"} if compiled["each_scale"] else set())
+        if compiled["parts"]:
+            allowed.add("labels")
+        if compiled["keywords"]:
+            allowed.add("issue")
+        for text in (compiled["issue"], compiled["recommendation"] or ""):
+            unknown = set(_TEMPLATE_FIELD.findall(text)) - allowed
+            if unknown:
+                raise ValueError(f"{where}: в тексте неизвестные переменные {', '.join(sorted(unknown))}")
+        if compiled["each_scale"] and not compiled["scale_level"]:
+            raise ValueError(f"{where}: each_scale без условия scales")
+        return compiled
+
+    def _compile(self, condition, where, rule):
+        """Условие -> (функция контекста сессии, функция таблицы когорты)."""
+        if "all" in condition or "any" in condition:
+            combine = all if "all" in condition else any
+            reduce = np.logical_and.reduce if "all" in condition else np.logical_or.reduce
+            children = [self._compile(child, where, rule) for child in condition["all" if "all" in condition else "any"]]
+            if not children:
+                raise ValueError(f"{where}: пустой список условий")
+            return (
+                lambda context: combine(single(context) for single, _ in children),
+                lambda table: reduce([vector(table) for _, vector in children]),
+            )
+        if "not" in condition:
+            single, vector = self._compile(condition["not"], where, rule)
+            return (lambda context: not single(context)), (lambda table: ~vector(table))
+        if "field" in condition:
+            return self._compile_field(condition, where)
+        if "scales" in condition:
+            level = condition["scales"]
+            if level not in SCALE_LEVELS:
+                raise ValueError(f"{where}: неизвестный уровень шкал {level!r}")
+            minimum = int(condition.get("min", 1))
+            rule["scale_level"] = rule["scale_level"] or level
+            return (
+                lambda context: len(context["scales"][level]) >= minimum,
+                lambda table: table["scale_counts"][level] >= minimum,
+            )
+        if "keywords" in condition:
+            severity = condition["keywords"]
+            if severity not in SEVERITIES:
+                raise ValueError(f"{where}: неизвестная серьёзность терминов {severity!r}")
+            rule["keywords"] = severity
+            self.uses_keywords = True
+            return (lambda context: bool(context["keywords"][severity]), lambda table: table["keywords"][severity])
+        raise ValueError(f"{where}: неизвестное условие {condition!r}")
+
+    def _compile_field(self, condition, where):
+        field_id = condition["field"]
+        field = question_bank.FORM_FIELD_BY_ID.get(field_id)
+        if field is None:
+            raise ValueError(f"{where}: в анкете нет поля {field_id!r}")
+        self.fields.add(field_id)
+        if condition.get("nonempty"):
+            return (
+                lambda context: _nonempty(context["questionnaire"].get(field_id)),
+                lambda table: table["nonempty"][field_id],
+            )
+        values = [condition["eq"]] if "eq" in condition else list(condition.get("in", ()))
+        if not values:
+            raise ValueError(f"{where}: для поля {field_id} нужно eq, in или nonempty")
+        if field.options:
+            unknown = [value for value in values if value not in field.options]
+            if unknown:
+                raise ValueError(f"{where}: у поля {field_id} нет вариантов {unknown}")
+        accepted = frozenset(values)
+        return (
+            lambda context: context["questionnaire"].get(field_id) in accepted,
+            lambda table: np.logical_or.reduce([table["fields"][field_id] == value for value in values]),
+        )
+
+    # --- Одна сессия ---
+
+    def evaluate(self, questionnaire, risk_levels_desc, keyword_issues=None):
+        """Факторы, рекомендации и заключение для одной сессии.
+
+        keyword_issues — (critical, warning) из keyword_flags.questionnaire_issues; если не
+        переданы, а правила их используют, анкета проверяется по словарю здесь же. Если
+        словарь не загружается, заключение выносится по остальным правилам (ошибка — в журнал).
+        """
+        if keyword_issues is None:
+            keyword_issues = ([], [])
+            if self.uses_keywords:
+                try:
+                    keyword_issues = keyword_flags.questionnaire_issues(questionnaire)[:2]
+                except ValueError as e:
+                    _log.warning("Словарь терминов риска не загружен, правила по терминам не применяются: %s", e)
+        scales = {level: [] for level in SCALE_LEVELS}
+        for scale, description in risk_levels_desc.items():
+            level = scale_level(description)
+            if level:
+                scales[level].append(SCALE_NAMES.get(scale, scale))
+        context = {
+            "questionnaire": questionnaire,
+            "scales": scales,
+            "keywords": dict(zip(SEVERITIES, keyword_issues)),
+        }
+
+        issues = {severity: [] for severity in SEVERITIES}
+        lines = {severity: [] for severity in SEVERITIES}
+        fired = []
+        for rule in self.rules:
+            if not rule["single"](context):
+                continue
+            fired.append(rule["id"])
+            for values in self._template_values(rule, context):
+                issues[rule["severity"]].append(rule["issue"].format(**values))
+                if rule["recommendation"] and not rule["each_scale"]:
+                    lines[rule["severity"]].append(rule["recommendation"].format(**values))
+            if rule["recommendation"] and rule["each_scale"]:
+                for name in context["scales"][rule["scale_level"]]:
+                    lines[rule["severity"]].append(rule["recommendation"].format(scale=name))
+
+        verdict = _verdict(bool(issues["critical"]), bool(issues["warning"]))
+        # В рекомендациях — факторы, которые определили заключение
+        recommendations = lines["critical"] if issues["critical"] else lines["warning"]
+        recommendations = recommendations + [self.verdict_texts[verdict]]
+        return Evaluation(issues["critical"], issues["warning"], recommendations, verdict, fired)
+
+    @staticmethod
+    def _template_values(rule, context):
+        if rule["keywords"]:
+            return [{"issue": issue} for issue in context["keywords"][rule["keywords"]]]
+        values = {}
+        if rule["scale_level"]:
+            names = context["scales"][rule["scale_level"]]
+            values.update(count=len(names), scales=", ".join(names))
+        if rule["parts"]:
+            values["labels"] = ", ".join(label for label, single in rule["parts"] if single(context))
+        return [values]
+
+    # --- Когорта ---
+
+    def cohort_table(self, records, stored_keywords=False):
+        """Столбцы когорты для evaluate_cohort из записей обследований (store.iter_assessments).
+
+        Анкеты проверяются по текущему словарю терминов риска, чтобы перепроверка учитывала
+        и его смену. stored_keywords=True — брать термины из results["keyword_flags"],
+        сохранённых с итогом (у записей без них анкета всё равно проверяется по словарю).
+        """
+        ids = []
+        columns = {field_id: [] for field_id in self.fields}
+        counts = {level: [] for level in SCALE_LEVELS}
+        keywords = {severity: [] for severity in SEVERITIES}
+        for record in records:
+            ids.append(record["session_id"])
+            questionnaire = record.get("questionnaire") or {}
+            results = record.get("results") or {}
+            for field_id, column in columns.items():
+                column.append(questionnaire.get(field_id))
+            levels = [scale_level(description) for description in (results.get("risk_levels_desc") or {}).values()]
+            for level in SCALE_LEVELS:
+                counts[level].append(levels.count(level))
+            if self.uses_keywords:
+                flags = results.get("keyword_flags") if stored_keywords else None
+                if flags is None:
+                    found = keyword_flags.questionnaire_issues(questionnaire)[:2]
+                    severities = {severity for severity, issues in zip(SEVERITIES, found) if issues}
+                else:
+                    severities = {flag["severity"] for flag in flags}
+                for severity in SEVERITIES:
+                    keywords[severity].append(severity in severities)
+        size = len(ids)
+        fields = {}
+        for field_id, values in columns.items():
+            column = np.empty(size, dtype=object)
+            column[:] = values
+            fields[field_id] = column
+        return {
+            "session_id": np.array(ids, dtype=object),
+            "size": size,
+            "fields": fields,
+            "nonempty": {
+                field_id: np.fromiter((_nonempty(value) for value in column), dtype=bool, count=size)
+                for field_id, column in fields.items()
+            },
+            "scale_counts": {level: np.array(values, dtype=np.int16) for level, values in counts.items()},
+            "keywords": {severity: np.array(values, dtype=bool) for severity, values in keywords.items()},
+        }
+
+    def evaluate_cohort(self, table):
+        """Правила по всей когорте: {"rules": {id: маска}, "critical", "warning", "verdict"}.
+
+        verdict — массив индексов в VERDICTS.
+        """
+        size = table["size"]
+        masks = {rule["id"]: np.asarray(rule["vector"](table), dtype=bool) for rule in self.rules}
+        critical = np.zeros(size, dtype=bool)
+        warning = np.zeros(size, dtype=bool)
+        for rule in self.rules:
+            if rule["severity"] == "critical":
+                critical |= masks[rule["id"]]
+            else:
+                warning |= masks[rule["id"]]
+        verdict = np.where(critical, 0, np.where(warning, 1, 2)).astype(np.int8)
+        return {"rules": masks, "critical": critical, "warning": warning, "verdict": verdict}
+
+
+def _verdict(critical, warning):
+    if critical:
+        return "not_recommended"
+    if warning:
+        return "recommended_with_restrictions"
+    return "recommended"
+
+
+@functools.lru_cache(maxsize=None)
+def _load_plan(version):
+    path = os.path.join(RISK_RULES_DIR, f"{version}.json")
+    if not os.path.isfile(path):
+        raise ValueError(f"Правила «{version}» не найдены. Доступны: {available_rule_sets()}")
+    with open(path, encoding="utf-8") as rules_file:
+        spec = json.load(rules_file)
+    return RulePlan(spec, version)
+
+
+def get_plan(version=None):
+    """Скомпилированный набор правил (кэшируется на процесс по версии)."""
+    return _load_plan(version or RISK_RULES)
+
+
+def evaluate(questionnaire, risk_levels_desc, keyword_issues=None, version=None):
+    """Факторы, рекомендации и заключение для одной сессии (см. RulePlan.evaluate)."""
+    return get_plan(version).evaluate(questionnaire, risk_levels_desc, keyword_issues)
+
+
+# --- Перепроверка архива и замер скорости ---
+
+def recheck_archive(db, out=None, version=None, stored_keywords=False):
+    """Заключения всех итогов скрининга по текущим правилам; изменившиеся пишутся в out (CSV).
+
+    stored_keywords — как в RulePlan.cohort_table.
+    """
+    plan = get_plan(version)
+    start = time.perf_counter()
+    records = list(db.iter_assessments(kind="screening"))
+    loaded = time.perf_counter() - start
+    start = time.perf_counter()
+    table = plan.cohort_table(records, stored_keywords)
+    result = plan.evaluate_cohort(table)
+    evaluated = time.perf_counter() - start
+
+    stored = np.array([record.get("recommendation") for record in records], dtype=object)
+    verdicts = np.array(VERDICTS, dtype=object)[result["verdict"]]
+    changed = np.flatnonzero(stored != verdicts)
+    if out is not None:
+        writer = csv.writer(out)
+        writer.writerow(("session_id", "stored", "verdict", "rules"))
+        for index in changed:
+            fired = [rule_id for rule_id, mask in result["rules"].items() if mask[index]]
+            writer.writerow((table["session_id"][index], stored[index], verdicts[index], " ".join(fired)))
+    return {
+        "records": table["size"],
+        "changed": len(changed),
+        "by_verdict": {verdict: int(np.sum(result["verdict"] == code)) for code, verdict in enumerate(VERDICTS)},
+        "load_seconds": loaded,
+        "evaluate_seconds": evaluated,
+    }
+
+
+def _synthetic_records(count, seed):
+    rng = random.Random(seed)
+    scales = [scale for scale in SCALE_NAMES if scale != "sincerity"]
+    descriptions = ("низкий уровень риска", "средний уровень риска (подтверждено углубленной оценкой)",
+                    "высокий уровень риска (подтверждено углубленной оценкой)")
+    attendance = question_bank.FORM_FIELD_BY_ID["religious_attendance"].options
+    for index in range(count):
+        yes = lambda share: "Да" if rng.random() < share else "Нет"
+        questionnaire = {
+            "family_suicides": yes(0.02), "personal_suicides": yes(0.02), "want_serve": yes(0.95),
+            "family_alcoholism": yes(0.1), "personal_alcoholism": yes(0.03), "family_drugs": yes(0.03),
+            "personal_drugs": yes(0.02), "personal_gambling": yes(0.05), "betting": yes(0.1),
+            "credits": rng.choice(("", "", "", "нет", "кредит за телефон")),
+            "hidden_health_facts": rng.choice(("", "", "", "", "астма")),
+            "religion_teachers": rng.choice(("",) * 9 + ("проповеди в интернете",)),
+            "religious_attendance": rng.choice(attendance), "social_events": yes(0.8),
+        }
+        risk_levels_desc = {scale: rng.choices(descriptions, (0.85, 0.12, 0.03))[0] for scale in scales}
+        yield {
+            "session_id": f"S{index:08d}",
+            "questionnaire": questionnaire,
+            "results": {"risk_levels_desc": risk_levels_desc, "keyword_flags": []},
+        }
+
+
+def bench(count, check=5000, seed=1):
+    plan = get_plan()
+    records = list(_synthetic_records(count, seed))
+    start = time.perf_counter()
+    # Сравнение с evaluate без терминов: берутся сохранённые (пустые) keyword_flags
+    table = plan.cohort_table(records, stored_keywords=True)
+    built = time.perf_counter() - start
+    start = time.perf_counter()
+    result = plan.evaluate_cohort(table)
+    vectorized = time.perf_counter() - start
+
+    sample = records[:check]
+    start = time.perf_counter()
+    single = [
+        plan.evaluate(record["questionnaire"], record["results"]["risk_levels_desc"], ([], []))
+        for record in sample
+    ]
+    looped = time.perf_counter() - start
+    mismatches = sum(
+        VERDICTS[result["verdict"][index]] != evaluation.verdict
+        or [rule["id"] for rule in plan.rules if result["rules"][rule["id"]][index]] != evaluation.fired
+        for index, evaluation in enumerate(single)
+    )
+    print(f"Когорта: {count}; таблица {built:.2f} с, правила по когорте {vectorized * 1000:.1f} мс")
+    print(
+        f"По одной сессии: {looped / len(sample) * 1e6:.0f} мкс на сессию "
+        f"(≈{looped / len(sample) * count:.1f} с на когорту); расхождений на {len(sample)}: {mismatches}"
+    )
+    print("Заключения: " + ", ".join(
+        f"{verdict} {int(np.sum(result['verdict'] == code))}" for code, verdict in enumerate(VERDICTS)
+    ))
+    return 1 if mismatches else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Правила критических и предупреждающих факторов")
+    parser.add_argument("--archive", action="store_true", help="перепроверить заключения в хранилище")
+    parser.add_argument("--out", help="файл CSV для изменившихся заключений")
+    parser.add_argument("--rules", default=None, help="версия набора правил")
+    parser.add_argument("--stored-keywords", action="store_true",
+                        help="термины риска из сохранённых итогов, а не по текущему словарю")
+    parser.add_argument("--bench", type=int, metavar="N", help="замер на синтетической когорте из N сессий")
+    args = parser.parse_args()
+
+    if args.bench:
+        return bench(args.bench)
+    if not args.archive:
+        parser.print_help()
+        return 2
+
+    import store
+
+    out = open(args.out, "w", encoding="utf-8", newline="") if args.out else None
+    try:
+        summary = recheck_archive(store.get_store(), out, args.rules, args.stored_keywords)
+    finally:
+        if out is not None:
+            out.close()
+    print(
+        f"Итогов: {summary['records']} (загрузка {summary['load_seconds']:.1f} с, "
+        f"правила {summary['evaluate_seconds']:.2f} с); заключение изменилось у {summary['changed']}"
+    )
+    for verdict, count in summary["by_verdict"].items():
+        print(f"  {verdict}: {count}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
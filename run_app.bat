@@ -8,5 +8,5 @@ echo.
 echo Активация виртуального окружения...
 call venv\Scripts\activate.bat
 echo Запуск приложения...
-streamlit run streamlit-app.py
+streamlit run app.py
 pause 
\ No newline at end of file
@@ -3,4 +3,4 @@
 echo "Активация виртуального окружения..."
 source venv/bin/activate
 echo "Запуск приложения..."
-streamlit run streamlit-app.py 
\ No newline at end of file
+streamlit run app.py 
\ No newline at end of file
@@ -0,0 +1,255 @@
+"""Адаптивный скрининг: переходы между этапами и подсчёт результатов без Streamlit.
+
+Функции работают с состоянием сессии как с отображением (dict или st.session_state) по тем
+же ключам, что и app.py: stage, questions_order, current_question_index, scale_totals,
+risk_levels_desc и т.д. UI вызывает их из обработчиков кликов, журнал сессии (replay.py)
+— при воспроизведении событий, поэтому оба пути приходят к одному и тому же состоянию.
+
+Порядок вопросов перемешивается генератором, зависящим только от id сессии, этапа и шкалы:
+у каждого кандидата он свой, но при воспроизведении журнала получается тот же.
+"""
+
+import random
+
+import question_bank
+import rules
+from question_bank import SCREENING_QUESTIONS
+
+# Этапы, на которых отвечают на пункты адаптивного скрининга
+SCREENING_STAGES = ("screening", "medium_risk_assessment", "high_risk_assessment")
+
+def _shuffled(state, tier, scale, numbers):
+    numbers = list(numbers)
+    random.Random(f"{state['session_id']}/{tier}/{scale}").shuffle(numbers)
+    return numbers
+
+
+def prepare_screening_questions(state):
+    """Порядок вопросов первичного скрининга (перестановка номеров пунктов)."""
+    questions = []
+    for scale in SCREENING_QUESTIONS:
+        questions.extend(question_bank.tier_items("screening", scale))
+    state['questions_order'] = _shuffled(state, "screening", "", questions)
+    state['current_question_index'] = 0
+
+
+def prepare_detailed_questions(state, scale, risk_level):
+    """Порядок дополнительных вопросов углублённой оценки шкалы."""
+    # Дополнительные вопросы для среднего риска или полный опросник для высокого
+    questions = question_bank.tier_items(risk_level, scale)
+    # Если нет специальных вопросов, используем вопросы среднего риска
+    if not questions:
+        questions = question_bank.tier_items("medium", scale)
+    state['questions_order'] = _shuffled(state, risk_level, scale, questions)
+    state['current_question_index'] = 0
+
+
+def record_response(state, question_id, value):
+    """Ответ на пункт и обновление накопителей шкалы (балл, число ответов, положительные)."""
+    previous = state['responses'].get(question_id)
+    state['responses'][question_id] = value
+
+    item = question_bank.ITEM_BY_ID.get(question_id)
+    if item is None:
+        return
+    totals = state['scale_totals'].setdefault(item.tier, {}).setdefault(
+        item.scale, {'score': 0, 'count': 0, 'positive': 0}
+    )
+    # При повторном ответе (возврат к вопросу) сначала убираем вклад прежнего значения
+    if previous is not None:
+        totals['score'] -= previous
+        totals['count'] -= 1
+        # Считаем ответ положительным, если значение 4 или 5
+        if previous >= 4:
+            totals['positive'] -= 1
+    totals['score'] += value
+    totals['count'] += 1
+    if value >= 4:
+        totals['positive'] += 1
+
+
+def answer(state, question_id, value):
+    """Ответ на текущий вопрос и переход к следующему или к следующему этапу.
+
+    Возвращает True, если обследование завершено и итог готов к сохранению.
+    """
+    record_response(state, question_id, value)
+    if state['current_question_index'] < len(state['questions_order']) - 1:
+        state['current_question_index'] += 1
+        return False
+    # Завершение текущего этапа
+    stage = state['stage']
+    if stage == 'screening':
+        state['stage'] = 'results'
+        return analyze_results(state)
+    if stage == 'medium_risk_assessment':
+        return complete_detailed_assessment(state, 'medium')
+    if stage == 'high_risk_assessment':
+        return complete_detailed_assessment(state, 'high')
+    return False
+
+
+def go_back(state):
+    """Возврат к предыдущему вопросу текущего этапа."""
+    if state['current_question_index'] > 0:
+        state['current_question_index'] -= 1
+
+
+def analyze_results(state):
+    """Уровни риска по итогам скрининга и выбор следующего этапа; True — обследование завершено."""
+    scores = {}
+    positive_answers = {}  # Счетчик положительных ответов для каждой шкалы
+
+    # Баллы и число положительных ответов берутся из накопителей, обновляемых в record_response
+    screening_totals = state['scale_totals'].get('screening', {})
+    for scale in SCREENING_QUESTIONS.keys():
+        totals = screening_totals.get(scale)
+        if totals and totals['count'] > 0:
+            scores[scale] = totals['score']
+            positive_answers[scale] = totals['positive']
+
+    state['scale_scores'] = scores
+
+    risk_levels = {}
+    risk_levels_desc = {}
+    medium_risk_scales = []
+    high_risk_scales = []
+
+    for scale, score in scores.items():
+        if scale == 'sincerity':
+            # Специальная логика для шкалы искренности
+            if score >= 13 or score <= 4:
+                risk_levels[scale] = "warning"
+                risk_levels_desc[scale] = "низкая искренность ответов"
+        else:
+            # Если 2 или более положительных ответа в скрининге
+            if positive_answers.get(scale, 0) >= 2:
+                risk_levels[scale] = "medium"
+                risk_levels_desc[scale] = "средний уровень риска (требуется дополнительная оценка)"
+                medium_risk_scales.append(scale)
+            else:
+                risk_levels[scale] = "low"
+                risk_levels_desc[scale] = "низкий уровень риска"
+
+    state['risk_levels'] = risk_levels
+    state['risk_levels_desc'] = risk_levels_desc
+    state['medium_risk_scales'] = medium_risk_scales
+    state['high_risk_scales'] = high_risk_scales
+
+    if medium_risk_scales:
+        # Есть шкалы со средним риском - дополнительные вопросы
+        state['stage'] = 'medium_risk_assessment'
+        state['current_scale'] = medium_risk_scales[0]
+        prepare_detailed_questions(state, medium_risk_scales[0], "medium")
+        return False
+    # Все шкалы в норме - переход к результатам
+    state['stage'] = 'results'
+    prepare_final_recommendations(state)
+    return True
+
+
+def complete_detailed_assessment(state, risk_level):
+    """Завершение углублённой оценки текущей шкалы; True — обследование завершено."""
+    current_scale = state['current_scale']
+
+    # Результаты углубленной оценки из накопителей этапа
+    totals = state['scale_totals'].get(risk_level, {}).get(current_scale, {})
+    detailed_score = totals.get('score', 0)
+    question_count = totals.get('count', 0)
+    positive_count = totals.get('positive', 0)
+
+    if question_count > 0:
+        max_possible = question_count * 5  # Максимальный балл (5 баллов за вопрос)
+        percentage = (detailed_score / max_possible) * 100
+
+        state['detailed_results'][current_scale] = {
+            'score': detailed_score,
+            'max_possible': max_possible,
+            'percentage': percentage,
+            'positive_count': positive_count,
+            'total_questions': question_count
+        }
+
+        # Обновление уровня риска на основе углубленной оценки
+        if risk_level == "medium":
+            # Если более 50% ответов положительные, переходим к высокой оценке риска
+            if positive_count > question_count / 2:
+                state['risk_levels_desc'][current_scale] = "высокий уровень риска (подтверждено углубленной оценкой)"
+                state['high_risk_scales'].append(current_scale)
+                state['stage'] = 'high_risk_assessment'
+                prepare_detailed_questions(state, current_scale, "high")
+                return False
+            state['risk_levels_desc'][current_scale] = "средний уровень риска (подтверждено углубленной оценкой)"
+        elif risk_level == "high":
+            if percentage >= 70:
+                state['risk_levels_desc'][current_scale] = "высокий уровень риска (подтверждено углубленной оценкой)"
+            else:
+                state['risk_levels_desc'][current_scale] = "средний уровень риска (скорректировано после углубленной оценки)"
+
+    # Отмечаем шкалу как оцененную
+    if 'evaluated_scales' in state:
+        state['evaluated_scales'].append(current_scale)
+    else:
+        state['evaluated_scales'] = [current_scale]
+
+    if risk_level == "high":
+        remaining_high_risk = [s for s in state['high_risk_scales'] if s != current_scale]
+        state['high_risk_scales'] = remaining_high_risk
+        if remaining_high_risk:
+            state['current_scale'] = remaining_high_risk[0]
+            prepare_detailed_questions(state, remaining_high_risk[0], "high")
+            return False
+        state['stage'] = 'results'
+        prepare_final_recommendations(state)
+        return True
+
+    remaining_medium_risk = [s for s in state['medium_risk_scales'] if s != current_scale]
+    remaining_medium_risk = [s for s in remaining_medium_risk if s not in state['evaluated_scales']]
+    state['medium_risk_scales'] = remaining_medium_risk
+    if remaining_medium_risk:
+        state['current_scale'] = remaining_medium_risk[0]
+        prepare_detailed_questions(state, remaining_medium_risk[0], "medium")
+        return False
+    if state['high_risk_scales']:
+        state['stage'] = 'high_risk_assessment'
+        state['current_scale'] = state['high_risk_scales'][0]
+        prepare_detailed_questions(state, state['high_risk_scales'][0], "high")
+        return False
+    state['stage'] = 'results'
+    prepare_final_recommendations(state)
+    return True
+
+
+def prepare_final_recommendations(state):
+    """Итоговые рекомендации и заключение о годности (military_recommendation) по правилам rules.py."""
+    evaluation = rules.evaluate(state['questionnaire_responses'], state['risk_levels_desc'])
+    state['military_recommendation'] = evaluation.verdict
+    state['final_recommendations'] = evaluation.recommendations
+
+
+def overall_risk_level(risk_levels_desc):
+    """Итоговый уровень риска обследования для хранилища: high, medium или low."""
+    levels = risk_levels_desc.values()
+    if any("высокий" in level for level in levels):
+        return "high"
+    if any("средний" in level for level in levels):
+        return "medium"
+    return "low"
+
+
+def run_responses(state, responses):
+    """Прохождение скрининга по готовым ответам {id пункта: значение} (пакетный пересчёт).
+
+    Ответы берутся в порядке вопросов сессии, так что этапы ветвятся так же, как в UI.
+    Возвращает True, если ответов хватило до итога, и False, если обследование не завершено.
+    """
+    state['stage'] = 'screening'
+    prepare_screening_questions(state)
+    while state['stage'] in SCREENING_STAGES:
+        item = question_bank.ITEMS[state['questions_order'][state['current_question_index']]]
+        value = responses.get(item.id)
+        if value is None:
+            return False
+        if answer(state, item.id, value):
+            return True
+    return state['stage'] == 'results'
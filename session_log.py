@@ -0,0 +1,157 @@
+"""Журнал сессии: компактная последовательность событий вместо снимков состояния.
+
+Каждое действие кандидата, меняющее ход обследования, дописывается в конец журнала сессии
+(таблица session_log, через очередь отложенной записи store). Состояние — этап, порядок и
+номер вопроса, баллы, уровни риска, итог «Прогноз-2» — из журнала не читается, а
+выводится его воспроизведением (replay.py) той же логикой, что работает в UI.
+
+События (kind, dt, *args), где dt — мс от предыдущего события (для первого — от начала
+сессии по её ULID):
+    ("stage", dt, этап)                 — переход, выбранный в UI (начало анкеты, скрининга…)
+    ("answer", dt, номер пункта, ответ) — ответ на текущий пункт (1..5 или 0/1 для «Прогноз-2»)
+    ("back", dt)                        — возврат к предыдущему пункту
+    ("p2_start", dt, нормы, политика)   — начало или повтор теста «Прогноз-2»
+
+Кодировка: байт «вид << 4 | малое значение» и целые LEB128. Ответ занимает 3–5 байт,
+поэтому весь журнал обследования — несколько сотен байт.
+"""
+
+import time
+
+import store
+
+# Этапы обследования (номер этапа хранится в младших битах байта события)
+STAGES = (
+    "start", "questionnaire", "screening", "sincerity_warning", "medium_risk_assessment",
+    "high_risk_assessment", "results", "p2_test", "p2_results", "p2_invalid",
+)
+_STAGE_CODES = {stage: code for code, stage in enumerate(STAGES)}
+
+_STAGE = 1
+_ANSWER = 2
+_BACK = 3
+_P2_START = 4
+
+
+def _put_varint(buffer, value):
+    while value > 0x7F:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _get_varint(data, pos):
+    value = 0
+    shift = 0
+    while True:
+        if pos >= len(data):
+            raise ValueError("Журнал сессии обрывается посреди события")
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def _put_text(buffer, text):
+    raw = text.encode("utf-8")
+    _put_varint(buffer, len(raw))
+    buffer.extend(raw)
+
+
+def _get_text(data, pos):
+    length, pos = _get_varint(data, pos)
+    if pos + length > len(data):
+        raise ValueError("Журнал сессии обрывается посреди события")
+    return data[pos:pos + length].decode("utf-8"), pos + length
+
+
+def encode_event(kind, dt, *args):
+    """Байты одного события."""
+    buffer = bytearray()
+    if kind == "stage":
+        if args[0] not in _STAGE_CODES:
+            raise ValueError(f"Неизвестный этап {args[0]!r}")
+        buffer.append(_STAGE << 4 | _STAGE_CODES[args[0]])
+    elif kind == "answer":
+        number, value = args
+        if not 0 <= value <= 15:
+            raise ValueError(f"Ответ {value!r} вне диапазона 0..15")
+        buffer.append(_ANSWER << 4 | value)
+        _put_varint(buffer, number)
+    elif kind == "back":
+        buffer.append(_BACK << 4)
+    elif kind == "p2_start":
+        buffer.append(_P2_START << 4)
+        _put_text(buffer, args[0])
+        _put_text(buffer, args[1])
+    else:
+        raise ValueError(f"Неизвестное событие журнала {kind!r}")
+    _put_varint(buffer, max(int(dt), 0))
+    return bytes(buffer)
+
+
+def encode_events(events):
+    """Байты последовательности событий (kind, dt, *args)."""
+    return b"".join(encode_event(*event) for event in events)
+
+
+def decode_events(data):
+    """События журнала в порядке записи."""
+    events = []
+    pos = 0
+    while pos < len(data):
+        head = data[pos]
+        pos += 1
+        kind, low = head >> 4, head & 0x0F
+        if kind == _ANSWER:
+            number = data[pos] if pos < len(data) else 0x80
+            if number < 0x80:
+                pos += 1
+            else:
+                number, pos = _get_varint(data, pos)
+            args = (number, low)
+            name = "answer"
+        elif kind == _STAGE:
+            if low >= len(STAGES):
+                raise ValueError(f"Неизвестный код этапа {low} в журнале сессии")
+            args = (STAGES[low],)
+            name = "stage"
+        elif kind == _BACK:
+            args = ()
+            name = "back"
+        elif kind == _P2_START:
+            norms_version, pos = _get_text(data, pos)
+            policy, pos = _get_text(data, pos)
+            args = (norms_version, policy)
+            name = "p2_start"
+        else:
+            raise ValueError(f"Неизвестный вид события {kind} в журнале сессии")
+        # Однобайтовые числа (частый случай) читаются без вызова _get_varint
+        dt = data[pos] if pos < len(data) else 0x80
+        if dt < 0x80:
+            pos += 1
+        else:
+            dt, pos = _get_varint(data, pos)
+        events.append((name, dt) + args)
+    return events
+
+
+def session_start_ms(session_id):
+    """Начало сессии, мс Unix (из ULID)."""
+    return int(store.session_id_time(session_id) * 1000)
+
+
+def append(state, kind, *args):
+    """Дописать событие в журнал сессии state (dict или st.session_state).
+
+    Первое событие выдаёт сессии код продолжения (state["resume_code"]).
+    """
+    now = int(time.time() * 1000)
+    last = state.get("log_clock_ms") or session_start_ms(state["session_id"])
+    data = encode_event(kind, now - last, *args)
+    state["log_clock_ms"] = now
+    if not state.get("resume_code"):
+        state["resume_code"] = store.get_store().create_resume_code(state["session_id"])
+    return store.get_writer().put_event(state["session_id"], data)
@@ -21,6 +21,6 @@ echo Настройка завершена! Чтобы запустить при
 echo   cmd.exe
 echo   cd %cd%
 echo   venv\Scripts\activate.bat
-echo   streamlit run streamlit-app.py
+echo   streamlit run app.py
 echo.
 pause 
\ No newline at end of file
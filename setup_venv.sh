@@ -15,5 +15,5 @@ fi
 echo ""
 echo "Настройка завершена! Чтобы запустить приложение, выполните:"
 echo "  source venv/bin/activate"
-echo "  streamlit run streamlit-app.py"
+echo "  streamlit run app.py"
 echo "" 
\ No newline at end of file
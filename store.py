@@ -0,0 +1,912 @@
+"""Постоянное хранилище обследований на SQLite.
+
+Результаты живут в st.session_state только до закрытия вкладки, поэтому итог каждого
+обследования (анкета, ответы на пункты, баллы шкал, уровни риска, углублённая оценка,
+результат «Прогноз-2») записывается в локальную базу. База работает в режиме WAL:
+чтение отчётов не блокирует запись, а запись не ждёт читателей. Запросы параметризованы
+и одни и те же, поэтому sqlite3 держит их подготовленными в кэше соединения. Выборки по
+дате, подразделению и уровню риска идут по индексам и рассчитаны на сотни тысяч
+обследований в год.
+
+Ответы по ходу обследования пишутся не синхронно из обработчика клика, а через очередь
+отложенной записи (WriteBehindQueue): фоновый поток собирает записи всех сессий и
+фиксирует их групповыми транзакциями раз в STORE_BATCH_MS мс или по STORE_BATCH_SIZE
+записей. Клик только ставит запись в очередь; итог обследования дожидается фиксации
+(flush) и сообщает кандидату, если запись его сессии не сохранилась или не успела
+зафиксироваться, поэтому подтверждённые результаты не теряются. Очередь ограничена: при
+переполнении запись ждёт места (обратное давление), при завершении процесса остаток
+сбрасывается на диск.
+
+Идентификаторы сессий — ULID: 26 символов, сортируются по времени создания и не
+совпадают у кандидатов, начавших в одну и ту же миллисекунду.
+
+Свободные ответы анкеты (question_bank.FREE_TEXT_FIELDS) попадают в полнотекстовый индекс
+FTS5 в той же транзакции, что и сами ответы; поиск (search_questionnaire) ранжирует
+совпадения по BM25 и возвращает фрагменты с подсветкой.
+
+Ход каждой сессии записывается журналом событий (session_log.py): событие дописывается в
+конец BLOB в session_log через ту же очередь. По короткому коду продолжения (resume_codes)
+сессия восстанавливается воспроизведением журнала на любом терминале после перезапуска
+сервера или обрыва связи.
+"""
+
+import atexit
+import collections
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import date, timedelta
+
+import question_bank
+import textnorm
+
+ASSESSMENT_DB = os.environ.get(
+    "ASSESSMENT_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "assessments.db")
+)
+ASSESSMENT_UNIT = os.environ.get("ASSESSMENT_UNIT", "")  # подразделение (пункт отбора) станции
+
+STORE_BATCH_MS = int(os.environ.get("STORE_BATCH_MS", "50"))  # окно групповой фиксации, мс
+STORE_BATCH_SIZE = int(os.environ.get("STORE_BATCH_SIZE", "500"))  # записей в транзакции, не больше
+STORE_QUEUE_SIZE = int(os.environ.get("STORE_QUEUE_SIZE", "10000"))  # записей в очереди, не больше
+STORE_PUT_TIMEOUT = float(os.environ.get("STORE_PUT_TIMEOUT", "5"))  # ожидание места в очереди, с
+# Поиск ранжирует по BM25 не больше стольких самых свежих совпадений (частые слова находят сотни тысяч)
+SEARCH_RANK_WINDOW = int(os.environ.get("SEARCH_RANK_WINDOW", "5000"))
+
+# Уровни итогового риска обследования (колонка risk_level)
+RISK_LEVELS = ("low", "medium", "high")
+
+# --- ULID ---
+_CROCKFORD = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_ulid_lock = threading.Lock()
+_ulid_last = (0, 0)  # (мс, случайная часть) последнего выданного идентификатора
+
+
+def _encode_base32(value, length):
+    chars = []
+    for _ in range(length):
+        chars.append(_CROCKFORD[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+def new_session_id():
+    """Новый ULID: 48 бит времени в мс и 80 случайных бит в кодировке Crockford base32.
+
+    В пределах одной миллисекунды случайная часть увеличивается на единицу, поэтому
+    идентификаторы одного процесса строго возрастают.
+    """
+    global _ulid_last
+    with _ulid_lock:
+        millis = int(time.time() * 1000)
+        last_millis, last_random = _ulid_last
+        if millis <= last_millis:
+            millis, randomness = last_millis, last_random + 1
+        else:
+            randomness = int.from_bytes(os.urandom(10), "big")
+        _ulid_last = (millis, randomness)
+    return _encode_base32(millis, 10) + _encode_base32(randomness & ((1 << 80) - 1), 16)
+
+
+RESUME_CODE_LENGTH = 8  # 40 случайных бит
+
+
+def new_resume_code():
+    """Случайный код продолжения сессии в кодировке Crockford base32."""
+    return _encode_base32(int.from_bytes(os.urandom(5), "big"), RESUME_CODE_LENGTH)
+
+
+def format_resume_code(code):
+    """Код для показа кандидату: ABCD-EFGH."""
+    half = RESUME_CODE_LENGTH // 2
+    return f"{code[:half]}-{code[half:]}"
+
+
+def normalize_resume_code(text):
+    """Код из ввода: без дефисов и пробелов, в верхнем регистре, I/L -> 1, O -> 0 (по Crockford)."""
+    code = "".join(text.split()).replace("-", "").upper()
+    code = code.replace("I", "1").replace("L", "1").replace("O", "0")
+    if len(code) != RESUME_CODE_LENGTH or any(char not in _CROCKFORD for char in code):
+        raise ValueError(f"Код продолжения должен состоять из {RESUME_CODE_LENGTH} букв и цифр, например ABCD-1234")
+    return code
+
+
+def session_id_time(session_id):
+    """Время создания сессии (секунды Unix) по её ULID."""
+    millis = 0
+    for char in session_id[:10]:
+        millis = millis * 32 + _CROCKFORD.index(char)
+    return millis / 1000
+
+
+# --- Схема ---
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS assessments (
+    session_id     TEXT NOT NULL,
+    kind           TEXT NOT NULL,          -- screening | prognoz2
+    started_at     TEXT NOT NULL,          -- ISO 8601, местное время
+    completed_at   TEXT NOT NULL,
+    unit           TEXT NOT NULL DEFAULT '',
+    risk_level     TEXT,                   -- low | medium | high
+    recommendation TEXT,
+    full_name      TEXT,
+    questionnaire  TEXT,                   -- JSON
+    results        TEXT NOT NULL,          -- JSON: баллы, уровни риска, углублённая оценка
+    p2_answers     BLOB,                   -- упакованная запись «Прогноз-2» (22 байта)
+    seq            INTEGER,                -- номер записи итога: растёт при каждой записи и перезаписи
+    PRIMARY KEY (session_id, kind)
+);
+CREATE INDEX IF NOT EXISTS assessments_completed ON assessments (completed_at);
+CREATE INDEX IF NOT EXISTS assessments_unit ON assessments (unit, completed_at);
+CREATE INDEX IF NOT EXISTS assessments_risk ON assessments (risk_level, completed_at);
+
+CREATE TABLE IF NOT EXISTS responses (
+    session_id TEXT NOT NULL,
+    item_id    TEXT NOT NULL,
+    value      INTEGER NOT NULL,
+    PRIMARY KEY (session_id, item_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS questionnaire_answers (
+    session_id TEXT NOT NULL,
+    field_id   TEXT NOT NULL,
+    value      TEXT,                       -- JSON
+    PRIMARY KEY (session_id, field_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS session_log (
+    session_id TEXT PRIMARY KEY,
+    events     BLOB NOT NULL               -- события session_log.encode_event подряд
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS resume_codes (
+    code       TEXT PRIMARY KEY,           -- 8 символов Crockford base32
+    session_id TEXT NOT NULL UNIQUE
+) WITHOUT ROWID;
+"""
+
+# Полнотекстовый индекс: строка FTS5 с rowid = doc_id документа (сессия, поле)
+_SEARCH_SCHEMA = """
+CREATE TABLE IF NOT EXISTS questionnaire_docs (
+    doc_id     INTEGER PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    field_id   TEXT NOT NULL,
+    UNIQUE (session_id, field_id)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS questionnaire_fts USING fts5(
+    value,                                 -- текст ответа, «ё» заменена на «е»
+    field_id,                              -- id поля: фильтр по полям — часть выражения MATCH
+    original UNINDEXED,                    -- текст ответа как есть: из него строится фрагмент
+    tokenize = "unicode61 remove_diacritics 2 tokenchars '_'",
+    prefix = '2 3 4'
+);
+"""
+
+SEARCH_SNIPPET_TOKENS = 16  # слов во фрагменте результата поиска
+_MARK, _CUT = "\x02", "\x01"  # границы совпадения и обрезки во фрагменте FTS5 (в тексте их нет)
+
+
+def _restore_snippet(snippet, original):
+    """Фрагмент FTS5 (по тексту с «ё» -> «е») в написании кандидата, совпадения — **…**.
+
+    fold_yo сохраняет длину текста, поэтому фрагмент находится в свёрнутом тексте и
+    символы берутся из исходного с той же позиции.
+    """
+    body = snippet.strip(_CUT)
+    start = textnorm.fold_yo(original).find(body.replace(_MARK, ""))
+    if start < 0:
+        restored = body.replace(_MARK, "**")
+    else:
+        parts = []
+        position = start
+        for char in body:
+            if char == _MARK:
+                parts.append("**")
+            else:
+                parts.append(original[position])
+                position += 1
+        restored = "".join(parts)
+    return ("…" if snippet.startswith(_CUT) else "") + restored + ("…" if snippet.endswith(_CUT) else "")
+
+_UPSERT_ASSESSMENT = """
+INSERT INTO assessments (session_id, kind, started_at, completed_at, unit, risk_level,
+                         recommendation, full_name, questionnaire, results, p2_answers, seq)
+VALUES (:session_id, :kind, :started_at, :completed_at, :unit, :risk_level,
+        :recommendation, :full_name, :questionnaire, :results, :p2_answers,
+        (SELECT COALESCE(MAX(seq), 0) + 1 FROM assessments))
+ON CONFLICT (session_id, kind) DO UPDATE SET
+    seq = excluded.seq, completed_at = excluded.completed_at, unit = excluded.unit, risk_level = excluded.risk_level,
+    recommendation = excluded.recommendation, full_name = excluded.full_name,
+    questionnaire = excluded.questionnaire, results = excluded.results, p2_answers = excluded.p2_answers
+"""
+
+_UPSERT_RESPONSE = """
+INSERT INTO responses (session_id, item_id, value) VALUES (?, ?, ?)
+ON CONFLICT (session_id, item_id) DO UPDATE SET value = excluded.value
+"""
+
+_UPSERT_FIELD = """
+INSERT INTO questionnaire_answers (session_id, field_id, value) VALUES (?, ?, ?)
+ON CONFLICT (session_id, field_id) DO UPDATE SET value = excluded.value
+"""
+
+_APPEND_EVENTS = """
+INSERT INTO session_log (session_id, events) VALUES (?, ?)
+ON CONFLICT (session_id) DO UPDATE SET events = CAST(events || excluded.events AS BLOB)
+"""
+
+_COLUMNS = ("session_id", "kind", "started_at", "completed_at", "unit", "risk_level",
+            "recommendation", "full_name", "questionnaire", "results", "p2_answers")
+
+
+def assessment_row(record):
+    """Проверка записи обследования и подготовка строки таблицы assessments."""
+    missing = [column for column in ("session_id", "kind", "started_at", "completed_at", "results")
+               if record.get(column) is None]
+    if missing:
+        raise ValueError(f"В записи обследования нет полей: {', '.join(missing)}")
+    if record.get("risk_level") is not None and record["risk_level"] not in RISK_LEVELS:
+        raise ValueError(f"Неизвестный уровень риска {record['risk_level']!r}")
+
+    row = {column: record.get(column) for column in _COLUMNS}
+    row["unit"] = row["unit"] or ""
+    row["questionnaire"] = json.dumps(row["questionnaire"] or {}, ensure_ascii=False, default=str)
+    row["results"] = json.dumps(row["results"], ensure_ascii=False, default=str)
+    return row
+
+
+class AssessmentStore:
+    """Хранилище обследований: одно соединение на процесс, запись под блокировкой."""
+
+    def __init__(self, path=ASSESSMENT_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, cached_statements=64)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            # В режиме WAL NORMAL не теряет целостность при сбое питания, но не делает fsync на каждую транзакцию
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.executescript(_SCHEMA)
+            self._migrate_locked()
+            try:
+                self._migrate_search_locked()
+                self._conn.executescript(_SEARCH_SCHEMA)
+                self.search_available = True
+            except sqlite3.OperationalError:
+                # SQLite собран без FTS5 — хранилище работает, поиск недоступен
+                self.search_available = False
+        if self.search_available and self._search_index_missing():
+            self.rebuild_search_index()
+
+    def _migrate_locked(self):
+        """Добавление столбцов, появившихся после создания базы."""
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(assessments)")}
+        if "seq" not in columns:
+            # Записи сделаны раньше: порядок rowid — порядок вставки
+            with self._conn:
+                self._conn.execute("ALTER TABLE assessments ADD COLUMN seq INTEGER")
+                self._conn.execute("UPDATE assessments SET seq = rowid")
+        self._conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS assessments_seq ON assessments (seq)")
+
+    def _migrate_search_locked(self):
+        """Индекс без столбца original удаляется: он перестроится по сохранённым анкетам."""
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(questionnaire_fts)")}
+        if columns and "original" not in columns:
+            with self._conn:
+                self._conn.execute("DROP TABLE questionnaire_fts")
+                self._conn.execute("DELETE FROM questionnaire_docs")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def save_assessment(self, record, responses=None):
+        """Запись (или перезапись) итога обследования и ответов на пункты одной транзакцией.
+
+        record — dict с ключами _COLUMNS; questionnaire и results сериализуются в JSON.
+        responses — dict {id пункта: балл}.
+        """
+        self.apply([("assessment", assessment_row(record), responses)])
+
+    def apply(self, operations):
+        """Применение списка операций одной транзакцией.
+
+        Операции: ("assessment", строка assessment_row, ответы или None),
+        ("response", id сессии, id пункта, балл), ("field", id сессии, id поля, значение JSON),
+        ("event", id сессии, байты событий журнала).
+        Подряд идущие операции одного вида выполняются одним executemany.
+        """
+        with self._lock, self._conn:
+            index = 0
+            while index < len(operations):
+                kind = operations[index][0]
+                end = index
+                while end < len(operations) and operations[end][0] == kind:
+                    end += 1
+                run = operations[index:end]
+                if kind == "response":
+                    self._conn.executemany(_UPSERT_RESPONSE, [operation[1:] for operation in run])
+                elif kind == "field":
+                    self._conn.executemany(_UPSERT_FIELD, [operation[1:] for operation in run])
+                    self._index_fields_locked(
+                        (session_id, field_id, json.loads(value)) for _, session_id, field_id, value in run
+                    )
+                elif kind == "event":
+                    self._conn.executemany(_APPEND_EVENTS, [operation[1:] for operation in run])
+                elif kind == "assessment":
+                    for _, row, responses in run:
+                        self._conn.execute(_UPSERT_ASSESSMENT, row)
+                        self._index_fields_locked(
+                            (row["session_id"], field_id, value)
+                            for field_id, value in json.loads(row["questionnaire"]).items()
+                        )
+                        if responses:
+                            self._conn.executemany(
+                                _UPSERT_RESPONSE,
+                                [(row["session_id"], item_id, int(value)) for item_id, value in responses.items()],
+                            )
+                else:
+                    raise ValueError(f"Неизвестная операция записи {kind!r}")
+                index = end
+
+    def _index_fields_locked(self, fields):
+        """Обновление полнотекстового индекса для (сессия, поле, значение) в текущей транзакции."""
+        if not self.search_available:
+            return
+        for session_id, field_id, value in fields:
+            if field_id not in question_bank.FREE_TEXT_FIELDS:
+                continue
+            original = (value if isinstance(value, str) else str(value or "")).strip()
+            text = textnorm.fold_yo(original)
+            row = self._conn.execute(
+                "SELECT doc_id FROM questionnaire_docs WHERE session_id = ? AND field_id = ?", (session_id, field_id)
+            ).fetchone()
+            if row is not None:
+                doc_id = row[0]
+                self._conn.execute("DELETE FROM questionnaire_fts WHERE rowid = ?", (doc_id,))
+            elif text:
+                doc_id = self._conn.execute(
+                    "INSERT INTO questionnaire_docs (session_id, field_id) VALUES (?, ?)", (session_id, field_id)
+                ).lastrowid
+            else:
+                continue
+            if text:
+                self._conn.execute(
+                    "INSERT INTO questionnaire_fts (rowid, value, field_id, original) VALUES (?, ?, ?, ?)",
+                    (doc_id, text, field_id, original),
+                )
+
+    def _search_index_missing(self):
+        with self._lock:
+            indexed = self._conn.execute("SELECT 1 FROM questionnaire_docs LIMIT 1").fetchone()
+            stored = self._conn.execute("SELECT 1 FROM questionnaire_answers LIMIT 1").fetchone() or \
+                self._conn.execute("SELECT 1 FROM assessments LIMIT 1").fetchone()
+        return indexed is None and stored is not None
+
+    def rebuild_search_index(self):
+        """Полное перестроение индекса по сохранённым анкетам (для баз, созданных до поиска)."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM questionnaire_fts")
+            self._conn.execute("DELETE FROM questionnaire_docs")
+            for session_id, questionnaire in self._conn.execute(
+                "SELECT session_id, questionnaire FROM assessments"
+            ).fetchall():
+                self._index_fields_locked(
+                    (session_id, field_id, value) for field_id, value in json.loads(questionnaire or "{}").items()
+                )
+            self._index_fields_locked(
+                (session_id, field_id, json.loads(value))
+                for session_id, field_id, value in self._conn.execute(
+                    "SELECT session_id, field_id, value FROM questionnaire_answers"
+                ).fetchall()
+            )
+        self.optimize_search_index()
+
+    def optimize_search_index(self):
+        """Слияние сегментов индекса FTS5 в один (после массовой загрузки запросы быстрее)."""
+        with self._lock:
+            with self._conn:
+                self._conn.execute("INSERT INTO questionnaire_fts (questionnaire_fts) VALUES ('optimize')")
+            # Иначе читатели ищут страницы индекса в многогигабайтном WAL
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def search_questionnaire(self, query, field_ids=None, limit=20):
+        """Поиск по свободным ответам анкеты: лучшие совпадения по BM25.
+
+        Каждое слово запроса ищется по основе как префикс (textnorm.fts_query); field_ids
+        ограничивает поиск полями из question_bank.FREE_TEXT_FIELDS. Ранжируются не больше
+        SEARCH_RANK_WINDOW самых свежих совпадений. Возвращает список dict: session_id,
+        field_id, full_name (из анкеты, иначе из итога обследования), snippet — фрагмент
+        ответа в написании кандидата (совпадения выделены **…**), rank.
+        """
+        if not self.search_available:
+            raise RuntimeError("SQLite собран без FTS5: полнотекстовый поиск недоступен")
+        match = f"value : ({textnorm.fts_query(query)})"
+        if field_ids:
+            unknown = [field_id for field_id in field_ids if field_id not in question_bank.FREE_TEXT_FIELDS]
+            if unknown:
+                raise ValueError(f"Поля не индексируются для поиска: {', '.join(unknown)}")
+            match += " AND field_id : (" + " OR ".join(f'"{field_id}"' for field_id in field_ids) + ")"
+        with self._lock:
+            # Граница окна: doc_id растёт со временем, поэтому свежие совпадения — с большими rowid
+            row = self._conn.execute(
+                "SELECT rowid FROM questionnaire_fts WHERE questionnaire_fts MATCH ? "
+                "ORDER BY rowid DESC LIMIT 1 OFFSET ?",
+                (match, SEARCH_RANK_WINDOW - 1),
+            ).fetchone()
+            # Ранжирование — только по индексу; документы и ФИО подтягиваются отдельным
+            # запросом для первых limit строк, а не для каждого совпадения
+            top = self._conn.execute(
+                f"""
+                SELECT rowid,
+                       snippet(questionnaire_fts, 0, '{_MARK}', '{_MARK}', '{_CUT}', {SEARCH_SNIPPET_TOKENS}) AS snippet,
+                       original,
+                       bm25(questionnaire_fts, 1.0, 0.0, 0.0) AS score
+                FROM questionnaire_fts
+                WHERE questionnaire_fts MATCH ? AND rowid >= ?
+                ORDER BY score
+                LIMIT ?
+                """,
+                (match, row[0] if row else 0, int(limit)),
+            ).fetchall()
+            docs = {}
+            if top:
+                docs = {
+                    doc["doc_id"]: doc
+                    for doc in self._conn.execute(
+                        f"""
+                        SELECT d.doc_id, d.session_id, d.field_id, name.value AS full_name,
+                               (SELECT a.full_name FROM assessments a
+                                WHERE a.session_id = d.session_id AND a.full_name != '' LIMIT 1) AS assessment_name
+                        FROM questionnaire_docs d
+                        LEFT JOIN questionnaire_answers name
+                               ON name.session_id = d.session_id AND name.field_id = 'full_name'
+                        WHERE d.doc_id IN ({', '.join('?' * len(top))})
+                        """,
+                        [doc_id for doc_id, _, _, _ in top],
+                    )
+                }
+        results = []
+        for doc_id, snippet, original, score in top:
+            doc = docs[doc_id]
+            results.append({
+                "session_id": doc["session_id"],
+                "field_id": doc["field_id"],
+                "full_name": (json.loads(doc["full_name"]) if doc["full_name"] else None) or doc["assessment_name"],
+                "snippet": _restore_snippet(snippet, original),
+                "rank": score,
+            })
+        return results
+
+    def get_questionnaire(self, session_id):
+        """Ответы анкеты сессии, сохранённые по ходу заполнения."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT field_id, value FROM questionnaire_answers WHERE session_id = ?", (session_id,)
+            ).fetchall()
+        return {field_id: json.loads(value) for field_id, value in rows}
+
+    def iter_questionnaires(self, field_ids=None, chunk_size=5000):
+        """Анкеты всех сессий: (id сессии, {id поля: значение}), по возрастанию id.
+
+        Строки читаются порциями по chunk_size, блокировка берётся только на время порции,
+        поэтому проверка архива не останавливает запись. Сессии, от которых сохранён только
+        итог (анкета в assessments), отдаются после остальных.
+        """
+        wanted = frozenset(field_ids) if field_ids else None
+        session_id, questionnaire = None, {}
+        for query, whole in (
+            # Ключ порции — (сессия, поле) последней прочитанной строки
+            ("SELECT session_id, field_id, value FROM questionnaire_answers "
+             "WHERE (session_id, field_id) > (?, ?) ORDER BY session_id, field_id LIMIT ?", False),
+            # Итоги без ответов по полям: анкета целиком в JSON (ключ — (сессия, вид))
+            ("SELECT session_id, kind, questionnaire FROM assessments a "
+             "WHERE (session_id, kind) > (?, ?) AND NOT EXISTS "
+             "(SELECT 1 FROM questionnaire_answers q WHERE q.session_id = a.session_id) "
+             "ORDER BY session_id, kind LIMIT ?", True),
+        ):
+            last = ("", "")
+            while True:
+                with self._lock:
+                    rows = self._conn.execute(query, last + (chunk_size,)).fetchall()
+                for row_session, key, value in rows:
+                    if row_session != session_id:
+                        if session_id is not None:
+                            yield session_id, questionnaire
+                        session_id, questionnaire = row_session, {}
+                    fields = json.loads(value or "{}").items() if whole else ((key, json.loads(value)),)
+                    questionnaire.update(
+                        (field_id, field) for field_id, field in fields if wanted is None or field_id in wanted
+                    )
+                if len(rows) < chunk_size:
+                    break
+                last = (rows[-1][0], rows[-1][1])
+        if session_id is not None:
+            yield session_id, questionnaire
+
+    def iter_assessments(self, kind=None, chunk_size=5000, with_responses=False, date_from=None, date_to=None):
+        """Все обследования по возрастанию (сессия, вид), порциями по chunk_size.
+
+        date_from / date_to — период по completed_at (ISO-даты, включительно), как в list_assessments.
+        with_responses — добавить к итогам скрининга ответы на пункты (record["responses"]),
+        как в get_assessment; они читаются одним запросом на порцию по диапазону id сессий.
+        """
+        conditions = []
+        params = []
+        if kind is not None:
+            conditions.append("AND kind = ?")
+            params.append(kind)
+        if date_from:
+            conditions.append("AND completed_at >= ?")
+            params.append(date_from)
+        if date_to:
+            conditions.append("AND completed_at < ?")
+            params.append((date.fromisoformat(date_to) + timedelta(days=1)).isoformat())
+        params = tuple(params)
+        query = (f"SELECT * FROM assessments WHERE (session_id, kind) > (?, ?) {' '.join(conditions)} "
+                 "ORDER BY session_id, kind LIMIT ?")
+        last = ("", "")
+        while True:
+            responses = {}
+            with self._lock:
+                rows = self._conn.execute(query, last + params + (chunk_size,)).fetchall()
+                if with_responses and rows:
+                    for session_id, item_id, value in self._conn.execute(
+                        "SELECT session_id, item_id, value FROM responses WHERE session_id BETWEEN ? AND ?",
+                        (rows[0]["session_id"], rows[-1]["session_id"]),
+                    ):
+                        responses.setdefault(session_id, {})[item_id] = value
+            for row in rows:
+                record = self._decode(row)
+                if with_responses and record["kind"] == "screening":
+                    record["responses"] = responses.get(record["session_id"], {})
+                yield record
+            if len(rows) < chunk_size:
+                break
+            last = (rows[-1]["session_id"], rows[-1]["kind"])
+
+    def iter_completed(self, after=0, chunk_size=5000, with_responses=False):
+        """Обследования в порядке записи: по seq, после номера after.
+
+        seq назначается при фиксации записи и растёт при каждой перезаписи итога, поэтому для
+        дозаписи выгрузок достаточно хранить seq последней прочитанной записи: итоги,
+        записанные позже, не окажутся ниже него, а перезаписанный итог придёт снова.
+        with_responses — как в iter_assessments.
+        """
+        last = after or 0
+        while True:
+            responses = {}
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT * FROM assessments WHERE seq > ? ORDER BY seq LIMIT ?", (last, chunk_size)
+                ).fetchall()
+                if with_responses:
+                    session_ids = [row["session_id"] for row in rows if row["kind"] == "screening"]
+                    # Не больше 500 параметров в запросе
+                    for start in range(0, len(session_ids), 500):
+                        part = session_ids[start:start + 500]
+                        for session_id, item_id, value in self._conn.execute(
+                            f"SELECT session_id, item_id, value FROM responses "
+                            f"WHERE session_id IN ({', '.join('?' * len(part))})",
+                            part,
+                        ):
+                            responses.setdefault(session_id, {})[item_id] = value
+            for row in rows:
+                record = self._decode(row)
+                if with_responses and record["kind"] == "screening":
+                    record["responses"] = responses.get(record["session_id"], {})
+                yield record
+            if len(rows) < chunk_size:
+                break
+            last = rows[-1]["seq"]
+
+    def create_resume_code(self, session_id):
+        """Код продолжения сессии (выдаётся один раз; повторный вызов вернёт тот же код)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT code FROM resume_codes WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is not None:
+                return row[0]
+            while True:
+                code = new_resume_code()
+                try:
+                    with self._conn:
+                        self._conn.execute(
+                            "INSERT INTO resume_codes (code, session_id) VALUES (?, ?)", (code, session_id)
+                        )
+                    return code
+                except sqlite3.IntegrityError:
+                    # Код уже выдан другой сессии — берём новый
+                    continue
+
+    def load_session(self, code):
+        """Сохранённая сессия по коду продолжения или None.
+
+        Возвращает dict: session_id, events (байты журнала), questionnaire {id поля: значение}.
+        """
+        code = normalize_resume_code(code)
+        with self._lock:
+            row = self._conn.execute("SELECT session_id FROM resume_codes WHERE code = ?", (code,)).fetchone()
+        if row is None:
+            return None
+        session_id = row[0]
+        return {
+            "session_id": session_id,
+            "events": self.get_session_log(session_id),
+            "questionnaire": self.get_questionnaire(session_id),
+        }
+
+    def get_session_log(self, session_id):
+        """Байты журнала событий сессии (пустые, если событий не было)."""
+        with self._lock:
+            row = self._conn.execute("SELECT events FROM session_log WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0] if row is not None else b""
+
+    def _decode(self, row):
+        record = dict(row)
+        record["questionnaire"] = json.loads(record["questionnaire"] or "{}")
+        record["results"] = json.loads(record["results"])
+        return record
+
+    def get_assessment(self, session_id, kind="screening"):
+        """Обследование (для скрининга — с ответами на пункты) или None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM assessments WHERE session_id = ? AND kind = ?", (session_id, kind)
+            ).fetchone()
+            if row is None:
+                return None
+            responses = []
+            if kind == "screening":
+                # Ответы «Прогноз-2» хранятся упакованной записью в p2_answers
+                responses = self._conn.execute(
+                    "SELECT item_id, value FROM responses WHERE session_id = ?", (session_id,)
+                ).fetchall()
+        record = self._decode(row)
+        record["responses"] = {item_id: value for item_id, value in responses}
+        return record
+
+    def list_assessments(self, date_from=None, date_to=None, unit=None, risk_level=None, kind=None, limit=100):
+        """Обследования за период (ISO-даты, включительно) с фильтрами, новые первыми."""
+        conditions = []
+        params = []
+        if date_from:
+            conditions.append("completed_at >= ?")
+            params.append(date_from)
+        if date_to:
+            # Верхняя граница включает весь день date_to
+            conditions.append("completed_at < ?")
+            params.append((date.fromisoformat(date_to) + timedelta(days=1)).isoformat())
+        if unit is not None:
+            conditions.append("unit = ?")
+            params.append(unit)
+        if risk_level is not None:
+            conditions.append("risk_level = ?")
+            params.append(risk_level)
+        if kind is not None:
+            conditions.append("kind = ?")
+            params.append(kind)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = f"SELECT * FROM assessments {where} ORDER BY completed_at DESC LIMIT ?"
+        with self._lock:
+            rows = self._conn.execute(query, params + [int(limit)]).fetchall()
+        return [self._decode(row) for row in rows]
+
+    def count_by_risk(self, date_from=None, unit=None):
+        """Число обследований по уровням риска."""
+        conditions = []
+        params = []
+        if date_from:
+            conditions.append("completed_at >= ?")
+            params.append(date_from)
+        if unit is not None:
+            conditions.append("unit = ?")
+            params.append(unit)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT risk_level, COUNT(*) FROM assessments {where} GROUP BY risk_level", params
+            ).fetchall()
+        return {risk_level: count for risk_level, count in rows}
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_store():
+    """Общее на процесс хранилище в файле ASSESSMENT_DB."""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = AssessmentStore()
+        return _default_store
+
+
+# --- Отложенная запись ---
+_STOP = object()
+FAILURES_KEPT = 10000  # сессий с несохранёнными записями, о которых помнит очередь
+
+
+def _operation_session(operation):
+    """id сессии операции записи (см. AssessmentStore.apply)."""
+    return operation[1]["session_id"] if operation[0] == "assessment" else operation[1]
+
+
+class WriteBehindQueue:
+    """Очередь отложенной записи с групповой фиксацией в фоновом потоке.
+
+    Каждая запись получает порядковый номер; flush ждёт, пока зафиксированы все записи,
+    поставленные до его вызова. Если группу зафиксировать не удалось, записи повторяются
+    по одной, а ошибки не сохранившихся запоминаются по сессиям: о них узнаёт flush той сессии.
+    """
+
+    def __init__(self, store, batch_ms=STORE_BATCH_MS, batch_size=STORE_BATCH_SIZE,
+                 queue_size=STORE_QUEUE_SIZE, put_timeout=STORE_PUT_TIMEOUT):
+        self.store = store
+        self.batch_seconds = batch_ms / 1000
+        self.batch_size = max(batch_size, 1)
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._put_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._seq = 0  # номер последней поставленной записи
+        self._committed = 0  # номер последней обработанной записи
+        self._failures = collections.OrderedDict()  # id сессии -> (номер первой несохранённой записи, ошибка)
+        self._stats = {"records": 0, "batches": 0, "failed": 0, "put_wait_max": 0.0, "commit_max": 0.0}
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="store-writer", daemon=True)
+        self._thread.start()
+
+    def _put(self, operation):
+        if self._closed:
+            raise RuntimeError("Очередь записи закрыта")
+        start = time.monotonic()
+        # Номера выдаются в порядке постановки в очередь, иначе flush мог бы не дождаться записи
+        with self._put_lock:
+            seq = self._seq + 1
+            try:
+                # Обратное давление: при полной очереди ждём, пока писатель её разгрузит
+                self._queue.put((seq, operation), timeout=self.put_timeout)
+            except queue.Full:
+                raise RuntimeError("Очередь записи в хранилище переполнена") from None
+            with self._cond:
+                self._seq = seq
+                self._stats["put_wait_max"] = max(self._stats["put_wait_max"], time.monotonic() - start)
+        return seq
+
+    def put_response(self, session_id, item_id, value):
+        """Ответ на пункт теста."""
+        return self._put(("response", session_id, item_id, int(value)))
+
+    def put_field(self, session_id, field_id, value):
+        """Ответ на вопрос анкеты (значение сериализуется в JSON)."""
+        return self._put(("field", session_id, field_id, json.dumps(value, ensure_ascii=False, default=str)))
+
+    def put_event(self, session_id, data):
+        """Байты событий, дописываемые в конец журнала сессии."""
+        return self._put(("event", session_id, data))
+
+    def put_assessment(self, record, responses=None):
+        """Итог обследования; запись проверяется сразу, ошибки — ValueError в вызывающем коде."""
+        return self._put(("assessment", assessment_row(record), dict(responses) if responses else None))
+
+    def flush(self, timeout=None, session_id=None):
+        """Дождаться фиксации всех записей, поставленных до вызова; False — не дождались.
+
+        С session_id — RuntimeError, если какую-то из записей этой сессии зафиксировать не
+        удалось (об ошибке сообщается один раз).
+        """
+        with self._cond:
+            target = self._seq
+            if not self._cond.wait_for(lambda: self._committed >= target, timeout=timeout):
+                return False
+            failure = self._failures.get(session_id)
+            if failure is not None and failure[0] <= target:
+                del self._failures[session_id]
+                raise RuntimeError(f"Часть записей не сохранена: {failure[1]}")
+            return True
+
+    def _mark_done_locked(self, seq, failed=()):
+        self._committed = max(self._committed, seq)
+        for failed_seq, session_id, error in failed:
+            if session_id not in self._failures:
+                self._failures[session_id] = (failed_seq, error)
+                # Сессии, которые так и не вызвали flush, не копятся без конца
+                if len(self._failures) > FAILURES_KEPT:
+                    self._failures.popitem(last=False)
+        self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_seconds
+            while len(batch) < self.batch_size and batch[-1] is not _STOP:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            stop = batch[-1] is _STOP
+            if stop:
+                batch.pop()
+            if batch:
+                self._commit(batch)
+            if stop:
+                return
+
+    def _apply(self, operations):
+        """Фиксация операций с повтором, пока база занята; ошибка или None."""
+        for attempt in range(3):
+            try:
+                self.store.apply(operations)
+                return None
+            except sqlite3.OperationalError as e:
+                # База занята другим процессом — повторяем с паузой
+                error = e
+                time.sleep(0.05 * 2 ** attempt)
+            except Exception as e:
+                return e
+        return error
+
+    def _commit(self, batch):
+        last_seq = max(seq for seq, _ in batch)
+        start = time.monotonic()
+        error = self._apply([operation for _, operation in batch])
+        failed = []
+        if error is not None:
+            if isinstance(error, sqlite3.OperationalError):
+                # База недоступна, повтор по одной ничего не даст (каждый ждёт busy_timeout)
+                failed = [(seq, _operation_session(operation), error) for seq, operation in batch]
+            else:
+                # Ошибка в отдельных записях — остальные фиксируются по одной
+                for seq, operation in batch:
+                    record_error = self._apply([operation])
+                    if record_error is not None:
+                        failed.append((seq, _operation_session(operation), record_error))
+        with self._cond:
+            self._stats["records"] += len(batch) - len(failed)
+            self._stats["failed"] += len(failed)
+            self._stats["batches"] += 1
+            self._stats["commit_max"] = max(self._stats["commit_max"], time.monotonic() - start)
+            self._mark_done_locked(last_seq, failed)
+
+    def close(self, timeout=10):
+        """Сброс очереди на диск и остановка потока (вызывается и при завершении процесса)."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def stats(self):
+        """Глубина очереди, число записей и транзакций, средний размер группы, задержки, с."""
+        with self._cond:
+            batches = self._stats["batches"]
+            return dict(
+                self._stats,
+                queue_depth=self._queue.qsize(),
+                avg_batch=self._stats["records"] / batches if batches else 0.0,
+                pending=self._seq - self._committed,
+            )
+
+
+_default_writer = None
+
+
+def get_writer():
+    """Общая на процесс очередь отложенной записи в get_store(); сбрасывается при выходе."""
+    global _default_writer
+    store = get_store()
+    with _default_store_lock:
+        if _default_writer is None:
+            _default_writer = WriteBehindQueue(store)
+            atexit.register(_default_writer.close)
+        return _default_writer
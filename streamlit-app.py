@@ -191,10 +191,17 @@ SCALE_NAMES = {
 
 # Функция для установки API ключа OpenAI
 def set_openai_api_key(api_key):
-    """Устанавливает API ключ OpenAI как переменную окружения"""
-    os.environ["OPENAI_API_KEY"] = api_key
+    """Сохраняет API ключ OpenAI в состоянии текущей сессии.
+    
+    В os.environ ключ не пишется: окружение общее для всех сессий процесса.
+    """
+    st.session_state.tts_api_key = api_key
     return True
 
+def session_api_key():
+    """Ключ OpenAI текущей сессии, а без него — ключ сервера из OPENAI_API_KEY"""
+    return st.session_state.get("tts_api_key") or os.environ.get("OPENAI_API_KEY")
+
 # Функция для озвучивания текста с использованием OpenAI API
 def generate_speech(text, voice="alloy", language="ru"):
     """
@@ -210,7 +217,7 @@ def generate_speech(text, voice="alloy", language="ru"):
     """
     try:
         # Проверяем наличие API ключа
-        api_key = os.environ.get("OPENAI_API_KEY")
+        api_key = session_api_key()
         if not api_key:
             st.warning("API ключ OpenAI не настроен. Озвучивание недоступно.")
             return None
@@ -297,6 +304,8 @@ def initialize_session():
         st.session_state.tts_enabled = False
     if 'tts_voice' not in st.session_state:
         st.session_state.tts_voice = 'alloy'
+    if 'tts_api_key' not in st.session_state:
+        st.session_state.tts_api_key = None
     if 'last_question_id' not in st.session_state:
         st.session_state.last_question_id = None
     if 'tts_language' not in st.session_state:
@@ -668,14 +677,10 @@ def show_start_screen():
         st.subheader("Настройка озвучивания вопросов")
         st.markdown("""
         Для работы функции озвучивания необходимо настроить API ключ OpenAI. 
-        Вы можете получить ключ API на сайте [OpenAI](https://platform.openai.com/api-keys) и настроить его следующим образом:
-        
-        ```
-        import os
-        os.environ["OPENAI_API_KEY"] = "ваш-ключ-api"
-        ```
+        Вы можете получить ключ API на сайте [OpenAI](https://platform.openai.com/api-keys) и ввести его в форме выше
+        (ключ действует только в текущей сессии).
         
-        Или установить как переменную окружения перед запуском приложения:
+        Или установить ключ сервера как переменную окружения перед запуском приложения:
         ```
         # Windows
         set OPENAI_API_KEY=ваш-ключ-api
@@ -699,7 +704,7 @@ def show_question(question, progress=None):
         audio_container = st.empty()
         
         # Проверяем, есть ли ключ OpenAI API
-        if os.environ.get("OPENAI_API_KEY"):
+        if session_api_key():
             # Автоматическое озвучивание при появлении вопроса
             if 'last_question_id' not in st.session_state or st.session_state.last_question_id != question['id']:
                 audio_html = generate_speech(question['text'], voice=st.session_state.tts_voice, language=st.session_state.tts_language)
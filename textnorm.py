@@ -0,0 +1,90 @@
+"""Нормализация русского текста для поиска по ответам анкеты.
+
+Полнотекстовый индекс SQLite (FTS5, токенизатор unicode61) сам приводит регистр, но не
+отождествляет «ё» и «е» и не знает русской морфологии. Поэтому текст перед индексацией
+проходит fold_yo, а слова запроса — лёгкий стеммер: у слова отрезается типичное окончание,
+и основа ищется как префикс («кредитов» -> кредит* находит «кредиты», «кредитная»).
+
+Для поиска терминов в ответах (keyword_flags.py) текст сворачивается посимвольно
+(fold_chars): нижний регистр, «ё» -> «е», казахские буквы -> близкие русские
+(«қ» -> «к», «ұ» -> «у»…), латинские двойники в кириллических словах -> кириллица
+(«нaркотик» с латинской «a»). Длина строки при этом не меняется, поэтому позиции
+совпадений в свёрнутом тексте совпадают с позициями в исходном.
+"""
+
+import re
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+# Окончания существительных, прилагательных, глаголов и причастий — от длинных к коротким
+_ENDINGS = sorted(
+    {
+        "иями", "ями", "ами", "иях", "ях", "ах", "ов", "ев", "ей", "ий", "ый", "ой", "ая", "яя",
+        "ое", "ее", "ые", "ие", "ого", "его", "ому", "ему", "ым", "им", "ом", "ем", "ую", "юю",
+        "ию", "ью", "ия", "ья", "ье", "ам", "ям", "ых", "их", "ыми", "ими",
+        "ость", "ости", "остью", "ение", "ения", "ении", "ением", "ений", "ание", "ания", "ании",
+        "ться", "тся", "ется", "ются", "ится", "ятся", "ать", "ять", "ить", "еть", "ть",
+        "ует", "уют", "ешь", "ет", "ут", "ют", "ит", "ат", "ят",
+        "ал", "ала", "али", "ало", "ил", "ила", "или", "ило", "ел", "ела", "ели",
+        "а", "я", "о", "е", "ы", "и", "у", "ю", "ь", "й",
+    },
+    key=len,
+    reverse=True,
+)
+MIN_STEM = 4  # короче основа не обрезается: иначе префикс находит слишком много
+
+# Казахские буквы -> русские, с которыми их смешивают при наборе на русской раскладке
+_KAZAKH = str.maketrans("әғқңөұүһі", "агкноуухи")
+# Латинские буквы, неотличимые на вид от кириллических
+_HOMOGLYPHS = str.maketrans("aceopxykmthb", "асеорхукмтнв")
+_CYRILLIC = re.compile(r"[а-я]")
+
+
+def fold_yo(text):
+    """Замена «ё» на «е» (регистр сохраняется)."""
+    return text.replace("ё", "е").replace("Ё", "Е")
+
+
+def normalize(text):
+    """Нижний регистр и «ё» -> «е»."""
+    return fold_yo(text.lower())
+
+
+def fold_chars(text):
+    """Посимвольная свёртка для сопоставления терминов; длина строки сохраняется."""
+    folded = text.lower()
+    if len(folded) != len(text):
+        # Редкие символы, у которых нижний регистр длиннее одного знака, оставляем как есть
+        folded = "".join(char.lower() if len(char.lower()) == 1 else char for char in text)
+    folded = fold_yo(folded).translate(_KAZAKH)
+    if not folded.isascii():
+        # Латиница заменяется только в словах, где есть и кириллица: «casino» остаётся латиницей
+        folded = _WORD.sub(
+            lambda match: match.group().translate(_HOMOGLYPHS) if _CYRILLIC.search(match.group()) else match.group(),
+            folded,
+        )
+    return folded
+
+
+def words(text):
+    """Нормализованные слова текста."""
+    return _WORD.findall(normalize(text))
+
+
+def stem(word):
+    """Основа слова: отрезается самое длинное из типичных окончаний."""
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM:
+            return word[: -len(ending)]
+    return word
+
+
+def fts_query(text):
+    """Выражение MATCH для FTS5: все слова запроса, каждое как префикс своей основы.
+
+    Слова берутся в кавычки, поэтому операторы FTS5 из ввода пользователя не действуют.
+    """
+    terms = [stem(word) for word in words(text)]
+    if not terms:
+        raise ValueError("Поисковый запрос не содержит слов")
+    return " ".join(f'"{term}"*' for term in terms)
@@ -0,0 +1,388 @@
+"""Синтез речи для озвучивания вопросов: кэш и фоновая предзагрузка.
+
+Модуль не зависит от Streamlit и живёт весь процесс. Порядок вопросов сессии известен
+заранее, поэтому пока кандидат читает текущий вопрос, пул потоков синтезирует следующие
+и складывает аудио в дисковый кэш (tts_cache). Когда вопрос отображается, его аудио
+обычно уже готово; если синтез ещё идёт, synthesize дожидается той же задачи, а не
+запускает второй запрос.
+
+Параллельность ограничена дважды: числом потоков на процесс (TTS_PREFETCH_WORKERS) и
+числом одновременных задач одной сессии (TTS_PREFETCH_PER_SESSION); остальные тексты
+сессии ждут своей очереди и запускаются по мере завершения предыдущих.
+
+Синтез выполняет движок из tts_backends (OpenAI или локальный, по TTS_BACKEND). Ключ API
+облачного движка хранится в состоянии сессии (session_api_key), а не в общем для
+процесса os.environ.
+
+Под нагрузкой (десятки терминалов одновременно) обращения к API проходят контроль допуска:
+ведро токенов ограничивает частоту, семафор — число одновременных запросов, запросы одного
+текста объединяются в одну задачу. Если очередь переполнена или API ответил 429, новые
+запросы сразу получают SpeechUnavailable: экран работает в текстовом режиме, а озвучку
+можно повторить позже. Глубину очереди и время ожидания показывает admission_stats.
+
+Прогон скрипта Streamlit синтез не блокирует: request возвращает Future, а play ждёт его
+короткими отрезками, так что ответ кандидата прерывает ожидание, а cancel снимает ещё не
+начатую задачу. Аудио передаётся байтами в st.audio, без временных файлов и base64.
+"""
+
+import functools
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import tts_backends
+import tts_cache
+
+TTS_PREFETCH_AHEAD = int(os.environ.get("TTS_PREFETCH_AHEAD", "3"))  # вопросов вперёд
+TTS_PREFETCH_WORKERS = int(os.environ.get("TTS_PREFETCH_WORKERS", "4"))  # потоков на процесс
+TTS_PREFETCH_PER_SESSION = int(os.environ.get("TTS_PREFETCH_PER_SESSION", "2"))  # задач на сессию
+TTS_WAIT_TIMEOUT = float(os.environ.get("TTS_WAIT_TIMEOUT", "30"))  # ожидание аудио на экране, с
+TTS_RATE_PER_SECOND = float(os.environ.get("TTS_RATE_PER_SECOND", "3"))  # запросов к API в секунду
+TTS_BURST = int(os.environ.get("TTS_BURST", "6"))  # запросов подряд без ожидания
+TTS_MAX_INFLIGHT = int(os.environ.get("TTS_MAX_INFLIGHT", "4"))  # одновременных запросов к API
+TTS_MAX_QUEUE = int(os.environ.get("TTS_MAX_QUEUE", "40"))  # задач в очереди до отказа
+TTS_BACKOFF_SECONDS = float(os.environ.get("TTS_BACKOFF_SECONDS", "10"))  # пауза после 429, с
+_POLL_INTERVAL = 0.2  # шаг ожидания в play, с
+
+
+class SpeechUnavailable(Exception):
+    """Синтез временно недоступен: очередь переполнена или API ограничивает частоту."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"озвучивание временно недоступно, повторите через {max(retry_after, 1):.0f} с")
+        self.retry_after = retry_after
+
+
+def available():
+    """Доступен ли движок синтеза (для OpenAI — установлен ли пакет, без его импорта)."""
+    return tts_backends.get_backend().available()
+
+
+def voices():
+    """Голоса движка для выбора в интерфейсе."""
+    return tts_backends.get_backend().voices
+
+
+def session_api_key(state):
+    """Ключ API для сессии: введённый в интерфейсе, иначе общий ключ сервера из окружения."""
+    return state.get("tts_api_key") or os.environ.get("OPENAI_API_KEY")
+
+
+def can_speak(api_key):
+    """Можно ли озвучивать: движок доступен и, если ему нужен ключ API, ключ задан."""
+    backend = tts_backends.get_backend()
+    return backend.available() and bool(api_key or not backend.needs_api_key)
+
+
+def cache_key(text, voice, language):
+    """Ключ кэша озвучки для текущего движка."""
+    return tts_cache.cache_key(text, voice, language, tts_backends.get_backend().cache_id)
+
+
+def client_pool_stats():
+    """Загрузка пула клиентов API: число клиентов, идущие запросы и доля от TTS_MAX_INFLIGHT."""
+    backend = tts_backends.get_backend()
+    if not hasattr(backend, "pool_stats"):
+        return {}
+    stats = backend.pool_stats()
+    stats["utilisation"] = stats["in_use"] / TTS_MAX_INFLIGHT if TTS_MAX_INFLIGHT else 0.0
+    return stats
+
+
+# --- Контроль допуска к API ---
+class _TokenBucket:
+    """Ведро токенов: в среднем не больше rate запросов в секунду и не больше burst подряд."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Забрать токен, при необходимости подождав."""
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+
+_bucket = _TokenBucket(TTS_RATE_PER_SECOND, TTS_BURST)
+_api_slots = threading.BoundedSemaphore(TTS_MAX_INFLIGHT)
+_lock = threading.Lock()
+_degraded_until = 0.0  # до этого момента (monotonic) новые запросы не принимаются
+_admission = {"queued": 0, "running": 0, "admitted": 0, "rejected": 0, "rate_limited": 0,
+              "wait_total": 0.0, "wait_max": 0.0}
+
+
+def _retry_after_locked():
+    """Через сколько секунд стоит повторить запрос (0 — очередь принимает задачи)."""
+    now = time.monotonic()
+    if _degraded_until > now:
+        return _degraded_until - now
+    if _admission["queued"] >= TTS_MAX_QUEUE:
+        # Оценка времени разбора очереди при текущем ограничении частоты
+        return _admission["queued"] / TTS_RATE_PER_SECOND if TTS_RATE_PER_SECOND > 0 else 1.0
+    return 0.0
+
+
+def _rate_limited(error):
+    """Ответ 429: пауза для всех новых запросов (Retry-After или TTS_BACKOFF_SECONDS)."""
+    global _degraded_until
+    pause = TTS_BACKOFF_SECONDS
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            pause = float(response.headers.get("retry-after", pause))
+        except (TypeError, ValueError):
+            pass
+    with _lock:
+        _admission["rate_limited"] += 1
+        _degraded_until = max(_degraded_until, time.monotonic() + pause)
+
+
+def _synthesize_and_store(key, text, voice, language, api_key, submitted_at):
+    backend = tts_backends.get_backend()
+    with _api_slots:
+        if backend.remote:
+            _bucket.acquire()
+        wait = time.monotonic() - submitted_at
+        with _lock:
+            _admission["queued"] -= 1
+            _admission["running"] += 1
+            _admission["admitted"] += 1
+            _admission["wait_total"] += wait
+            _admission["wait_max"] = max(_admission["wait_max"], wait)
+        try:
+            audio = backend.synthesize(text, voice, language, api_key)
+        except Exception as e:
+            if getattr(e, "status_code", None) == 429:
+                _rate_limited(e)
+            raise
+        finally:
+            with _lock:
+                _admission["running"] -= 1
+    tts_cache.get_cache().put(key, audio)
+    return audio
+
+
+# --- Очередь синтеза и фоновая предзагрузка ---
+_executor = None
+_inflight = {}  # ключ кэша -> Future, общий для всех сессий (один текст — одна задача)
+_sessions = {}  # id сессии -> {"pending": deque, "running": int}
+_waiters = {}  # ключ кэша -> id сессий, ждущих аудио на экране
+_stats = {"submitted": 0, "completed": 0, "failed": 0, "cancelled": 0, "joined": 0}
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=TTS_PREFETCH_WORKERS, thread_name_prefix="tts-prefetch")
+    return _executor
+
+
+def _submit_locked(key, text, voice, language, api_key, session_id, started):
+    """Задача синтеза на пуле; (ключ, сессия, Future) добавляется в started.
+
+    Колбэк завершения регистрирует _watch уже после снятия _lock: если задача успела
+    завершиться, add_done_callback вызывает _on_done сразу, а тот сам берёт _lock.
+    """
+    future = _get_executor().submit(_synthesize_and_store, key, text, voice, language, api_key, time.monotonic())
+    _inflight[key] = future
+    _stats["submitted"] += 1
+    _admission["queued"] += 1
+    started.append((key, session_id, future))
+    return future
+
+
+def _watch(started):
+    """Регистрация колбэков завершения задач из started (вызывается без _lock)."""
+    for key, session_id, future in started:
+        future.add_done_callback(functools.partial(_on_done, key, session_id))
+
+
+def _pump_locked(session_id, started):
+    """Запуск задач сессии из очереди, пока не достигнут лимит одновременных.
+
+    Предзагрузка уступает вопросам на экране: она занимает не больше половины очереди
+    и приостанавливается, пока синтез недоступен.
+    """
+    session = _sessions.get(session_id)
+    if session is None:
+        return
+    cache = tts_cache.get_cache()
+    while session["pending"] and session["running"] < TTS_PREFETCH_PER_SESSION:
+        if _retry_after_locked() or _admission["queued"] >= TTS_MAX_QUEUE // 2:
+            if not session["running"]:
+                # Возобновится при следующем вызове prefetch
+                session["pending"].clear()
+            break
+        key, text, voice, language, api_key = session["pending"].popleft()
+        if key in _inflight or key in cache:
+            continue
+        _submit_locked(key, text, voice, language, api_key, session_id, started)
+        session["running"] += 1
+    if not session["pending"] and not session["running"]:
+        del _sessions[session_id]
+
+
+def _on_done(key, session_id, future):
+    started = []
+    with _lock:
+        _inflight.pop(key, None)
+        _waiters.pop(key, None)
+        if future.cancelled():
+            # Отменённая задача не дошла до допуска
+            _admission["queued"] -= 1
+            _stats["cancelled"] += 1
+        else:
+            _stats["failed" if future.exception() is not None else "completed"] += 1
+        session = _sessions.get(session_id)
+        if session is not None:
+            session["running"] -= 1
+            _pump_locked(session_id, started)
+    _watch(started)
+
+
+def prefetch(texts, voice, language, api_key, session_id):
+    """Поставить озвучку texts (в порядке показа) в фоновую очередь сессии.
+
+    Очередь сессии заменяется новой: важны только вопросы, которые ещё впереди.
+    Уже закэшированные и уже синтезируемые тексты пропускаются.
+    """
+    cache = tts_cache.get_cache()
+    pending = deque()
+    for text in texts:
+        key = cache_key(text, voice, language)
+        if key not in cache:
+            pending.append((key, text, voice, language, api_key))
+    started = []
+    with _lock:
+        session = _sessions.setdefault(session_id, {"pending": deque(), "running": 0})
+        session["pending"] = pending
+        _pump_locked(session_id, started)
+    _watch(started)
+
+
+def request(text, voice, language, api_key, session_id=None):
+    """Future с аудио текста: готовое из кэша, уже идущая задача или новый синтез на пуле.
+
+    Если синтез недоступен, Future сразу завершается исключением SpeechUnavailable.
+    """
+    cache = tts_cache.get_cache()
+    key = cache_key(text, voice, language)
+    audio = cache.get(key)
+    if audio is not None:
+        future = Future()
+        future.set_result(audio)
+        return future
+
+    started = []
+    with _lock:
+        future = _inflight.get(key)
+        if future is not None:
+            # Этот текст уже синтезируется — ждём ту же задачу
+            _stats["joined"] += 1
+        else:
+            retry_after = _retry_after_locked()
+            if retry_after:
+                _admission["rejected"] += 1
+                future = Future()
+                future.set_exception(SpeechUnavailable(retry_after))
+                return future
+            future = _submit_locked(key, text, voice, language, api_key, None, started)
+        _waiters.setdefault(key, set()).add(session_id)
+    _watch(started)
+    return future
+
+
+def cancel(text, voice, language, session_id=None):
+    """Отказ сессии от аудио (кандидат ответил раньше, чем оно пришло).
+
+    Задача снимается, только если её больше никто не ждёт и она ещё не началась; уже
+    идущий запрос доводится до конца, и результат ложится в кэш.
+    """
+    key = cache_key(text, voice, language)
+    with _lock:
+        waiters = _waiters.get(key)
+        if waiters is None:
+            return False
+        waiters.discard(session_id)
+        if waiters:
+            return False
+        future = _inflight.get(key)
+    # Колбэки отменённой задачи вызываются сразу, поэтому cancel — вне блокировки
+    return future is not None and future.cancel()
+
+
+def synthesize(text, voice, language, api_key):
+    """Аудио текста с блокирующим ожиданием (для вызовов вне интерфейса)."""
+    return request(text, voice, language, api_key).result(timeout=TTS_WAIT_TIMEOUT)
+
+
+def play(container, future, timeout=TTS_WAIT_TIMEOUT):
+    """Дождаться аудио и воспроизвести его в контейнере Streamlit (st.empty()).
+
+    Ожидание идёт короткими отрезками с обновлением контейнера: при каждом обновлении
+    Streamlit проверяет, не пришло ли новое действие пользователя, и прерывает прогон,
+    так что ответ кандидата не ждёт аудио. Возвращает True, если аудио воспроизведено.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            audio = future.result(timeout=_POLL_INTERVAL)
+            break
+        except FutureTimeoutError:
+            if time.monotonic() >= deadline:
+                container.caption("🔇 Аудио не успело подготовиться")
+                return False
+            container.caption("🔊 Готовим аудио…")
+        except SpeechUnavailable as e:
+            # Текстовый режим: вопрос остаётся на экране, озвучку можно повторить позже
+            container.caption(f"🔇 Озвучивание временно недоступно, повторите через {max(e.retry_after, 1):.0f} с")
+            return False
+        except Exception as e:
+            container.error(f"Ошибка при генерации аудио: {str(e)}")
+            return False
+    container.audio(audio, format=tts_backends.get_backend().mime_type, autoplay=True)
+    return True
+
+
+def prefetch_stats():
+    """Состояние фоновой предзагрузки для мониторинга."""
+    with _lock:
+        return dict(
+            _stats,
+            inflight=len(_inflight),
+            sessions=len(_sessions),
+            queued=sum(len(session["pending"]) for session in _sessions.values()),
+            waiting=sum(len(waiters) for waiters in _waiters.values()),
+        )
+
+
+def admission_stats():
+    """Метрики контроля допуска: глубина очереди, идущие запросы, отказы и время ожидания, с."""
+    with _lock:
+        admitted = _admission["admitted"]
+        return {
+            "queue_depth": _admission["queued"],
+            "running": _admission["running"],
+            "admitted": admitted,
+            "rejected": _admission["rejected"],
+            "rate_limited": _admission["rate_limited"],
+            "wait_avg": _admission["wait_total"] / admitted if admitted else 0.0,
+            "wait_max": _admission["wait_max"],
+            "retry_after": _retry_after_locked(),
+        }
@@ -0,0 +1,299 @@
+"""Движки синтеза речи: облачный OpenAI TTS и локальный консольный (espeak-ng, RHVoice).
+
+Движок выбирается настройкой TTS_BACKEND и один на процесс (get_backend). Облачный даёт
+MP3 и требует ключ API; локальный запускает движок подпроцессом, отдаёт WAV и работает на
+станциях без сети. Идентификатор движка и модели входит в ключ кэша озвучки, поэтому
+аудио разных движков не смешивается. Время каждого синтеза записывается по движкам
+(latency_stats); сравнить движки на станции:
+
+    python tts_backends.py [--backend local] [--runs 5]
+"""
+
+import argparse
+import contextlib
+import hashlib
+import importlib.util
+import os
+import shutil
+import subprocess
+import threading
+import time
+from collections import OrderedDict, deque
+
+TTS_BACKEND = os.environ.get("TTS_BACKEND", "openai")  # openai | local
+TTS_LOCAL_ENGINE = os.environ.get("TTS_LOCAL_ENGINE", "espeak-ng")  # espeak-ng | rhvoice
+TTS_LOCAL_VOICE = os.environ.get("TTS_LOCAL_VOICE", "")  # голос движка; по умолчанию — по языку
+TTS_REQUEST_TIMEOUT = float(os.environ.get("TTS_REQUEST_TIMEOUT", "20"))  # таймаут синтеза, с
+TTS_CLIENT_POOL_SIZE = int(os.environ.get("TTS_CLIENT_POOL_SIZE", "16"))  # клиентов (ключей) на процесс
+
+_LATENCY_WINDOW = 256  # последних замеров на движок
+
+
+# --- Замеры времени синтеза ---
+_latency_lock = threading.Lock()
+_latency = {}  # имя движка -> {"count", "total", "max", "recent": deque}
+
+
+def _record_latency(name, seconds):
+    with _latency_lock:
+        entry = _latency.setdefault(
+            name, {"count": 0, "total": 0.0, "max": 0.0, "recent": deque(maxlen=_LATENCY_WINDOW)}
+        )
+        entry["count"] += 1
+        entry["total"] += seconds
+        entry["max"] = max(entry["max"], seconds)
+        entry["recent"].append(seconds)
+
+
+def latency_stats():
+    """Время синтеза по движкам, мс: среднее за всё время, медиана и p95 по последним замерам."""
+    with _latency_lock:
+        stats = {}
+        for name, entry in _latency.items():
+            recent = sorted(entry["recent"])
+            stats[name] = {
+                "count": entry["count"],
+                "avg_ms": entry["total"] / entry["count"] * 1000,
+                "p50_ms": recent[len(recent) // 2] * 1000,
+                "p95_ms": recent[min(len(recent) - 1, int(len(recent) * 0.95))] * 1000,
+                "max_ms": entry["max"] * 1000,
+            }
+        return stats
+
+
+class Backend:
+    """Движок синтеза. Подклассы задают атрибуты и реализуют _synthesize."""
+
+    name = ""
+    model = ""
+    mime_type = ""
+    voices = []
+    remote = False  # запросы идут по сети и подчиняются ограничению частоты
+    needs_api_key = False
+
+    @property
+    def cache_id(self):
+        """Идентификатор движка и модели для ключа кэша."""
+        return f"{self.name}/{self.model}"
+
+    def available(self):
+        raise NotImplementedError
+
+    def synthesize(self, text, voice, language, api_key=None):
+        """Аудио текста (байты в формате mime_type); время синтеза попадает в latency_stats."""
+        start = time.perf_counter()
+        audio = self._synthesize(text, voice, language, api_key)
+        _record_latency(self.name, time.perf_counter() - start)
+        return audio
+
+    def _synthesize(self, text, voice, language, api_key):
+        raise NotImplementedError
+
+
+class _PooledClient:
+    __slots__ = ("client", "in_use", "requests")
+
+    def __init__(self, client):
+        self.client = client
+        self.in_use = 0
+        self.requests = 0
+
+
+class OpenAIBackend(Backend):
+    """OpenAI TTS API (MP3). На каждый ключ в процессе один клиент с keep-alive соединениями."""
+
+    name = "openai"
+    model = "tts-1"
+    mime_type = "audio/mp3"
+    voices = ["alloy", "echo", "fable", "onyx", "nova", "shimmer"]
+    remote = True
+    needs_api_key = True
+
+    def __init__(self, pool_size=TTS_CLIENT_POOL_SIZE):
+        self.pool_size = pool_size
+        self._pool_lock = threading.Lock()
+        self._clients = OrderedDict()  # хэш ключа -> _PooledClient; от давно использованных к недавним
+        self._pool_stats = {"created": 0, "reused": 0, "evicted": 0}
+
+    def available(self):
+        """Установлен ли пакет openai (без его импорта)."""
+        return importlib.util.find_spec("openai") is not None
+
+    def _make_client(self, api_key):
+        import openai
+
+        # Встроенный HTTP-клиент openai держит пул keep-alive соединений, пока жив объект клиента
+        return openai.OpenAI(api_key=api_key, timeout=TTS_REQUEST_TIMEOUT)
+
+    def _evict_idle_clients_locked(self):
+        """Закрытие давно не использованных клиентов сверх pool_size (занятые не трогаем)."""
+        for ident in list(self._clients):
+            if len(self._clients) <= self.pool_size:
+                break
+            entry = self._clients[ident]
+            if entry.in_use:
+                continue
+            del self._clients[ident]
+            entry.client.close()
+            self._pool_stats["evicted"] += 1
+
+    def _acquire_locked(self, ident, entry):
+        if entry.requests:
+            self._pool_stats["reused"] += 1
+        entry.in_use += 1
+        entry.requests += 1
+        self._clients.move_to_end(ident)
+        self._evict_idle_clients_locked()
+
+    @contextlib.contextmanager
+    def _client(self, api_key):
+        """Клиент API для ключа из пула процесса (создаётся при первом обращении)."""
+        ident = hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+        # Поиск и захват записи — в одной критической секции: иначе между ними её может
+        # вытеснить и закрыть другой поток (in_use ещё 0)
+        with self._pool_lock:
+            entry = self._clients.get(ident)
+            if entry is not None:
+                self._acquire_locked(ident, entry)
+        if entry is None:
+            # Клиент создаётся вне блокировки; запись перед вставкой проверяется снова
+            client = self._make_client(api_key)
+            with self._pool_lock:
+                entry = self._clients.get(ident)
+                if entry is None:
+                    entry = self._clients[ident] = _PooledClient(client)
+                    self._pool_stats["created"] += 1
+                    client = None
+                self._acquire_locked(ident, entry)
+            if client is not None:
+                # Параллельный поток успел создать клиент для того же ключа
+                client.close()
+        try:
+            yield entry.client
+        finally:
+            with self._pool_lock:
+                entry.in_use -= 1
+
+    def pool_stats(self):
+        """Число клиентов в пуле, идущие через них запросы и счётчики создания/вытеснения."""
+        with self._pool_lock:
+            return dict(
+                self._pool_stats,
+                clients=len(self._clients),
+                in_use=sum(entry.in_use for entry in self._clients.values()),
+            )
+
+    def _synthesize(self, text, voice, language, api_key):
+        import io
+
+        buffer = io.BytesIO()
+        with self._client(api_key) as client:
+            # Ответ читается потоком прямо в память
+            with client.audio.speech.with_streaming_response.create(
+                model=self.model,
+                voice=voice,
+                input=text,
+                response_format="mp3",
+            ) as response:
+                for chunk in response.iter_bytes():
+                    buffer.write(chunk)
+        return buffer.getvalue()
+
+
+class LocalBackend(Backend):
+    """Локальный движок подпроцессом: текст на stdin, WAV на stdout, без сети.
+
+    Голос берётся из TTS_LOCAL_VOICE, иначе выбирается по языку; голоса интерфейса
+    (alloy, nova…) к локальным движкам не относятся и игнорируются.
+    """
+
+    name = "local"
+    mime_type = "audio/wav"
+    voices = ["default"]
+
+    # Движок -> (исполняемый файл, голоса по языку)
+    ENGINES = {
+        "espeak-ng": ("espeak-ng", {"ru": "ru", "kk": "kk"}),
+        "rhvoice": ("RHVoice-test", {"ru": "aleksandr"}),
+    }
+
+    def __init__(self, engine=TTS_LOCAL_ENGINE, voice=TTS_LOCAL_VOICE):
+        if engine not in self.ENGINES:
+            raise ValueError(f"Неизвестный локальный движок {engine!r}; доступны: {', '.join(self.ENGINES)}")
+        self.engine = engine
+        self.voice = voice
+        self.executable = self.ENGINES[engine][0]
+
+    @property
+    def model(self):
+        return f"{self.engine}/{self.voice or 'auto'}"
+
+    def available(self):
+        return shutil.which(self.executable) is not None
+
+    def _command(self, language):
+        voice = self.voice or self.ENGINES[self.engine][1].get(language, language)
+        if self.engine == "espeak-ng":
+            return [self.executable, "--stdin", "--stdout", "-v", voice]
+        return [self.executable, "-p", voice, "-o", "/dev/stdout"]
+
+    def _synthesize(self, text, voice, language, api_key):
+        completed = subprocess.run(
+            self._command(language),
+            input=text.encode("utf-8"),
+            capture_output=True,
+            timeout=TTS_REQUEST_TIMEOUT,
+        )
+        if completed.returncode != 0 or not completed.stdout:
+            error = completed.stderr.decode("utf-8", "replace").strip()
+            raise RuntimeError(f"{self.engine} завершился с кодом {completed.returncode}: {error[-500:]}")
+        return completed.stdout
+
+
+BACKENDS = {"openai": OpenAIBackend, "local": LocalBackend}
+
+if TTS_BACKEND not in BACKENDS:
+    raise ValueError(f"TTS_BACKEND должен быть одним из {', '.join(BACKENDS)}, получено {TTS_BACKEND!r}")
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Движок процесса, выбранный TTS_BACKEND."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = BACKENDS[TTS_BACKEND]()
+        return _backend
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер времени синтеза движками TTS")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default=TTS_BACKEND)
+    parser.add_argument("--runs", type=int, default=5, help="число озвучиваемых вопросов")
+    parser.add_argument("--language", default="ru")
+    parser.add_argument("--api-key", default=None, help="ключ API (по умолчанию OPENAI_API_KEY)")
+    args = parser.parse_args()
+
+    import question_bank
+
+    backend = BACKENDS[args.backend]()
+    if not backend.available():
+        raise SystemExit(f"Движок {backend.name} недоступен на этой машине")
+    api_key = args.api_key or os.environ.get("OPENAI_API_KEY")
+    if backend.needs_api_key and not api_key:
+        raise SystemExit("Нужен ключ API: --api-key или OPENAI_API_KEY")
+
+    for item in question_bank.ITEMS[: args.runs]:
+        audio = backend.synthesize(item.text, backend.voices[0], args.language, api_key)
+        print(f"  {len(audio) / 1024:7.1f} КиБ  {item.text[:60]}")
+    stats = latency_stats()[backend.name]
+    print(
+        f"{backend.cache_id}: {stats['count']} синтезов, среднее {stats['avg_ms']:.0f} мс, "
+        f"медиана {stats['p50_ms']:.0f} мс, p95 {stats['p95_ms']:.0f} мс, максимум {stats['max_ms']:.0f} мс"
+    )
+
+
+if __name__ == "__main__":
+    main()
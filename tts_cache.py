@@ -0,0 +1,154 @@
+"""Дисковый кэш озвучки вопросов с адресацией по содержимому и LRU-вытеснением.
+
+Банк вопросов фиксирован, поэтому одни и те же тексты синтезируются снова и снова. Кэш
+хранит готовое аудио на диске под ключом hash(текст, голос, язык, модель): повторный вопрос
+воспроизводится сразу, без обращения к API. Объём ограничен бюджетом в байтах, при
+превышении вытесняются давно не использованные записи. Время последнего обращения
+хранится в mtime файла, поэтому порядок LRU переживает перезапуск сервера.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+TTS_CACHE_DIR = os.environ.get(
+    "TTS_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".tts_cache")
+)
+TTS_CACHE_MAX_BYTES = int(os.environ.get("TTS_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Меняется при несовместимом изменении формата ключа или содержимого записей
+_KEY_VERSION = "1"
+_SUFFIX = ".audio"
+
+
+def cache_key(text, voice, language, model):
+    """Ключ записи: sha256 от (версия формата, модель, голос, язык, текст)."""
+    payload = "\x1f".join((_KEY_VERSION, model, voice, language, text))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    """Потокобезопасный дисковый LRU-кэш аудио с бюджетом по объёму."""
+
+    def __init__(self, directory=TTS_CACHE_DIR, max_bytes=TTS_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._index = OrderedDict()  # ключ -> размер; от давно использованных к недавним
+        self._total_bytes = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + _SUFFIX)
+
+    def _load_index(self):
+        """Восстановление индекса по файлам на диске в порядке mtime."""
+        entries = []
+        for dirpath, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                if not filename.endswith(_SUFFIX):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(dirpath, filename))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, filename[: -len(_SUFFIX)], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._total_bytes += size
+        with self._lock:
+            self._evict_locked()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._index
+
+    def get(self, key):
+        """Аудио по ключу или None; попадание обновляет позицию записи в LRU."""
+        with self._lock:
+            if key not in self._index:
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+        path = self._path(key)
+        try:
+            with open(path, "rb") as audio_file:
+                data = audio_file.read()
+            os.utime(path)
+        except FileNotFoundError:
+            # Запись удалена другим процессом, разделяющим каталог кэша
+            with self._lock:
+                size = self._index.pop(key, None)
+                if size is not None:
+                    self._total_bytes -= size
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key, data):
+        """Сохранение аудио; запись атомарна (временный файл + os.replace)."""
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                tmp_file.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        with self._lock:
+            previous = self._index.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= previous
+            self._index[key] = len(data)
+            self._total_bytes += len(data)
+            self._evict_locked()
+
+    def _evict_locked(self):
+        while self._total_bytes > self.max_bytes and self._index:
+            key, size = self._index.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            try:
+                os.unlink(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        """Счётчики кэша для мониторинга."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._index),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Общий на процесс кэш с настройками из TTS_CACHE_DIR / TTS_CACHE_MAX_BYTES."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = TTSCache()
+        return _default_cache
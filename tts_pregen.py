@@ -0,0 +1,142 @@
+"""Пакетная предгенерация озвучки всех текстов банков в дисковый кэш (tts_cache).
+
+Запуск:
+    python tts_pregen.py [--backend openai] [--voices alloy,nova] [--languages ru]
+                         [--workers 4] [--rate 3] [--base-url URL] [--api-key KEY] [--dry-run]
+
+Обходит вопросы скрининга и углублённых шкал, утверждения «Прогноз-2» и вопросы анкеты и
+для каждой пары голос/язык синтезирует недостающие записи на ограниченном пуле потоков.
+Кэш адресуется по содержимому, поэтому повторный запуск пропускает готовые записи и
+прерванную генерацию можно просто запустить снова. Заполненный каталог TTS_CACHE_DIR
+поставляется на станции как готовый аудиопакет: во время обследования синтез не нужен.
+
+Проверка без сети: `python mock_tts_server.py` и `--base-url http://127.0.0.1:8765/v1`.
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+
+
+def corpus():
+    """Все тексты для озвучивания без повторов, в порядке банков."""
+    import prognoz2
+    import question_bank
+
+    texts = [item.text for item in question_bank.ITEMS]
+    texts += prognoz2.PROGNOZ2_QUESTION_TEXTS
+    texts += [field.text for field in question_bank.FORM_FIELDS]
+    return list(dict.fromkeys(texts))
+
+
+def generate(jobs, api_key, window, report_every=25):
+    """Синтез jobs [(текст, голос, язык)] с не более чем window задачами одновременно.
+
+    Возвращает (число синтезированных, список (задача, ошибка)).
+    """
+    import tts
+
+    pending = deque(jobs)
+    running = {}
+    done = 0
+    failed = []
+    start = time.monotonic()
+    while pending or running:
+        while pending and len(running) < window:
+            job = pending.popleft()
+            running[tts.request(*job, api_key)] = job
+        finished, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in finished:
+            job = running.pop(future)
+            try:
+                future.result()
+            except tts.SpeechUnavailable as e:
+                # Очередь переполнена или API просит подождать — задача вернётся в начало
+                pending.appendleft(job)
+                time.sleep(min(e.retry_after, 5))
+                continue
+            except Exception as e:
+                if getattr(e, "status_code", None) != 429:
+                    failed.append((job, e))
+                    continue
+                # 429 уже перевёл tts в паузу: ждём её окончания и повторяем задачу
+                pending.appendleft(job)
+                time.sleep(min(max(tts.admission_stats()["retry_after"], 0.1), 5))
+                continue
+            done += 1
+            if done % report_every == 0:
+                elapsed = time.monotonic() - start
+                print(f"  синтезировано {done}/{len(jobs)} ({done / elapsed:.1f} в секунду)")
+    return done, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Предгенерация озвучки всех вопросов в кэш")
+    parser.add_argument("--backend", default=None, help="движок синтеза (TTS_BACKEND)")
+    parser.add_argument("--voices", default=None, help="голоса через запятую (по умолчанию первый голос движка)")
+    parser.add_argument("--languages", default="ru", help="языки через запятую")
+    parser.add_argument("--workers", type=int, default=4, help="одновременных запросов к API")
+    parser.add_argument("--rate", type=float, default=None, help="запросов в секунду (TTS_RATE_PER_SECOND)")
+    parser.add_argument("--base-url", default=None, help="адрес API (например, заглушки mock_tts_server.py)")
+    parser.add_argument("--api-key", default=None, help="ключ API (по умолчанию OPENAI_API_KEY)")
+    parser.add_argument("--dry-run", action="store_true", help="только посчитать недостающие записи")
+    args = parser.parse_args()
+
+    languages = [language.strip() for language in args.languages.split(",") if language.strip()]
+    if args.workers < 1:
+        parser.error("--workers должно быть не меньше 1")
+
+    # Настройки tts читаются при импорте модуля, поэтому задаются до него
+    os.environ["TTS_PREFETCH_WORKERS"] = str(args.workers)
+    os.environ["TTS_MAX_INFLIGHT"] = str(args.workers)
+    os.environ["TTS_MAX_QUEUE"] = str(args.workers * 2)
+    if args.rate is not None:
+        os.environ["TTS_RATE_PER_SECOND"] = str(args.rate)
+    if args.base_url:
+        os.environ["OPENAI_BASE_URL"] = args.base_url
+    if args.backend:
+        os.environ["TTS_BACKEND"] = args.backend
+
+    import tts
+    import tts_cache
+
+    if not tts.available():
+        parser.error("движок синтеза недоступен на этой машине")
+    if args.voices:
+        voices = [voice.strip() for voice in args.voices.split(",") if voice.strip()]
+    else:
+        voices = tts.voices()[:1]
+    unknown = [voice for voice in voices if voice not in tts.voices()]
+    if unknown:
+        parser.error(f"неизвестные голоса: {', '.join(unknown)}")
+    api_key = args.api_key or os.environ.get("OPENAI_API_KEY")
+    if not tts.can_speak(api_key) and not args.dry_run:
+        parser.error("нужен ключ API: --api-key или OPENAI_API_KEY")
+
+    texts = corpus()
+    cache = tts_cache.get_cache()
+    jobs = [(text, voice, language) for voice in voices for language in languages for text in texts]
+    todo = [job for job in jobs if tts.cache_key(*job) not in cache]
+    print(f"Текстов: {len(texts)}; записей: {len(jobs)}; уже в кэше: {len(jobs) - len(todo)}; к синтезу: {len(todo)}")
+    if args.dry_run or not todo:
+        return 0
+
+    start = time.monotonic()
+    done, failed = generate(todo, api_key, window=args.workers * 2)
+    elapsed = time.monotonic() - start
+
+    stats = cache.stats()
+    print(f"Синтезировано: {done} за {elapsed:.1f} с; ошибок: {len(failed)}")
+    print(f"Кэш {cache.directory}: {stats['entries']} записей, {stats['bytes'] / 1024 / 1024:.1f} МиБ")
+    if stats["evictions"]:
+        print("ВНИМАНИЕ: кэш вытеснял записи — увеличьте TTS_CACHE_MAX_BYTES, иначе пакет неполный")
+    for (text, voice, language), error in failed[:10]:
+        print(f"  ошибка [{voice}/{language}] {text[:60]}: {error}")
+    return 1 if failed or stats["evictions"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())